@@ -0,0 +1,69 @@
+"""
+    Benchmarks the CMA-ES variants (full, separable, limited) for increasing
+    numbers of parameters on an ellipsoid function. For each variant, the
+    time per iteration (sampling, submission and distribution update) and
+    the objective after a fixed number of iterations are reported.
+
+    Usage: python benchmarks/cma_es.py [iterations]
+"""
+import sys, time
+import numpy as np
+
+from octras import Evaluator, Simulator, Problem
+from octras.algorithms import CMAES
+
+DIMENSIONS = [10, 30, 100, 300, 1000]
+
+class EllipsoidSimulator(Simulator):
+    def __init__(self):
+        self.results = {}
+
+    def run(self, identifier, parameters):
+        self.results[identifier] = np.sum(parameters["w"] * (parameters["x"] - 1.0)**2)
+
+    def ready(self, identifier):
+        return True
+
+    def get(self, identifier):
+        return self.results[identifier]
+
+    def clean(self, identifier):
+        del self.results[identifier]
+
+class EllipsoidProblem(Problem):
+    def __init__(self, dimensions):
+        self.number_of_parameters = dimensions
+        self.initial = np.zeros((dimensions,))
+        self.weights = np.logspace(0, 2, dimensions)
+
+    def prepare(self, x):
+        return dict(x = np.asarray(x), w = self.weights)
+
+    def evaluate(self, x, result):
+        return result
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    print("%10s %10s %20s %15s" % ("N", "variant", "time / iteration", "objective"))
+
+    for dimensions in DIMENSIONS:
+        for variant in ("full", "separable", "limited"):
+            evaluator = Evaluator(
+                problem = EllipsoidProblem(dimensions), simulator = EllipsoidSimulator(),
+                follow_trace = False
+            )
+
+            algorithm = CMAES(evaluator, initial_step_size = 0.5, seed = 0, variant = variant)
+
+            start = time.time()
+
+            for iteration in range(iterations):
+                algorithm.advance()
+
+            duration = (time.time() - start) / iterations
+
+            identifier = evaluator.submit(algorithm.mean)
+            objective = evaluator.get(identifier)[0]
+
+            print("%10d %10s %18.2fms %15.6g" % (dimensions, variant, duration * 1e3, objective))
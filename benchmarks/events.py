@@ -0,0 +1,85 @@
+"""
+    Benchmarks the streaming events analysis on a synthetic events file.
+
+    Usage: python benchmarks/events.py [number_of_persons] [number_of_files]
+
+    The default of 160000 persons with three trips each roughly corresponds to
+    the population of a 10pct sample of the Zurich scenario.
+"""
+import gzip, os, sys, time, tempfile
+import numpy as np
+
+from octras.events import analyze_events, analyze_events_files
+
+def generate_events(path, number_of_persons, number_of_links = 10000, links_per_trip = 20, seed = 0):
+    random = np.random.RandomState(seed)
+    modes = ["car", "pt", "bike", "walk"]
+    number_of_events = 0
+
+    with gzip.open(path, "wt", compresslevel = 1) as f:
+        f.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<events version=\"1.0\">\n")
+
+        for person in range(number_of_persons):
+            time = 6 * 3600 + random.randint(0, 4 * 3600)
+            link = random.randint(number_of_links)
+            purposes = ["home", "work", "shop", "home"]
+            x, y = random.randint(0, 50000, 2)
+
+            for trip in range(3):
+                mode = modes[random.randint(len(modes))]
+
+                f.write("\t<event time=\"%d.0\" type=\"actend\" person=\"%d\" link=\"%d\" x=\"%d.0\" y=\"%d.0\" actType=\"%s\"  />\n" % (time, person, link, x, y, purposes[trip]))
+                f.write("\t<event time=\"%d.0\" type=\"departure\" person=\"%d\" link=\"%d\" legMode=\"%s\"  />\n" % (time, person, link, mode))
+
+                if mode == "car":
+                    f.write("\t<event time=\"%d.0\" type=\"PersonEntersVehicle\" person=\"%d\" vehicle=\"%d\"  />\n" % (time, person, person))
+
+                    for k in range(links_per_trip):
+                        time += random.randint(5, 60)
+                        f.write("\t<event time=\"%d.0\" type=\"left link\" link=\"%d\" vehicle=\"%d\"  />\n" % (time, link, person))
+                        link = random.randint(number_of_links)
+                        f.write("\t<event time=\"%d.0\" type=\"entered link\" link=\"%d\" vehicle=\"%d\"  />\n" % (time, link, person))
+
+                    f.write("\t<event time=\"%d.0\" type=\"PersonLeavesVehicle\" person=\"%d\" vehicle=\"%d\"  />\n" % (time, person, person))
+                    number_of_events += 2 + 2 * links_per_trip
+                else:
+                    distance = random.randint(100, 10000)
+                    time += random.randint(60, 1800)
+                    link = random.randint(number_of_links)
+                    f.write("\t<event time=\"%d.0\" type=\"travelled\" person=\"%d\" distance=\"%d.0\" mode=\"%s\"  />\n" % (time, person, distance, mode))
+                    number_of_events += 1
+
+                f.write("\t<event time=\"%d.0\" type=\"arrival\" person=\"%d\" link=\"%d\" legMode=\"%s\"  />\n" % (time, person, link, mode))
+                x, y = random.randint(0, 50000, 2)
+                f.write("\t<event time=\"%d.0\" type=\"actstart\" person=\"%d\" link=\"%d\" x=\"%d.0\" y=\"%d.0\" actType=\"%s\"  />\n" % (time, person, link, x, y, purposes[trip + 1]))
+                number_of_events += 4
+
+                time += random.randint(1800, 4 * 3600)
+
+        f.write("</events>\n")
+
+    return number_of_events
+
+if __name__ == "__main__":
+    number_of_persons = int(sys.argv[1]) if len(sys.argv) > 1 else 160000
+    number_of_files = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "output_events.xml.gz")
+
+        start = time.time()
+        number_of_events = generate_events(path, number_of_persons)
+        print("Generated %d events for %d persons in %.2fs (%.1f MB)" % (
+            number_of_events, number_of_persons, time.time() - start, os.path.getsize(path) * 1e-6))
+
+        start = time.time()
+        result = analyze_events(path)
+        duration = time.time() - start
+
+        print("Analyzed %d trips and %d links in %.2fs (%.0f events/s)" % (
+            len(result["trips"]["mode"]), len(result["link_ids"]), duration, number_of_events / duration))
+
+        if number_of_files > 1:
+            start = time.time()
+            analyze_events_files([path] * number_of_files)
+            print("Analyzed %d files in parallel in %.2fs" % (number_of_files, time.time() - start))
@@ -0,0 +1,86 @@
+"""
+    Benchmarks the flow analyzer of the Paris example
+    (example/paris/flow_analyzer.py) on synthetic hourly counts against the
+    previous implementation, which grouped and merged with pandas and found
+    the scaling factor with scipy.optimize.minimize_scalar.
+
+    Usage: python benchmarks/paris_flows.py [number_of_links] [repetitions]
+"""
+import os, sys, time, tempfile
+import numpy as np
+import pandas as pd
+import scipy.optimize as opt
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "example", "paris"))
+from flow_analyzer import ParisDailyFlowAnalyzer
+
+def create_data(path, number_of_links, seed = 0):
+    random = np.random.RandomState(seed)
+
+    link_ids = np.arange(number_of_links) * 7
+    road_types = np.array(["motorway", "trunk", "primary", "secondary", "residential"])
+
+    df_reference = pd.DataFrame({
+        "link_id": np.repeat(link_ids, 24), "hour": np.tile(np.arange(24), number_of_links),
+        "osm": np.repeat(road_types[random.randint(0, 5, number_of_links)], 24),
+        "flow": random.poisson(100.0, number_of_links * 24)
+    })
+
+    # The simulation covers a sample of the links and has additional ones
+    simulated_link_ids = np.concatenate([link_ids[random.random_sample(number_of_links) < 0.9], link_ids[:100] + 1])
+
+    df_simulation = pd.DataFrame({
+        "link_id": np.repeat(simulated_link_ids, 24), "hour": np.tile(np.arange(24), len(simulated_link_ids)),
+        "count": random.poisson(10.0, len(simulated_link_ids) * 24)
+    })
+
+    reference_path = os.path.join(path, "reference.csv")
+    df_reference.to_csv(reference_path, sep = ";", index = False)
+    df_simulation.to_csv(os.path.join(path, "flows.csv"), sep = ";", index = False)
+
+    return reference_path
+
+def previous_execute(reference_path, output_path):
+    df_reference = pd.read_csv(reference_path, sep = ";")
+    df_reference = df_reference[df_reference["osm"].isin(["motorway", "trunk", "primary", "secondary"])]
+    df_reference = df_reference.groupby("link_id").sum().reset_index()[["link_id", "flow"]]
+    df_reference = df_reference.rename(columns = { "flow": "reference_count" })
+
+    df_simulation = pd.read_csv("%s/flows.csv" % output_path, sep = ";")
+    df_simulation = df_simulation.groupby("link_id").sum().reset_index()[["link_id", "count"]]
+    df_simulation = df_simulation.rename(columns = { "count": "simulation_count" })
+
+    df = pd.merge(df_reference, df_simulation, on = "link_id")
+    df = df[df["reference_count"] > 0.0]
+
+    f = lambda x: np.sum(np.abs((df["simulation_count"] * x - df["reference_count"]))**2)
+    factor = opt.minimize_scalar(f).x
+
+    simulation_values = df["simulation_count"].values * factor
+    reference_values = df["reference_count"].values
+    relative_errors = np.abs((simulation_values - reference_values) / reference_values)
+
+    return np.mean(np.maximum(0.2, relative_errors) - 0.2), factor
+
+if __name__ == "__main__":
+    number_of_links = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as path:
+        reference_path = create_data(path, number_of_links)
+        analyzer = ParisDailyFlowAnalyzer(reference_path, objective = "sum")
+
+        start = time.time()
+        for repetition in range(repetitions): result = analyzer.execute(path)
+        new_time = (time.time() - start) / repetitions
+        print("Array-based implementation: %.3fs per call" % new_time)
+
+        start = time.time()
+        for repetition in range(repetitions): previous_objective, previous_factor = previous_execute(reference_path, path)
+        previous_time = (time.time() - start) / repetitions
+        print("Previous implementation: %.3fs per call" % previous_time)
+
+    print("Speedup: %.1fx" % (previous_time / new_time))
+    print("Factor: %.8f (previous %.8f)" % (result["factor"], previous_factor))
+    print("Daily objective: %.8f (previous %.8f)" % (result["daily_objective"], previous_objective))
+    print("Hourly objective: %.8f" % result["hourly_objective"])
@@ -0,0 +1,126 @@
+"""
+    Benchmarks the simulation side of the Paris analyzer
+    (example/paris/analyzer.py), that is the urban join, the filters and the
+    distance band shares of the region and of Paris, against the previous
+    pandas-based implementation.
+
+    Usage: python benchmarks/paris_shares.py [number_of_trips] [--shuffle]
+
+    The default of 450000 trips roughly corresponds to a 1pct sample of
+    Île-de-France. With --shuffle, the urban table is not in the same order
+    as the trip table.
+"""
+import os, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "example", "paris"))
+from analyzer import ParisAnalyzer
+
+MODES = ["car", "pt", "bike", "walk"]
+
+def create_trips(number_of_trips, seed = 0, shuffle = False):
+    random = np.random.RandomState(seed)
+
+    person_ids = np.repeat(np.arange(number_of_trips // 3 + 1), 3)[:number_of_trips]
+    trip_ids = np.tile(np.arange(3), number_of_trips // 3 + 1)[:number_of_trips]
+
+    df_trips = pd.DataFrame({
+        "person_id": person_ids, "person_trip_id": trip_ids,
+        "euclidean_distance": random.exponential(5000, number_of_trips),
+        "mode": pd.Categorical.from_codes(random.randint(0, 5, number_of_trips), MODES + ["car_passenger"]),
+        "weight": 1.0
+    })
+
+    # The pipeline writes both tables in the same order
+    sorter = random.permutation(number_of_trips) if shuffle else np.arange(number_of_trips)
+
+    df_urban = pd.DataFrame({
+        "person_id": person_ids[sorter], "person_trip_id": trip_ids[sorter],
+        "urban_origin": random.random_sample(number_of_trips) > 0.5,
+        "urban_destination": random.random_sample(number_of_trips) > 0.5
+    })
+
+    return df_trips, df_urban
+
+def previous_calculate_shares(analyzer, df, bounds):
+    totals = [
+        df[
+            (df["euclidean_distance"] >= q1) & (df["euclidean_distance"] < q2) &
+            df["mode"].isin(analyzer.modes)]["weight"].sum()
+        for q1, q2 in zip(bounds, bounds[1:])
+    ]
+
+    counts = {
+        mode : [df[
+            (df["euclidean_distance"] >= q1) & (df["euclidean_distance"] < q2) &
+            (df["mode"] == mode)]["weight"].sum()
+        for q1, q2 in zip(bounds, bounds[1:]) ]
+        for mode in analyzer.modes
+    }
+
+    return {
+        mode : np.nan_to_num(np.array(counts[mode]) / np.array(totals))
+        for mode in analyzer.modes
+    }
+
+def previous_implementation(analyzer, df_trips, df_urban, region_bounds, paris_bounds):
+    df = df_trips.copy()
+    df["weight"] = 1.0
+
+    df = pd.merge(df, df_urban, on = ["person_id", "person_trip_id"])
+    df["is_urban"] = df["urban_origin"] & df["urban_destination"]
+
+    df = df[df["euclidean_distance"] <= analyzer.maximum_distance]
+    df = df[df["euclidean_distance"] >= analyzer.minimum_distance]
+    df = df[df["mode"].isin(analyzer.modes)]
+
+    region_shares = previous_calculate_shares(analyzer, df, region_bounds)
+    paris_shares = previous_calculate_shares(analyzer, df[df["is_urban"]], paris_bounds)
+
+    return region_shares, paris_shares
+
+def implementation(analyzer, df_trips, df_urban, region_bounds, paris_bounds):
+    trips = analyzer.prepare_simulation_trips(df_trips, df_urban)
+    region_bands, paris_bands = analyzer.assign_bands(trips["distance"], [region_bounds, paris_bounds])
+
+    region_shares = analyzer.calculate_shares(trips, region_bounds, region_bands)
+    paris_shares = analyzer.calculate_shares(trips, paris_bounds, paris_bands, trips["weight"] * trips["is_urban"])
+
+    return region_shares, paris_shares
+
+def measure(function, repetitions = 5):
+    # Best of several repetitions
+    durations = []
+
+    for repetition in range(repetitions):
+        start = time.time()
+        result = function()
+        durations.append(time.time() - start)
+
+    return result, min(durations)
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    number_of_trips = int(arguments[0]) if len(arguments) > 0 else 450000
+    df_trips, df_urban = create_trips(number_of_trips, shuffle = "--shuffle" in sys.argv)
+
+    analyzer = ParisAnalyzer(threshold = 0.05, number_of_bounds = 40,
+        minimum_distance = 100.0, maximum_distance = 40 * 1e3, reference_path = None)
+
+    trips = analyzer.prepare_simulation_trips(df_trips, df_urban)
+    region_bounds = analyzer.calculate_bounds(trips)
+    paris_bounds = analyzer.calculate_bounds(analyzer.select_trips(trips, trips["is_urban"]))
+
+    result, new_time = measure(lambda: implementation(analyzer, df_trips, df_urban, region_bounds, paris_bounds))
+    print("Array-based implementation: %.4fs" % new_time)
+
+    previous_result, previous_time = measure(lambda: previous_implementation(analyzer, df_trips, df_urban, region_bounds, paris_bounds))
+    print("Previous implementation: %.4fs" % previous_time)
+
+    identical = all(
+        np.array_equal(result[k][mode], previous_result[k][mode])
+        for k in range(2) for mode in MODES
+    )
+
+    print("Speedup: %.1fx, identical results: %s" % (previous_time / new_time, identical))
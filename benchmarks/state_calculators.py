@@ -0,0 +1,89 @@
+"""
+    Benchmarks the single-pass trip state calculators (use_case/states.py,
+    based on octras.trips) against the previous per-calculator implementation
+    with pandas masks.
+
+    Usage: python benchmarks/state_calculators.py [number_of_trips]
+"""
+import os, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "use_case"))
+from states import TravelTimeDistribution, TotalModeShare, ModeShareByDistance, MultipleStates
+
+MODES = ["car", "pt", "bike", "walk"]
+TRAVEL_TIME_BOUNDS = np.arange(0, 3600 * 2, 300)
+DISTANCE_BOUNDS = np.arange(0, 50000, 1000)
+
+def create_trips(number_of_trips, seed = 0):
+    random = np.random.RandomState(seed)
+
+    return pd.DataFrame({
+        "mode": pd.Categorical.from_codes(random.randint(0, 5, number_of_trips), MODES + ["car_passenger"]),
+        "crowfly_distance": random.exponential(5000, number_of_trips) * (random.random_sample(number_of_trips) > 0.01),
+        "network_distance": random.exponential(7000, number_of_trips),
+        "travel_time": random.exponential(1200, number_of_trips),
+        "preceedingPurpose": pd.Categorical.from_codes(random.randint(0, 4, number_of_trips), ["home", "work", "shop", "outside"]),
+        "followingPurpose": pd.Categorical.from_codes(random.randint(0, 4, number_of_trips), ["home", "work", "shop", "outside"]),
+        "weight": random.random_sample(number_of_trips)
+    })
+
+def filter_trips(df):
+    df = df[df["crowfly_distance"] > 0]
+    df = df[df["preceedingPurpose"] != "outside"]
+    df = df[df["followingPurpose"] != "outside"]
+    return df
+
+def previous_implementation(df):
+    states = []
+
+    for mode in MODES:
+        df_mode = filter_trips(df.copy())
+        df_mode = df_mode[df_mode["mode"] == mode].copy()
+        df_mode["class"] = np.digitize(df_mode["travel_time"], TRAVEL_TIME_BOUNDS)
+        counts = np.array([np.sum(df_mode[df_mode["class"] == k]["weight"]) for k in range(len(TRAVEL_TIME_BOUNDS) + 1)])
+        states.append(counts / np.sum(counts))
+
+    df_filtered = filter_trips(df.copy())
+    shares = np.array([df_filtered[df_filtered["mode"] == mode]["weight"].sum() for mode in MODES])
+    states.append(shares / np.sum(shares))
+
+    df_filtered = filter_trips(df.copy())
+    values = []
+
+    for mode in MODES:
+        f = df_filtered["mode"] == mode
+        classes = np.digitize(df_filtered["network_distance"], DISTANCE_BOUNDS)
+        values += [np.sum(df_filtered[f & (classes == k)]["weight"]) for k in range(len(DISTANCE_BOUNDS) + 1)]
+
+    values = np.array(values)
+    states.append(values / np.sum(values))
+
+    return np.concatenate(states)
+
+def single_pass_implementation(df):
+    calculator = MultipleStates(
+        [TravelTimeDistribution(TRAVEL_TIME_BOUNDS, mode) for mode in MODES] +
+        [TotalModeShare(MODES), ModeShareByDistance([
+            { "mode": mode, "bounds": DISTANCE_BOUNDS } for mode in MODES
+        ])]
+    )
+
+    return calculator(df)
+
+if __name__ == "__main__":
+    number_of_trips = int(sys.argv[1]) if len(sys.argv) > 1 else int(10e6)
+    df = create_trips(number_of_trips)
+
+    start = time.time()
+    single_pass = single_pass_implementation(df)
+    single_pass_time = time.time() - start
+    print("Single pass: %.2fs" % single_pass_time)
+
+    start = time.time()
+    previous = previous_implementation(df)
+    previous_time = time.time() - start
+    print("Previous implementation: %.2fs" % previous_time)
+
+    print("Speedup: %.1fx, maximum difference: %e" % (previous_time / single_pass_time, np.max(np.abs(single_pass - previous))))
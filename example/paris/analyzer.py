@@ -1,8 +1,64 @@
+from octras.trips import load_trips, TripSample
+from octras.reference import ReferenceCache
+
 import pandas as pd
 import numpy as np
 
+REFERENCE_COLUMNS = ["origin_departement_id", "destination_departement_id", "trip_weight", "euclidean_distance", "mode"]
+TRIP_COLUMNS = ["person_id", "person_trip_id", "euclidean_distance", "mode"]
+URBAN_COLUMNS = ["person_id", "person_trip_id", "urban_origin", "urban_destination"]
+
+# Distance bounds are computed from quantiles, so keep full precision
+DTYPES = { "euclidean_distance": np.float64, "trip_weight": np.float64 }
+
+def match_trips(df, df_other):
+    """
+        Returns for every trip of df the row of the same trip (by person_id
+        and person_trip_id) in df_other, or -1 if there is none. Keys are
+        combined into one integer key and matched directly if both tables
+        have the same order, with a lookup table if the keys are dense, or
+        with a binary search otherwise, instead of a pandas merge. Keys are
+        expected to be unique, the first match is used otherwise.
+    """
+    person_ids, other_person_ids = np.asarray(df["person_id"].values), np.asarray(df_other["person_id"].values)
+    trip_ids, other_trip_ids = np.asarray(df["person_trip_id"].values), np.asarray(df_other["person_trip_id"].values)
+
+    if not all(np.issubdtype(values.dtype, np.integer) for values in (person_ids, other_person_ids, trip_ids, other_trip_ids)):
+        # Encode other identifiers as integers first
+        codes = pd.factorize(np.concatenate([person_ids, other_person_ids]))[0]
+        person_ids, other_person_ids = codes[:len(person_ids)], codes[len(person_ids):]
+
+        codes = pd.factorize(np.concatenate([trip_ids, other_trip_ids]))[0]
+        trip_ids, other_trip_ids = codes[:len(trip_ids)], codes[len(trip_ids):]
+
+    factor = np.int64(max(np.max(trip_ids, initial = 0), np.max(other_trip_ids, initial = 0)) + 1)
+    keys = person_ids.astype(np.int64) * factor + trip_ids
+    other_keys = other_person_ids.astype(np.int64) * factor + other_trip_ids
+
+    if np.array_equal(keys, other_keys):
+        # Both tables are written in the same order by the pipeline
+        return np.arange(len(keys))
+
+    if len(other_keys) == 0:
+        return np.full((len(keys),), -1, dtype = np.int64)
+
+    minimum_key = np.min(keys, initial = np.min(other_keys))
+    maximum_key = np.max(keys, initial = np.max(other_keys))
+
+    if maximum_key - minimum_key < 4 * (len(keys) + len(other_keys)):
+        # Dense keys (consecutive person and trip ids) are looked up directly
+        rows = np.full((maximum_key - minimum_key + 1,), -1, dtype = np.int64)
+        rows[other_keys[::-1] - minimum_key] = np.arange(len(other_keys) - 1, -1, -1)
+        return rows[keys - minimum_key]
+
+    sorter = np.argsort(other_keys, kind = "stable")
+    other_keys = other_keys[sorter]
+
+    positions = np.minimum(np.searchsorted(other_keys, keys), len(other_keys) - 1)
+    return np.where(other_keys[positions] == keys, sorter[positions], -1)
+
 class ParisAnalyzer:
-    def __init__(self, threshold, number_of_bounds, minimum_distance, maximum_distance, reference_path, modes = ["car", "pt", "bike", "walk"], objective = "sum"):
+    def __init__(self, threshold, number_of_bounds, minimum_distance, maximum_distance, reference_path, modes = ["car", "pt", "bike", "walk"], objective = "sum", cache_path = None):
         self.threshold = threshold
         self.number_of_bounds = number_of_bounds
         self.maximum_distance = maximum_distance
@@ -11,34 +67,84 @@ class ParisAnalyzer:
         self.modes = modes
         self.objective = objective
 
-    def prepare_reference(self, reference_path):
-        df = pd.read_csv(reference_path, sep = ";")
-        df["is_urban"] = (df["origin_departement_id"] == 75) & (df["destination_departement_id"] == 75)
-        df["weight"] = df["trip_weight"]
+        self.reference_cache = ReferenceCache(cache_path)
+
+    def get_reference(self):
+        """
+            Returns the filtered reference data, bounds and shares, which are
+            computed only once per reference file and settings.
+        """
+        settings = ("ParisAnalyzer", self.number_of_bounds, self.minimum_distance, self.maximum_distance, list(self.modes))
+        return self.reference_cache.get(self.reference_path, settings, self.compute_reference)
+
+    def compute_reference(self, reference_path):
+        reference_trips = self.prepare_reference(reference_path)
+        region_bounds = self.calculate_bounds(reference_trips)
+
+        paris_trips = self.select_trips(reference_trips, reference_trips["is_urban"])
+        paris_bounds = self.calculate_bounds(paris_trips)
+
+        return {
+            "region_bounds": region_bounds,
+            "region_shares": self.calculate_shares(reference_trips, region_bounds),
+            "paris_bounds": paris_bounds,
+            "paris_shares": self.calculate_shares(paris_trips, paris_bounds)
+        }
+
+    def prepare_trips(self, sample, is_urban):
+        """
+            Returns the distances, weights, mode indices and urban flags of the
+            trips in the sample. Modes are indexed as in self.modes and all
+            other modes get the index len(self.modes). Trips are not filtered,
+            trips outside of the distance range do not fall into any band.
+        """
+        lookup = np.full((len(sample.modes) + 1,), len(self.modes), dtype = np.int64)
+
+        for mode, code in sample.modes.items():
+            if mode in self.modes:
+                lookup[code] = self.modes.index(mode)
+
+        # Trips without mode have the code -1, which points to the last entry
+        return {
+            "distance": sample.get_column("euclidean_distance"), "weight": sample.weights,
+            "mode": lookup[sample.mode_codes], "is_urban": is_urban
+        }
 
-        df = df[df["euclidean_distance"] <= self.maximum_distance]
-        df = df[df["euclidean_distance"] >= self.minimum_distance]
-        df = df[df["mode"].isin(self.modes)]
+    def select_trips(self, trips, selection):
+        return { name: values[selection] for name, values in trips.items() }
 
-        return df
+    def prepare_reference(self, reference_path):
+        # Reference data may be shared or read-only, the processed reference
+        # is cached by the ReferenceCache instead
+        df = load_trips(reference_path, REFERENCE_COLUMNS, DTYPES, cache = False)
+
+        is_urban = (df["origin_departement_id"].values == 75) & (df["destination_departement_id"].values == 75)
+        return self.prepare_trips(TripSample(df, weight = "trip_weight"), is_urban)
 
     def prepare_simulation(self, output_path):
-        df = pd.read_csv("%s/trips.csv" % output_path, sep = ";")
-        df["weight"] = 1.0
+        df = load_trips("%s/trips.csv" % output_path, TRIP_COLUMNS, DTYPES)
+        df_urban = load_trips("%s/urban.csv" % output_path, URBAN_COLUMNS)
+
+        return self.prepare_simulation_trips(df, df_urban)
 
-        df_urban = pd.read_csv("%s/urban.csv" % output_path, sep = ";")
-        df = pd.merge(df, df_urban, on = ["person_id", "person_trip_id"])
-        df["is_urban"] = df["urban_origin"] & df["urban_destination"]
+    def prepare_simulation_trips(self, df, df_urban):
+        """
+            Joins the urban flags to the simulated trips (only trips that are
+            found in both tables are kept) and prepares them.
+        """
+        rows = match_trips(df, df_urban)
+        selection = rows >= 0
+        is_urban = (df_urban["urban_origin"].values & df_urban["urban_destination"].values)[rows[selection]]
+        return self.prepare_trips(TripSample(df, selection), is_urban)
 
-        df = df[df["euclidean_distance"] <= self.maximum_distance]
-        df = df[df["euclidean_distance"] >= self.minimum_distance]
-        df = df[df["mode"].isin(self.modes)]
+    def calculate_bounds(self, trips):
+        distances = trips["distance"]
 
-        return df
+        selection = (distances <= self.maximum_distance) & (distances >= self.minimum_distance)
+        selection &= trips["mode"] < len(self.modes)
 
-    def calculate_bounds(self, df):
-        distances = df["euclidean_distance"].values
-        weights = df["weight"].values
+        distances = distances[selection]
+        weights = trips["weight"][selection]
 
         sorter = np.argsort(distances)
         distances = distances[sorter]
@@ -52,26 +158,84 @@ class ParisAnalyzer:
             for p in np.linspace(0.0, 1.0, self.number_of_bounds)[1:]
         ])
 
-    def calculate_shares(self, df, bounds):
-        totals = [
-            df[
-                (df["euclidean_distance"] >= q1) & (df["euclidean_distance"] < q2) &
-                df["mode"].isin(self.modes)]["weight"].sum()
-            for q1, q2 in zip(bounds, bounds[1:])
+    def assign_bands(self, distances, bounds, cells_per_bound = 16):
+        """
+            Returns the band of every distance for each of the given bounds
+            (-1 below the first bound, len(bounds) - 1 from the last bound on,
+            distances that are NaN are below). All bounds are merged and the
+            distances are put into the cells of a uniform grid. As the cell
+            index is monotonic in the distance, all bounds in lower cells are
+            passed and only the few bounds in the same cell need a comparison,
+            which is much faster than a binary search.
+        """
+        merged_bounds = np.unique(np.concatenate(bounds))
+
+        lower, upper = merged_bounds[0], merged_bounds[-1]
+        number_of_cells = cells_per_bound * len(merged_bounds)
+        scale = number_of_cells / (upper - lower) if upper > lower else 1.0
+
+        def get_cells(values):
+            # Cell 0 is below the grid and the last cell is above
+            cells = values * scale
+            cells += 1.0 - lower * scale
+            np.fmax(cells, 0.0, out = cells)
+            np.fmin(cells, number_of_cells + 1, out = cells)
+            return cells.astype(np.int64)
+
+        cells = get_cells(distances)
+        bound_cells = get_cells(merged_bounds)
+
+        # Number of bounds in lower cells
+        positions = np.searchsorted(bound_cells, np.arange(number_of_cells + 2))[cells]
+
+        # Compare with the bounds in the same cell
+        occupancy = np.bincount(bound_cells, minlength = number_of_cells + 2)
+
+        for offset in range(np.max(occupancy)):
+            cell_bounds = np.full((number_of_cells + 2,), np.inf)
+            selection = occupancy > offset
+            cell_bounds[selection] = merged_bounds[np.searchsorted(bound_cells, np.flatnonzero(selection)) + offset]
+
+            positions += cell_bounds[cells] <= distances
+
+        return [
+            np.concatenate([[-1], np.searchsorted(item, merged_bounds, side = "right") - 1])[positions]
+            for item in bounds
         ]
 
-        counts = {
-            mode : [df[
-                (df["euclidean_distance"] >= q1) & (df["euclidean_distance"] < q2) &
-                (df["mode"] == mode)]["weight"].sum()
-            for q1, q2 in zip(bounds, bounds[1:]) ]
-            for mode in self.modes
-        }
+    def calculate_shares(self, trips, bounds, bands = None, weights = None):
+        """
+            Calculates the mode shares in each distance band [q1, q2) of the
+            bounds. Bands and weights can be given to reuse them between calls
+            (trips with a weight of zero do not contribute). Trips outside of
+            the bands and with other modes are counted in extra rows and
+            columns, so all weights are summed up with one bincount without
+            filtering the trips.
+        """
+        number_of_bands = len(bounds) - 1
+        number_of_modes = len(self.modes)
 
-        shares = {
-            mode : np.nan_to_num(np.array(counts[mode]) / np.array(totals))
-            for mode in self.modes
-        }
+        if bands is None:
+            bands = self.assign_bands(trips["distance"], [bounds])[0]
+
+        if weights is None:
+            weights = trips["weight"]
+
+        # Bands range from -1 to number_of_bands
+        indices = (bands + 1) * (number_of_modes + 1)
+        indices += trips["mode"]
+
+        counts = np.bincount(indices, weights,
+            minlength = (number_of_bands + 2) * (number_of_modes + 1)
+        ).reshape((number_of_bands + 2, number_of_modes + 1))[1:-1, :-1]
+
+        totals = np.sum(counts, axis = 1)
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            shares = {
+                mode : np.nan_to_num(counts[:, index] / totals)
+                for index, mode in enumerate(self.modes)
+            }
 
         return shares
 
@@ -101,22 +265,23 @@ class ParisAnalyzer:
         return objective
 
     def execute(self, output_path):
-        df_reference = self.prepare_reference(self.reference_path)
-        df_simulation = self.prepare_simulation(output_path)
+        reference = self.get_reference()
+        simulation_trips = self.prepare_simulation(output_path)
 
         # Regional shares
-        region_bounds = self.calculate_bounds(df_reference)
-        region_reference_shares = self.calculate_shares(df_reference, region_bounds)
-        region_simulation_shares = self.calculate_shares(df_simulation, region_bounds)
-        region_objective = self.calculate_objective(region_reference_shares, region_simulation_shares)
+        region_bounds = reference["region_bounds"]
+        region_reference_shares = reference["region_shares"]
+        paris_bounds = reference["paris_bounds"]
 
-        # Paris shares
-        df_reference = df_reference[df_reference["is_urban"]]
-        df_simulation = df_simulation[df_simulation["is_urban"]]
+        region_bands, paris_bands = self.assign_bands(simulation_trips["distance"], [region_bounds, paris_bounds])
+
+        region_simulation_shares = self.calculate_shares(simulation_trips, region_bounds, region_bands)
+        region_objective = self.calculate_objective(region_reference_shares, region_simulation_shares)
 
-        paris_bounds = self.calculate_bounds(df_reference)
-        paris_reference_shares = self.calculate_shares(df_reference, paris_bounds)
-        paris_simulation_shares = self.calculate_shares(df_simulation, paris_bounds)
+        # Paris shares, only urban trips contribute
+        paris_reference_shares = reference["paris_shares"]
+        paris_simulation_shares = self.calculate_shares(simulation_trips, paris_bounds, paris_bands,
+            simulation_trips["weight"] * simulation_trips["is_urban"])
         paris_objective = self.calculate_objective(paris_reference_shares, paris_simulation_shares)
 
         # Total objective
@@ -1,54 +1,159 @@
+from octras.reference import ReferenceCache
+
 import pandas as pd
 import numpy as np
-import scipy.optimize as opt
+
+ROAD_TYPES = ["motorway", "trunk", "primary", "secondary"]
 
 class ParisDailyFlowAnalyzer:
-    def __init__(self, reference_path):
+    def __init__(self, reference_path, objective = "daily", threshold = 0.2, cache_path = None):
         self.reference_path = reference_path
+        self.objective = objective
+        self.threshold = threshold
+
+        self.reference_cache = ReferenceCache(cache_path)
+
+    def get_reference(self):
+        """
+            Returns the reference counts by link (and by link and hour if the
+            reference has an hour column), which are computed only once per
+            reference file.
+        """
+        settings = ("ParisDailyFlowAnalyzer", ROAD_TYPES)
+        return self.reference_cache.get(self.reference_path, settings, self.prepare_reference)
 
     def prepare_reference(self, reference_path):
+        """
+            Reads the reference and maps all links to a dense index, so that
+            simulation counts can be accumulated into arrays aligned with the
+            reference vector.
+        """
         df = pd.read_csv(reference_path, sep = ";")
-        df = df[df["osm"].isin(["motorway", "trunk", "primary", "secondary"])]
-        df = df.groupby("link_id").sum().reset_index()[["link_id", "flow"]]
-        df = df.rename(columns = { "flow": "reference_count" })
-        return df
-
-    def prepare_simulation(self, output_path):
-        df = pd.read_csv("%s/flows.csv" % output_path, sep = ";")
-        df = df.groupby("link_id").sum().reset_index()[["link_id", "count"]]
-        df = df.rename(columns = { "count": "simulation_count" })
-        return df
-
-    def calculate_factor(self, df):
-        f = lambda x: np.sum(np.abs((df["simulation_count"] * x - df["reference_count"]))**2)
-        result = opt.minimize_scalar(f)
-        return result.x
-
-    def calculate_objective(self, df, factor):
-        objective = 0.0
-
-        simulation_values = df["simulation_count"].values * factor
-        reference_values = df["reference_count"].values
-        relative_errors = np.abs((simulation_values - reference_values) / reference_values)
-        capped_errors = np.maximum(0.2, relative_errors) - 0.2
+        df = df[df["osm"].isin(ROAD_TYPES)]
+
+        link_ids, indices = np.unique(df["link_id"].values, return_inverse = True)
+        flows = df["flow"].values.astype(np.float64)
+
+        reference = {
+            "link_ids": link_ids,
+            "daily": np.bincount(indices, flows, minlength = len(link_ids)),
+            "hourly": None
+        }
+
+        if "hour" in df:
+            hours = df["hour"].values.astype(np.int64)
+            number_of_hours = np.max(hours, initial = -1) + 1
+
+            reference["hourly"] = np.bincount(
+                indices * number_of_hours + hours, flows,
+                minlength = len(link_ids) * number_of_hours
+            ).reshape((len(link_ids), number_of_hours))
+
+        return reference
+
+    def prepare_simulation(self, output_path, reference):
+        """
+            Accumulates the simulated counts into arrays that are aligned with
+            the reference. Links that are not in the reference are ignored and
+            the returned mask indicates which reference links have been found
+            in the simulation output.
+        """
+        df = pd.read_csv("%s/flows.csv" % output_path, sep = ";", usecols = lambda column: column in ("link_id", "hour", "count"))
+
+        link_ids = reference["link_ids"]
+        counts = df["count"].values.astype(np.float64)
+
+        positions = np.minimum(np.searchsorted(link_ids, df["link_id"].values), max(len(link_ids) - 1, 0))
+        selection = link_ids[positions] == df["link_id"].values if len(link_ids) > 0 else np.zeros((len(df),), dtype = bool)
+        indices = positions[selection]
+
+        simulation = {
+            "found": np.bincount(indices, minlength = len(link_ids)) > 0,
+            "daily": np.bincount(indices, counts[selection], minlength = len(link_ids)),
+            "hourly": None
+        }
+
+        if not reference["hourly"] is None and "hour" in df:
+            number_of_hours = reference["hourly"].shape[1]
+            hours = df["hour"].values[selection].astype(np.int64)
+            hour_selection = (hours >= 0) & (hours < number_of_hours)
+
+            simulation["hourly"] = np.bincount(
+                indices[hour_selection] * number_of_hours + hours[hour_selection],
+                counts[selection][hour_selection], minlength = len(link_ids) * number_of_hours
+            ).reshape((len(link_ids), number_of_hours))
+
+        return simulation
+
+    def calculate_factor(self, simulation_values, reference_values):
+        """
+            Returns the factor x that minimizes sum((x * s - r)^2), which is
+            sum(s * r) / sum(s * s).
+        """
+        denominator = np.sum(simulation_values**2)
+
+        if denominator == 0.0:
+            return 0.0
+
+        return np.sum(simulation_values * reference_values) / denominator
+
+    def calculate_objective(self, simulation_values, reference_values, factor):
+        relative_errors = np.abs((simulation_values * factor - reference_values) / reference_values)
+        capped_errors = np.maximum(self.threshold, relative_errors) - self.threshold
 
         return np.mean(capped_errors)
 
     def execute(self, output_path):
-        df_reference = self.prepare_reference(self.reference_path)
-        df_simulation = self.prepare_simulation(output_path)
-        df_comparison = pd.merge(df_reference, df_simulation, on = "link_id")
-        df_comparison = df_comparison[df_comparison["reference_count"] > 0.0]
+        reference = self.get_reference()
+        simulation = self.prepare_simulation(output_path, reference)
+
+        # Daily comparison
+        selection = simulation["found"] & (reference["daily"] > 0.0)
+
+        reference_values = reference["daily"][selection]
+        simulation_values = simulation["daily"][selection]
 
-        factor = self.calculate_factor(df_comparison)
-        objective = self.calculate_objective(df_comparison, factor)
+        factor = self.calculate_factor(simulation_values, reference_values)
+        daily_objective = self.calculate_objective(simulation_values, reference_values, factor)
 
-        return {
+        df_comparison = pd.DataFrame({
+            "link_id": reference["link_ids"][selection],
+            "reference_count": reference_values,
+            "simulation_count": simulation_values
+        })
+
+        result = {
             "comparison": df_comparison,
-            "objective": objective,
+            "daily_objective": daily_objective,
             "factor": factor,
         }
 
+        # Hourly comparison, using the same scaling factor
+        if not simulation["hourly"] is None:
+            hourly_selection = simulation["found"][:,np.newaxis] & (reference["hourly"] > 0.0)
+
+            result["hourly_reference_counts"] = reference["hourly"][selection]
+            result["hourly_simulation_counts"] = simulation["hourly"][selection]
+            result["hourly_objective"] = self.calculate_objective(
+                simulation["hourly"][hourly_selection], reference["hourly"][hourly_selection], factor)
+
+        if self.objective == "daily":
+            result["objective"] = daily_objective
+
+        elif self.objective in ("hourly", "sum"):
+            if not "hourly_objective" in result:
+                raise RuntimeError("Hourly comparison requires an hour column in the reference and the simulation output")
+
+            if self.objective == "hourly":
+                result["objective"] = result["hourly_objective"]
+            else:
+                result["objective"] = 0.5 * (daily_objective + result["hourly_objective"])
+
+        else:
+            raise RuntimeError("Unknown objective: %s" % self.objective)
+
+        return result
+
 if __name__ == "__main__":
     analyzer = ParisDailyFlowAnalyzer(
         reference_path = "/home/shoerl/backup/gpe/matching/hourly_reference.csv")
@@ -2,7 +2,10 @@ from .random_walk import RandomWalk
 from .scipy import ScipyAlgorithm
 from .fdsa import FDSA
 from .spsa import SPSA
+from .adaptive_spsa import AdaptiveSPSA
 from .opdyts import Opdyts
 from .cma_es import CMAES
+from .async_cma_es import AsynchronousCMAES
+from .surrogate import RBFSurrogate
 #from .bbo import BatchBayesianOptimization
 from .nelder_mead import NelderMead
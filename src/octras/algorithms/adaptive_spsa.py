@@ -0,0 +1,188 @@
+import numpy as np
+import deep_merge
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Spall, J.C. (2000) Adaptive stochastic approximation by the simultaneous
+# perturbation method, IEEE Transactions on Automatic Control, 45 (10) 1839-1853
+
+class AdaptiveSPSA:
+    """
+        Second-order SPSA (2SPSA). Besides the gradient pair, every iteration
+        submits two more runs that are perturbed once more in an independent
+        direction. They give one-sided gradient estimates at both points of the
+        gradient pair, from which a Hessian estimate is obtained. The estimates
+        are averaged over the iterations and the smoothed Hessian (made
+        positive definite) is used to precondition the gradient step. All runs
+        of an iteration are submitted at once, so with four parallel slots the
+        Hessian estimation does not add any waiting time.
+
+        As the early estimates have a low rank, the safeguards proposed by
+        Spall are applied: during the first warmup_iterations (by default,
+        five times the number of parameters), first-order SPSA steps are made
+        that are scaled by the largest eigenvalue of the smoothed Hessian and
+        no feedback is applied to the estimates. Afterwards, the eigenvalues
+        of the preconditioner are bounded from below relative to the largest
+        one, by a factor that decays with the square root of the iteration.
+        Steps that are longer than maximum_step (by default, ten times the
+        current perturbation length per parameter) are shortened.
+    """
+
+    def __init__(self, evaluator, perturbation_factor, gradient_factor = 1.0, hessian_perturbation_factor = None, perturbation_exponent = 0.101, gradient_exponent = 0.602, gradient_offset = 0, minimum_eigenvalue = 1e-6, relative_eigenvalue = 0.3, warmup_iterations = None, maximum_step = None, compute_objective = True, common_random_numbers = False, seed = None):
+        self.evaluator = evaluator
+
+        self.perturbation_factor = perturbation_factor
+        self.perturbation_exponent = perturbation_exponent
+
+        # Perturbation for the one-sided gradients at the perturbed points
+        self.hessian_perturbation_factor = perturbation_factor if hessian_perturbation_factor is None else hessian_perturbation_factor
+
+        self.gradient_factor = gradient_factor
+        self.gradient_exponent = gradient_exponent
+        self.gradient_offset = gradient_offset
+
+        # Eigenvalues of the smoothed Hessian are taken by absolute value and
+        # bounded from below to obtain a positive definite preconditioner
+        self.minimum_eigenvalue = minimum_eigenvalue
+        self.relative_eigenvalue = relative_eigenvalue
+
+        self.warmup_iterations = warmup_iterations
+        self.maximum_step = maximum_step
+
+        self.compute_objective = compute_objective
+        self.common_random_numbers = common_random_numbers
+
+        self.iteration = 0
+
+        self.seed = seed
+        self.random = np.random.RandomState(self.seed)
+
+        if not hasattr(self.evaluator.problem, "initial"):
+            raise RuntimeError("Initial parameters must be provided by problem for AdaptiveSPSA")
+
+        self.parameters = None
+        self.hessian = None
+
+    def _sample_direction(self):
+        # Rademacher distribution
+        return 2.0 * self.random.randint(0, 2, len(self.parameters)) - 1.0
+
+    def get_warmup_iterations(self):
+        return 5 * len(self.parameters) if self.warmup_iterations is None else self.warmup_iterations
+
+    def get_preconditioner(self):
+        """
+            Returns the smoothed Hessian with the eigenvalues replaced by their
+            absolute values, bounded from below by a decaying fraction of the
+            largest one (and by minimum_eigenvalue). During the warmup
+            iterations, the identity scaled by the largest eigenvalue is
+            returned instead.
+        """
+        eigenvalues, eigenvectors = np.linalg.eigh(self.hessian)
+        eigenvalues = np.abs(eigenvalues)
+
+        maximum_eigenvalue = max(np.max(eigenvalues), self.minimum_eigenvalue)
+
+        if self.iteration <= self.get_warmup_iterations():
+            return np.eye(len(eigenvalues)) * maximum_eigenvalue
+
+        # Lower bound decays as the smoothed Hessian becomes more accurate
+        relative_eigenvalue = min(1.0, self.relative_eigenvalue * np.sqrt(self.get_warmup_iterations() / self.iteration))
+        eigenvalues = np.maximum(eigenvalues, relative_eigenvalue * maximum_eigenvalue)
+        return np.dot(eigenvectors * eigenvalues, eigenvectors.T)
+
+    def advance(self):
+        self.iteration += 1
+        logger.info("Starting AdaptiveSPSA iteration %d." % self.iteration)
+
+        if self.parameters is None:
+            self.parameters = np.array(self.evaluator.problem.initial, dtype = float)
+            self.hessian = np.zeros((len(self.parameters), len(self.parameters)))
+
+        seed_group = self.evaluator.seed_group() if self.common_random_numbers else None
+
+        # Calculate objective
+        if self.compute_objective:
+            annotations = { "type": "objective" }
+            objective_identifier = self.evaluator.submit(self.parameters, annotations = annotations, seed_group = seed_group)
+
+        # Update step lengths
+        gradient_length = self.gradient_factor / (self.iteration + self.gradient_offset)**self.gradient_exponent
+        perturbation_length = self.perturbation_factor / self.iteration**self.perturbation_exponent
+        hessian_perturbation_length = self.hessian_perturbation_factor / self.iteration**self.perturbation_exponent
+
+        direction = self._sample_direction()
+        hessian_direction = self._sample_direction()
+
+        snapshot = self.evaluator.snapshot({
+            "parameters": np.copy(self.parameters),
+            "direction": direction,
+            "hessian_direction": hessian_direction,
+            "hessian": np.copy(self.hessian)
+        })
+
+        annotations = {
+            "gradient_length": gradient_length,
+            "perturbation_length": perturbation_length,
+            "hessian_perturbation_length": hessian_perturbation_length,
+            "type": "gradient"
+        }
+
+        # Schedule gradient and Hessian samples at once
+        identifiers = {}
+
+        for sign, name in ((1.0, "positive"), (-1.0, "negative")):
+            parameters = self.parameters + sign * perturbation_length * direction
+            identifiers[name + "_gradient"] = self.evaluator.submit(parameters,
+                annotations = deep_merge.merge(dict(annotations), { "type": name + "_gradient" }),
+                snapshot = snapshot, seed_group = seed_group)
+
+            parameters = parameters + hessian_perturbation_length * hessian_direction
+            identifiers[name + "_hessian"] = self.evaluator.submit(parameters,
+                annotations = deep_merge.merge(dict(annotations), { "type": name + "_hessian" }),
+                snapshot = snapshot, seed_group = seed_group)
+
+        # Wait for gradient run results
+        self.evaluator.wait()
+
+        if self.compute_objective:
+            self.evaluator.clean(objective_identifier)
+
+        objectives = {}
+
+        for name, identifier in identifiers.items():
+            objectives[name], state = self.evaluator.get(identifier)
+            self.evaluator.clean(identifier)
+
+        g_k = (objectives["positive_gradient"] - objectives["negative_gradient"]) / (2.0 * perturbation_length) / direction
+
+        # One-sided gradients at both perturbed points and Hessian estimate
+        positive_gradient = (objectives["positive_hessian"] - objectives["positive_gradient"]) / hessian_perturbation_length / hessian_direction
+        negative_gradient = (objectives["negative_hessian"] - objectives["negative_gradient"]) / hessian_perturbation_length / hessian_direction
+
+        H_k = np.outer((positive_gradient - negative_gradient) / (2.0 * perturbation_length), 1.0 / direction)
+
+        # Feedback: remove the error terms that the directions introduce into
+        # the estimate, computed from the current smoothed Hessian. Early on,
+        # the errors of the smoothed Hessian would be amplified instead.
+        if self.iteration > self.get_warmup_iterations():
+            D = np.outer(direction, 1.0 / direction) - np.eye(len(direction))
+            D_tilde = np.outer(hessian_direction, 1.0 / hessian_direction) - np.eye(len(direction))
+            H_k -= np.dot(D_tilde.T, self.hessian) + np.dot(self.hessian, D) + np.dot(np.dot(D_tilde.T, self.hessian), D)
+
+        H_k = 0.5 * (H_k + H_k.T)
+
+        # Update smoothed Hessian and state
+        self.hessian = (self.iteration - 1.0) / self.iteration * self.hessian + H_k / self.iteration
+        step = gradient_length * np.linalg.solve(self.get_preconditioner(), g_k)
+
+        # Shorten steps that are implausibly long
+        maximum_step = 10.0 * perturbation_length * np.sqrt(len(step)) if self.maximum_step is None else self.maximum_step
+        step_length = np.sqrt(np.sum(step**2))
+
+        if step_length > maximum_step:
+            logger.info("Shortening AdaptiveSPSA step from %f to %f." % (step_length, maximum_step))
+            step *= maximum_step / step_length
+
+        self.parameters = self.parameters - step
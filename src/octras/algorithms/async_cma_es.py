@@ -0,0 +1,102 @@
+from .cma_es import CMAES
+
+import numpy as np
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+class AsynchronousCMAES(CMAES):
+    """
+        Steady-state variant of CMA-ES. Instead of waiting for a full
+        generation, all parallel slots of the evaluator are kept busy: as soon
+        as a run has finished, a new candidate is sampled from the current
+        search distribution and submitted. The distribution is updated
+        whenever update_size results have arrived (by default, the recommended
+        candidate set size), using the candidates in the order in which they
+        have finished. Candidates that are still running when the
+        distribution changes are used in a later update with their steps
+        taken relative to the mean at that time.
+
+        An iteration of the algorithm corresponds to one update of the search
+        distribution. All other arguments are the same as for CMAES.
+    """
+
+    def __init__(self, evaluator, update_size = None, **arguments):
+        super().__init__(evaluator, candidate_set_size = update_size, **arguments)
+
+        # Candidates that have been submitted, but not used yet
+        self.pending = {}
+        self.arrived = []
+
+        self.snapshot = None
+
+    def _sample_candidate(self):
+        if self.snapshot is None:
+            self.snapshot = self.evaluator.snapshot(self.get_snapshot())
+
+        parameters, z = self._sample(1)
+        parameters, z = parameters[0], z[:,0]
+
+        annotations = { "type": "candidate", "iteration": self.iteration, "sigma": self.sigma, "restart": self.restart }
+        identifier = self.evaluator.submit(parameters, annotations = annotations, snapshot = self.snapshot)
+
+        self.pending[identifier] = (parameters, z, self.restart)
+
+    def _fill_pending(self):
+        while len(self.pending) < max(1, self.evaluator.parallel):
+            self._sample_candidate()
+
+    def _collect(self):
+        # Returns whether new results have arrived
+        finished = [identifier for identifier in self.pending if self.evaluator.ready(identifier)]
+
+        for identifier in finished:
+            parameters, z, restart = self.pending.pop(identifier)
+            objective = self.evaluator.get(identifier)[0]
+            self.evaluator.clean(identifier)
+
+            if not self.surrogate is None:
+                self.surrogate.add(parameters, objective)
+
+            if self.best_objective is None or objective < self.best_objective:
+                self.best_objective = objective
+                self.best_parameters = np.copy(parameters)
+
+            # Candidates from before a restart are not used for the update
+            if restart == self.restart:
+                self.arrived.append((parameters, z, objective))
+
+        return len(finished) > 0
+
+    def advance(self):
+        if self.iteration == 0:
+            self.mean = np.array(self.evaluator.problem.initial, dtype = float).reshape((self.N,))
+
+        self.iteration += 1
+        logger.info("Starting asynchronous CMA-ES iteration %d." % self.iteration)
+
+        # Keep all slots busy until enough results have arrived
+        while len(self.arrived) < self.L:
+            self._fill_pending()
+
+            if not self._collect():
+                time.sleep(self.evaluator.interval)
+
+        selected, self.arrived = self.arrived[:self.L], self.arrived[self.L:]
+
+        candidate_parameters = np.array([item[0] for item in selected])
+        candidate_z = np.array([item[1] for item in selected]).T
+        candidate_objectives = np.array([item[2] for item in selected])
+
+        restart = self.restart
+
+        self.counteval += self.L
+        self.process(candidate_parameters, candidate_z, candidate_objectives)
+
+        if self.restart != restart:
+            self.arrived = []
+
+        # Resample immediately into the slots that have been freed
+        self.snapshot = None
+        self._fill_pending()
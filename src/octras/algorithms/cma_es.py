@@ -5,24 +5,83 @@ import logging
 logger = logging.getLogger(__name__)
 
 # https://en.wikipedia.org/wiki/CMA-ES
+#
+# Variants for many parameters:
+# - "separable": Ros, R., Hansen, N. (2008) A Simple Modification in CMA-ES
+#   Achieving Linear Time and Space Complexity, PPSN X, 296-305
+# - "limited": Loshchilov, I., Glasmachers, T., Beyer, H.-G. (2019) Large Scale
+#   Black-Box Optimization by Limited-Memory Matrix Adaptation, IEEE
+#   Transactions on Evolutionary Computation, 23 (2) 353-358
+
+VARIANTS = ("full", "separable", "limited")
+
+# Restart strategies with increasing population size:
+# - "ipop": Auger, A., Hansen, N. (2005) A Restart CMA Evolution Strategy With
+#   Increasing Population Size, IEEE CEC 2005, 1769-1776
+# - "bipop": Hansen, N. (2009) Benchmarking a BI-Population CMA-ES on the
+#   BBOB-2009 Function Testbed, GECCO 2009, 2389-2396
+RESTARTS = (None, "ipop", "bipop")
 
 class CMAES:
-    def __init__(self, evaluator, candidate_set_size = None, initial_step_size = 0.3, seed = None):
+    def __init__(self, evaluator, candidate_set_size = None, initial_step_size = 0.3, seed = None, variant = "full", memory_size = None, restarts = None, population_factor = 2.0, tolerance_x = 1e-12, tolerance_function = 1e-12, maximum_condition = 1e14, surrogate = None):
         self.evaluator = evaluator
         self.problem = self.evaluator.problem
 
         if not hasattr(self.problem, "initial"):
             raise RuntimeError("CMA-ES expects the problem to provide initial parameters.")
 
+        if not variant in VARIANTS:
+            raise RuntimeError("Unknown CMA-ES variant: %s" % variant)
+
+        if not restarts in RESTARTS:
+            raise RuntimeError("Unknown CMA-ES restart strategy: %s" % restarts)
+
+        self.variant = variant
+        self.memory_size = memory_size
+
         # Selection parameters
-        L_default = 4 + int(np.floor(3 * np.log(self.problem.number_of_parameters)))
-        self.L = L_default if candidate_set_size is None else candidate_set_size
+        self.L_default = 4 + int(np.floor(3 * np.log(self.problem.number_of_parameters)))
+        L = self.L_default if candidate_set_size is None else candidate_set_size
 
-        if not candidate_set_size is None and candidate_set_size < L_default:
-            logger.warning("Using requested candidate set size %d (recommended is at least %d!)" % (candidate_set_size, L_default))
+        if not candidate_set_size is None and candidate_set_size < self.L_default:
+            logger.warning("Using requested candidate set size %d (recommended is at least %d!)" % (candidate_set_size, self.L_default))
 
         # Initialize static parameters
         self.N = self.problem.number_of_parameters
+        self.chiN = self.N**0.5 * (1.0 - 1.0 / (4.0 * self.N) + 1.0 / (21.0 * self.N**2))
+
+        # Termination and restarts (IPOP or BIPOP)
+        self.restarts = restarts
+        self.population_factor = population_factor
+        self.tolerance_x = tolerance_x
+        self.tolerance_function = tolerance_function
+        self.maximum_condition = maximum_condition
+
+        self.restart = 0
+        self.large_L = L
+        self.budgets = { "large": 0, "small": 0 }
+        self.regime = "large"
+
+        self.best_objective = None
+        self.best_parameters = None
+
+        # Optional pre-screening of the candidates (see RBFSurrogate)
+        self.surrogate = surrogate
+
+        # Initialize algorithm parameters
+        self.iteration = 0
+        self.mean = None
+        self.initial_step_size = initial_step_size
+
+        self.random = np.random.RandomState(seed)
+        self._initialize(L, initial_step_size)
+
+    def _initialize(self, L, sigma):
+        """
+            Initializes the selection and adaptation parameters for candidate
+            set size L and resets the search distribution.
+        """
+        self.L = L
 
         self.mu = self.L / 2.0
         self.weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
@@ -37,45 +96,124 @@ class CMAES:
         self.cmu = min(1.0 - self.c1, 2.0 * (self.mueff - 2.0 + 1.0 / self.mueff) / ((self.N + 2.0)**2 + self.mueff))
         self.damps = 1.0 + 2.0 * max(0, np.sqrt((self.mueff - 1.0) / (self.N + 1.0)) - 1.0) + self.cs
 
+        if self.variant == "separable":
+            # A diagonal covariance can be learned faster
+            self.c1 *= (self.N + 2.0) / 3.0
+            self.cmu = min(1.0 - self.c1, self.cmu * (self.N + 2.0) / 3.0)
+
         # Initialize dynamic parameters
-        self.pc = np.zeros((self.N,1))
-        self.ps = np.zeros((self.N,1))
-        self.B = np.eye(self.N)
-        self.D = np.ones((self.N,))
-        self.C = np.dot(self.B, np.dot(np.diag(self.D**2), self.B.T))
-        self.invsqrtC = np.dot(self.B, np.dot(np.diag(self.D**-1), self.B.T))
+        self.pc = np.zeros((self.N,))
+        self.ps = np.zeros((self.N,))
+
+        if self.variant == "full":
+            self.B = np.eye(self.N)
+            self.D = np.ones((self.N,))
+            self.C = np.eye(self.N)
+
+        elif self.variant == "separable":
+            # Only the diagonal of the covariance matrix is kept
+            self.C = np.ones((self.N,))
+            self.D = np.ones((self.N,))
+
+        elif self.variant == "limited":
+            # Instead of a covariance matrix, a limited number of evolution
+            # paths with different learning rates is kept
+            if self.memory_size is None:
+                self.memory_size = 4 + int(np.floor(3 * np.log(self.N)))
+
+            self.M = np.zeros((self.memory_size, self.N))
+
+            self.cs = min(1.0, 2.0 * self.L / self.N)
+            self.cd = 1.0 / (1.5**np.arange(self.memory_size) * self.N)
+            self.cm = np.minimum(1.0, self.L / (4.0**np.arange(self.memory_size) * self.N))
+
         self.eigeneval = 0
         self.counteval = 0
-        self.chiN = self.N**0.5 * (1.0 - 1.0 / (4.0 * self.N) + 1.0 / (21.0 * self.N**2))
 
-        # Initialize algorithm parameters
-        self.iteration = 0
-        self.mean = None
-        self.sigma = initial_step_size
+        self.sigma = sigma
+        self.generation = 0
+        self.objective_history = []
+        self.termination = None
+
+    def _transform(self, z):
+        """
+            Transforms standard normal samples (one per column) into samples
+            of the current search distribution (without mean and step size).
+        """
+        if self.variant == "full":
+            return np.dot(self.B, self.D[:, np.newaxis] * z)
+
+        elif self.variant == "separable":
+            return self.D[:, np.newaxis] * z
+
+        elif self.variant == "limited":
+            d = np.copy(z)
+
+            for j in range(min(self.generation, self.memory_size)):
+                d = (1.0 - self.cd[j]) * d + self.cd[j] * np.outer(self.M[j], np.dot(self.M[j], d))
+
+            return d
+
+    def _invsqrt(self, y):
+        # Multiplies a vector with the inverse square root of the covariance
+        if self.variant == "full":
+            return np.dot(self.B, np.dot(self.B.T, y) / self.D)
+
+        return y / self.D
+
+    def _sample(self, count):
+        """
+            Samples count candidates (one per row) from the search distribution
+            and returns them with the standard normal samples they have been
+            generated from (one per column). With a surrogate, more candidates
+            are sampled and the ones with the best predictions are returned.
+        """
+        if not self.surrogate is None and self.surrogate.is_ready():
+            z = self.random.normal(size = (self.N, count * self.surrogate.oversampling))
+        else:
+            z = self.random.normal(size = (self.N, count))
+
+        parameters = (self.mean[:, np.newaxis] + self.sigma * self._transform(z)).T
+
+        if not self.surrogate is None:
+            selection = self.surrogate.screen(parameters, count)
+            parameters, z = parameters[selection], z[:, selection]
+
+        return parameters, z
+
+    def get_snapshot(self):
+        snapshot = {
+            "mean": np.copy(self.mean),
+            "pc": np.copy(self.pc), "ps": np.copy(self.ps),
+            "sigma": self.sigma, "variant": self.variant,
+            "restart": self.restart
+        }
 
-        self.random = np.random.RandomState(seed)
+        if self.variant == "limited":
+            snapshot["covariance"] = None
+            snapshot["paths"] = np.copy(self.M)
+        else:
+            snapshot["covariance"] = np.copy(self.C)
+
+        return snapshot
 
     def advance(self):
         if self.iteration == 0:
-            self.mean = np.copy(self.evaluator.problem.initial).reshape((self.N, 1))
+            self.mean = np.array(self.evaluator.problem.initial, dtype = float).reshape((self.N,))
 
         self.iteration += 1
         logger.info("Starting CMA-ES iteration %d." % self.iteration)
 
-        annotations = {
-            "mean": self.mean,
-            "covariance": self.C, "pc": self.pc, "ps": self.ps,
-            "sigma": self.sigma
-        }
+        snapshot = self.evaluator.snapshot(self.get_snapshot())
+
+        annotations = { "type": "candidate", "iteration": self.iteration, "sigma": self.sigma, "restart": self.restart }
 
         self.counteval += self.L
 
-        candidate_parameters = self.sigma * np.dot(
-            (self.random.normal(size = (self.N, self.L)) * self.D[:, np.newaxis]).T, self.B
-        ) + self.mean.T
+        candidate_parameters, candidate_z = self._sample(self.L)
 
         candidate_identifiers = [
-            self.evaluator.submit(parameters, annotations = annotations)
+            self.evaluator.submit(parameters, annotations = annotations, snapshot = snapshot)
             for parameters in candidate_parameters
         ]
 
@@ -92,46 +230,181 @@ class CMAES:
         for identifier in candidate_identifiers:
             self.evaluator.clean(identifier)
 
-        sorter = np.argsort(candidate_objectives)
+        if not self.surrogate is None:
+            self.surrogate.add(candidate_parameters, candidate_objectives)
+
+        self.process(candidate_parameters, candidate_z, candidate_objectives)
 
-        candidate_objectives = candidate_objectives[sorter]
-        candidate_parameters = candidate_parameters[sorter, :]
+    def process(self, candidate_parameters, candidate_z, candidate_objectives):
+        """
+            Updates the search distribution from a set of evaluated candidates
+            (one per row), the standard normal samples they have been
+            generated from (one per column) and their objectives. Afterwards,
+            the termination criteria are checked and the search is restarted
+            if requested.
+        """
+        sorter = np.argsort(candidate_objectives)
 
+        if self.best_objective is None or candidate_objectives[sorter[0]] < self.best_objective:
+            self.best_objective = candidate_objectives[sorter[0]]
+            self.best_parameters = np.copy(candidate_parameters[sorter[0]])
+
+        self.objective_history.append(candidate_objectives[sorter[0]])
+        self.budgets[self.regime] += len(candidate_objectives)
+
+        sorter = sorter[:self.mu]
+        self.update(candidate_parameters[sorter], candidate_z[:, sorter])
+        self.generation += 1
+
+        reason = self.get_termination(candidate_objectives)
+
+        if not reason is None:
+            if self.restarts is None:
+                if self.termination is None:
+                    logger.warning("CMA-ES meets termination criterion: %s" % reason)
+
+                self.termination = reason
+            else:
+                logger.info("Restarting CMA-ES (%s)" % reason)
+                self.restart_search()
+
+    def get_termination(self, candidate_objectives):
+        """
+            Returns the criterion that indicates that the current descent has
+            stalled (or None): TolFun, TolX or the condition of the covariance.
+        """
+        history_length = 10 + int(np.ceil(30.0 * self.N / self.L))
+        history = self.objective_history[-history_length:]
+
+        if len(history) == history_length:
+            values = np.concatenate([history, candidate_objectives])
+
+            if np.max(values) - np.min(values) < self.tolerance_function:
+                return "TolFun"
+
+        if self.variant == "limited":
+            scales = np.ones((self.N,))
+        elif self.variant == "full":
+            scales = np.sqrt(np.diag(self.C))
+        else:
+            scales = np.sqrt(self.C)
+
+        tolerance_x = self.tolerance_x * self.initial_step_size
+
+        if np.all(self.sigma * scales < tolerance_x) and np.all(np.abs(self.sigma * self.pc) < tolerance_x):
+            return "TolX"
+
+        if self.variant != "limited" and np.max(self.D)**2 > self.maximum_condition * np.min(self.D)**2:
+            return "ConditionCov"
+
+        return None
+
+    def _fill_slots(self, L):
+        # Round up to use all parallel slots of the evaluator
+        parallel = max(1, self.evaluator.parallel)
+        return int(np.ceil(L / parallel) * parallel)
+
+    def _sample_mean(self):
+        # Restarts begin at a random point within the bounds (if available)
+        if hasattr(self.problem, "bounds"):
+            bounds = np.array(self.problem.bounds, dtype = float)
+            return bounds[:,0] + self.random.random_sample(self.N) * (bounds[:,1] - bounds[:,0])
+
+        return np.array(self.problem.initial, dtype = float).reshape((self.N,))
+
+    def restart_search(self):
+        """
+            Restarts the search with a larger population (IPOP). For BIPOP, a
+            regime with a small population and a small step size is
+            interleaved whenever it has used less evaluations than the large
+            regime. The best candidate is kept over all restarts.
+        """
+        self.restart += 1
+
+        if self.restarts == "bipop" and self.restart > 1 and self.budgets["small"] < self.budgets["large"]:
+            self.regime = "small"
+
+            u = self.random.random_sample()
+            L = int(np.floor(self.L_default * (0.5 * self.large_L / self.L_default)**(u**2)))
+            sigma = self.initial_step_size * 10.0**(-2.0 * self.random.random_sample())
+        else:
+            self.regime = "large"
+
+            self.large_L = self._fill_slots(self.large_L * self.population_factor)
+            L, sigma = self.large_L, self.initial_step_size
+
+        L = self._fill_slots(max(L, 2))
+        logger.info("CMA-ES restart %d (%s population of %d)" % (self.restart, self.regime, L))
+
+        self._initialize(L, sigma)
+        self.mean = self._sample_mean()
+
+    def update(self, selected_parameters, selected_z):
+        """
+            Updates the search distribution from the mu best candidates (one per
+            row, ordered by objective) and the standard normal samples they have
+            been generated from (one per column).
+        """
         # Update mean
         previous_mean = self.mean
-        self.mean = np.sum(candidate_parameters[:self.mu] * self.weights[:, np.newaxis], axis = 0).reshape((self.N, 1))
+        self.mean = np.dot(self.weights, selected_parameters)
+
+        mean_step = (self.mean - previous_mean) / self.sigma
+
+        if self.variant == "limited":
+            self._update_limited(selected_z)
+            return
 
         # Update evolution paths
         psa = (1.0 - self.cs ) * self.ps
-        psb = np.sqrt(self.cs * (2.0 - self.cs) * self.mueff) * np.dot(self.invsqrtC, self.mean - previous_mean) / self.sigma
+        psb = np.sqrt(self.cs * (2.0 - self.cs) * self.mueff) * self._invsqrt(mean_step)
         self.ps = psa + psb
 
         hsig = la.norm(self.ps) / np.sqrt(1.0 - (1.0 - self.cs)**(2.0 * self.counteval / self.L)) / self.chiN < 1.4 + 2.0 / (self.N + 1.0)
         pca = (1.0 - self.cc) * self.pc
-        pcb = hsig * np.sqrt(self.cc * (2.0 - self.cc) * self.mueff) * (self.mean - previous_mean) / self.sigma
+        pcb = hsig * np.sqrt(self.cc * (2.0 - self.cc) * self.mueff) * mean_step
         self.pc = pca + pcb
 
         # Adapt covariance matrix
-        artmp = (1.0 / self.sigma) * (candidate_parameters[:self.mu].T - previous_mean)
+        artmp = (1.0 / self.sigma) * (selected_parameters - previous_mean)
 
-        Ca = (1.0 - self.c1 - self.cmu) * self.C
-        Cb = self.c1 * (np.dot(self.pc, self.pc.T) + (not hsig) * self.cc * (2.0 - self.cc) * self.C)
-        Cc = self.cmu * np.dot(artmp, np.dot(np.diag(self.weights), artmp.T))
-        C = Ca + Cb + Cc
+        if self.variant == "full":
+            Ca = (1.0 - self.c1 - self.cmu) * self.C
+            Cb = self.c1 * (np.outer(self.pc, self.pc) + (not hsig) * self.cc * (2.0 - self.cc) * self.C)
+            Cc = self.cmu * np.dot(artmp.T * self.weights, artmp)
+            self.C = Ca + Cb + Cc
+
+        else:
+            Ca = (1.0 - self.c1 - self.cmu) * self.C
+            Cb = self.c1 * (self.pc**2 + (not hsig) * self.cc * (2.0 - self.cc) * self.C)
+            Cc = self.cmu * np.dot(self.weights, artmp**2)
+            self.C = Ca + Cb + Cc
 
         # Adapt step size
         self.sigma = self.sigma * np.exp((self.cs / self.damps) * (la.norm(self.ps) / self.chiN - 1.0))
 
-        if self.counteval - self.eigeneval > self.L / (self.c1 + self.cmu) / self.N / 10.0:
+        if self.variant == "separable":
+            self.D = np.sqrt(self.C)
+
+        elif self.counteval - self.eigeneval > self.L / (self.c1 + self.cmu) / self.N / 10.0:
+            # Decomposition is only updated every few iterations
             self.eigeneval = self.counteval
 
             self.C = np.triu(self.C) + np.triu(self.C, 1).T
-            d, self.B = la.eig(self.C)
+            d, self.B = la.eigh(self.C)
+
+            # Eigenvalues of a degenerate covariance are floored, so that the
+            # inverse square root stays finite
+            self.D = np.sqrt(np.maximum(d, 1e-20 * max(np.max(d), np.finfo(float).tiny)))
 
-            self.D = np.sqrt(d)
-            Dm = np.diag(1.0 / np.sqrt(d))
+    def _update_limited(self, selected_z):
+        weighted_z = np.dot(selected_z, self.weights)
 
-            self.invsqrtC = np.dot(self.B.T, np.dot(Dm, self.B))
+        # Update evolution path and the paths that make up the transformation
+        self.ps = (1.0 - self.cs) * self.ps + np.sqrt(self.mueff * self.cs * (2.0 - self.cs)) * weighted_z
 
-        if np.max(self.D) > 1e7 * np.min(self.D):
-            logger.warning("Condition exceeds 1e14")
+        self.M = (1.0 - self.cm)[:, np.newaxis] * self.M
+        self.M += np.sqrt(self.mueff * self.cm * (2.0 - self.cm))[:, np.newaxis] * weighted_z[np.newaxis, :]
+
+        # Adapt step size
+        self.sigma = self.sigma * np.exp(0.5 * self.cs * (np.sum(self.ps**2) / self.N - 1.0))
@@ -1,3 +1,5 @@
+from .line_search import line_search
+
 import numpy as np
 import deep_merge
 
@@ -7,7 +9,7 @@ logger = logging.getLogger(__name__)
 # https://www.jhuapl.edu/spsa/PDF-SPSA/Spall_Implementation_of_the_Simultaneous.PDF
 
 class FDSA:
-    def __init__(self, evaluator, perturbation_factor, gradient_factor, perturbation_exponent = 0.101, gradient_exponent = 0.602, gradient_offset = 0, compute_objective = True):
+    def __init__(self, evaluator, perturbation_factor, gradient_factor, perturbation_exponent = 0.101, gradient_exponent = 0.602, gradient_offset = 0, compute_objective = True, common_random_numbers = False, line_search_factors = None, block_size = None, one_sided = False, seed = None):
         self.evaluator = evaluator
 
         self.perturbation_factor = perturbation_factor
@@ -19,6 +21,27 @@ class FDSA:
 
         self.compute_objective = compute_objective
 
+        # Run all simulations of an iteration with the same random seed
+        self.common_random_numbers = common_random_numbers
+
+        # Factors of the gradient step that are tried in parallel after the
+        # gradient has been computed. The best candidate is accepted and also
+        # serves as the objective run of the next iteration.
+        self.line_search_factors = line_search_factors
+        self.line_search_objective = None
+
+        # Number of randomly chosen coordinates for which the gradient is
+        # estimated per iteration (all if None, or as many as the parallel
+        # slots of the evaluator allow if "auto")
+        self.block_size = block_size
+
+        # Use forward differences from the objective at the current point,
+        # which halves the number of gradient runs
+        self.one_sided = one_sided
+
+        self.seed = seed
+        self.random = np.random.RandomState(self.seed)
+
         self.iteration = 0
 
         if not hasattr(self.evaluator.problem, "initial"):
@@ -26,6 +49,19 @@ class FDSA:
 
         self.parameters = None
 
+    def get_block_size(self):
+        number_of_parameters = len(self.parameters)
+
+        if self.block_size is None:
+            return number_of_parameters
+
+        if self.block_size == "auto":
+            # One slot is kept for the objective run
+            runs_per_dimension = 1 if self.one_sided else 2
+            return max(1, min(number_of_parameters, (self.evaluator.parallel - 1) // runs_per_dimension))
+
+        return max(1, min(number_of_parameters, self.block_size))
+
     def advance(self):
         self.iteration += 1
         logger.info("Starting FDSA iteration %d." % self.iteration)
@@ -33,10 +69,22 @@ class FDSA:
         if self.parameters is None:
             self.parameters = self.evaluator.problem.initial
 
-        # Calculate objective
-        if self.compute_objective:
+        seed_group = self.evaluator.seed_group() if self.common_random_numbers else None
+
+        # Calculate objective (unless known from the line search). For
+        # one-sided differences, it is needed as the centre point and must be
+        # rerun if all runs should share the seed of this iteration.
+        centre_objective = self.line_search_objective
+        self.line_search_objective = None
+
+        if self.one_sided and self.common_random_numbers:
+            centre_objective = None
+
+        compute_objective = centre_objective is None and (self.compute_objective or self.one_sided)
+
+        if compute_objective:
             annotations = { "type": "objective" }
-            objective_identifier = self.evaluator.submit(self.parameters, annotations = annotations)
+            objective_identifier = self.evaluator.submit(self.parameters, annotations = annotations, seed_group = seed_group)
 
         # Update lengths
         gradient_length = self.gradient_factor / (self.iteration + self.gradient_offset)**self.gradient_exponent
@@ -52,38 +100,53 @@ class FDSA:
         gradient = np.zeros((len(self.parameters),))
         gradient_information = []
 
-        # Schedule all necessary runs
-        for d in range(len(self.parameters)):
-            annotations = deep_merge.merge(annotations, { "dimension": d })
+        block_size = self.get_block_size()
 
+        if block_size < len(self.parameters):
+            dimensions = np.sort(self.random.choice(len(self.parameters), block_size, replace = False))
+        else:
+            dimensions = range(len(self.parameters))
+
+        # Schedule all necessary runs
+        for d in dimensions:
             positive_parameters = np.copy(self.parameters)
             positive_parameters[d] += perturbation_length
-            annotations = deep_merge.merge(annotations, { "type": "positive_gradient" })
-            positive_identifier = self.evaluator.submit(positive_parameters, annotations = annotations)
+            positive_annotations = deep_merge.merge(dict(annotations), { "dimension": int(d), "type": "positive_gradient" })
+            positive_identifier = self.evaluator.submit(positive_parameters, annotations = positive_annotations, seed_group = seed_group)
 
-            negative_parameters = np.copy(self.parameters)
-            negative_parameters[d] -= perturbation_length
-            annotations = deep_merge.merge(annotations, { "sign": "negative_gradient" })
-            negative_identifier = self.evaluator.submit(negative_parameters, annotations = annotations)
+            negative_identifier = None
 
-            gradient_information.append((positive_parameters, positive_identifier, negative_parameters, negative_identifier))
+            if not self.one_sided:
+                negative_parameters = np.copy(self.parameters)
+                negative_parameters[d] -= perturbation_length
+                negative_annotations = deep_merge.merge(dict(annotations), { "dimension": int(d), "type": "negative_gradient" })
+                negative_identifier = self.evaluator.submit(negative_parameters, annotations = negative_annotations, seed_group = seed_group)
+
+            gradient_information.append((d, positive_identifier, negative_identifier))
 
         # Wait for gradient run results
         self.evaluator.wait()
 
-        if self.compute_objective:
+        if compute_objective:
+            centre_objective, centre_state = self.evaluator.get(objective_identifier)
             self.evaluator.clean(objective_identifier)
 
-        for d, item in enumerate(gradient_information):
-            positive_parameters, positive_identifier, negative_parameters, negative_identifier = item
-
+        for d, positive_identifier, negative_identifier in gradient_information:
             positive_objective, positive_state = self.evaluator.get(positive_identifier)
             self.evaluator.clean(positive_identifier)
 
-            negative_objective, negative_state = self.evaluator.get(negative_identifier)
-            self.evaluator.clean(negative_identifier)
+            if self.one_sided:
+                gradient[d] = (positive_objective - centre_objective) / perturbation_length
+            else:
+                negative_objective, negative_state = self.evaluator.get(negative_identifier)
+                self.evaluator.clean(negative_identifier)
 
-            gradient[d] = (positive_objective - negative_objective) / (2.0 * perturbation_length)
+                gradient[d] = (positive_objective - negative_objective) / (2.0 * perturbation_length)
 
         # II) Update state
-        self.parameters -= gradient_length * gradient
+        if self.line_search_factors is None:
+            self.parameters -= gradient_length * gradient
+        else:
+            self.parameters, self.line_search_objective, factor = line_search(
+                self.evaluator, self.parameters, gradient_length * gradient, self.line_search_factors,
+                seed_group = seed_group, annotations = { "gradient_length": gradient_length })
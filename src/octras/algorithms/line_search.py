@@ -0,0 +1,33 @@
+import logging
+logger = logging.getLogger(__name__)
+
+def line_search(evaluator, parameters, step, factors, seed_group = None, annotations = {}):
+    """
+        Evaluates parameters - factor * step for all factors at once (so they
+        run in parallel) and returns the best candidate as a tuple of the
+        parameters, the objective and the factor.
+    """
+    candidates = []
+
+    for factor in factors:
+        candidate = parameters - factor * step
+
+        candidate_annotations = dict(annotations)
+        candidate_annotations.update({ "type": "line_search", "step_factor": factor })
+
+        identifier = evaluator.submit(candidate, annotations = candidate_annotations, seed_group = seed_group)
+        candidates.append((candidate, identifier, factor))
+
+    evaluator.wait()
+
+    best = None
+
+    for candidate, identifier, factor in candidates:
+        objective, state = evaluator.get(identifier)
+        evaluator.clean(identifier)
+
+        if best is None or objective < best[1]:
+            best = (candidate, objective, factor)
+
+    logger.info("Line search accepted step factor %f with objective %f" % (best[2], best[1]))
+    return best
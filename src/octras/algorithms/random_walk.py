@@ -4,7 +4,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 class RandomWalk:
-    def __init__(self, evaluator, parallel = None, seed = None):
+    def __init__(self, evaluator, parallel = None, seed = None, surrogate = None):
         self.evaluator = evaluator
         self.problem = self.evaluator.problem
 
@@ -12,6 +12,9 @@ class RandomWalk:
 
         self.iteration = 0
 
+        # Optional pre-screening of the candidates (see RBFSurrogate)
+        self.surrogate = surrogate
+
         self.seed = seed
         self.random = np.random.RandomState(self.seed)
 
@@ -22,12 +25,25 @@ class RandomWalk:
         self.iteration += 1
         logger.info("Starting Random Walk iteration %d" % self.iteration)
 
+        count = self.parallel
+
+        if not self.surrogate is None and self.surrogate.is_ready():
+            count *= self.surrogate.oversampling
+
         parameters = [np.array([
             bounds[0] + self.random.random() * (bounds[1] - bounds[0]) # TODO: Not demterinistic!
             for bounds in self.problem.bounds
-        ]) for k in range(self.parallel)]
+        ]) for k in range(count)]
+
+        if not self.surrogate is None:
+            parameters = [parameters[k] for k in self.surrogate.screen(np.array(parameters), self.parallel)]
 
         identifiers = [self.evaluator.submit(p) for p in parameters]
 
         self.evaluator.wait(identifiers)
+
+        if not self.surrogate is None:
+            objectives = [objective for objective, state in self.evaluator.get(identifiers)]
+            self.surrogate.add(parameters, objectives)
+
         self.evaluator.clean()
@@ -1,3 +1,5 @@
+from .line_search import line_search
+
 import numpy as np
 import deep_merge
 
@@ -7,7 +9,7 @@ logger = logging.getLogger(__name__)
 # https://www.jhuapl.edu/spsa/PDF-SPSA/Spall_Implementation_of_the_Simultaneous.PDF
 
 class SPSA:
-    def __init__(self, evaluator, perturbation_factor, gradient_factor, perturbation_exponent = 0.101, gradient_exponent = 0.602, gradient_offset = 0, compute_objective = True, seed = None):
+    def __init__(self, evaluator, perturbation_factor, gradient_factor, perturbation_exponent = 0.101, gradient_exponent = 0.602, gradient_offset = 0, compute_objective = True, seed = None, gradient_samples = 1, common_random_numbers = False, calibrate = False, calibration_samples = 4, calibration_step = None, calibration_iterations = 100, line_search_factors = None):
         self.evaluator = evaluator
 
         self.perturbation_factor = perturbation_factor
@@ -19,6 +21,35 @@ class SPSA:
 
         self.compute_objective = compute_objective
 
+        # Run all simulations of an iteration with the same random seed
+        self.common_random_numbers = common_random_numbers
+
+        # Factors of the gradient step that are tried in parallel after the
+        # gradient has been computed. The best candidate is accepted and also
+        # serves as the objective run of the next iteration.
+        self.line_search_factors = line_search_factors
+        self.line_search_objective = None
+
+        # Number of perturbation pairs that are evaluated in parallel and
+        # averaged in every iteration
+        self.gradient_samples = gradient_samples
+
+        if self.gradient_samples < 1:
+            raise RuntimeError("At least one gradient sample is needed for SPSA")
+
+        # Automatic gain selection (see calibrate_gains)
+        self.calibrate = calibrate
+        self.calibration_samples = calibration_samples
+        self.calibration_step = calibration_step
+        self.calibration_iterations = calibration_iterations
+        self.calibration = None
+
+        if self.calibrate and self.calibration_samples < 2:
+            raise RuntimeError("At least two calibration samples are needed for SPSA")
+
+        if self.calibrate and self.calibration_step is None and not hasattr(self.evaluator.problem, "bounds"):
+            raise RuntimeError("Either calibration_step or bounds of the problem must be provided for SPSA calibration")
+
         self.iteration = 0
 
         self.seed = seed
@@ -29,57 +60,165 @@ class SPSA:
 
         self.parameters = None
 
+    def calibrate_gains(self):
+        """
+            Chooses the gains following the guidelines by Spall (see above).
+            A batch of repeated objective runs and gradient probes is run in
+            parallel at the initial point. Then
+
+            - c is set to the standard deviation of the objective (but not
+              below the given perturbation_factor, which is used for the
+              probes),
+            - A is set to 10% of the expected number of iterations and
+            - a is set such that the first step changes the parameters by
+              about calibration_step (by default 10% of the average width of
+              the bounds) given the mean gradient magnitude of the probes.
+        """
+        logger.info("Calibrating SPSA gains.")
+
+        annotations = { "type": "calibration_objective" }
+        objective_identifiers = [
+            self.evaluator.submit(self.parameters, annotations = annotations)
+            for sample in range(self.calibration_samples)
+        ]
+
+        perturbation_length = self.perturbation_factor
+        gradient_information = []
+
+        for sample in range(self.calibration_samples):
+            direction = self.random.randint(0, 2, len(self.parameters)) - 0.5
+
+            positive_parameters = np.copy(self.parameters) + direction * perturbation_length
+            annotations = { "type": "calibration_positive_gradient", "sample": sample }
+            positive_identifier = self.evaluator.submit(positive_parameters, annotations = annotations)
+
+            negative_parameters = np.copy(self.parameters) - direction * perturbation_length
+            annotations = { "type": "calibration_negative_gradient", "sample": sample }
+            negative_identifier = self.evaluator.submit(negative_parameters, annotations = annotations)
+
+            gradient_information.append((direction, positive_identifier, negative_identifier))
+
+        self.evaluator.wait()
+
+        objectives = np.array([objective for objective, state in self.evaluator.get(objective_identifiers)])
+        self.evaluator.clean(objective_identifiers)
+
+        gradients = []
+
+        for direction, positive_identifier, negative_identifier in gradient_information:
+            positive_objective, positive_state = self.evaluator.get(positive_identifier)
+            negative_objective, negative_state = self.evaluator.get(negative_identifier)
+            self.evaluator.clean([positive_identifier, negative_identifier])
+
+            gradients.append((positive_objective - negative_objective) / (2.0 * perturbation_length) * direction**-1)
+
+        noise = np.std(objectives, ddof = 1)
+        gradient_magnitude = np.mean(np.abs(gradients))
+
+        if self.calibration_step is None:
+            bounds = np.array(self.evaluator.problem.bounds, dtype = float)
+            step = 0.1 * np.mean(bounds[:,1] - bounds[:,0])
+        else:
+            step = self.calibration_step
+
+        self.perturbation_factor = max(noise, self.perturbation_factor)
+        self.gradient_offset = 0.1 * self.calibration_iterations
+
+        if gradient_magnitude > 0.0:
+            self.gradient_factor = step * (1.0 + self.gradient_offset)**self.gradient_exponent / gradient_magnitude
+        else:
+            logger.warning("Gradient probes of SPSA calibration are all zero, keeping gradient_factor")
+
+        self.calibration = {
+            "noise": noise, "gradient_magnitude": gradient_magnitude, "step": step,
+            "perturbation_factor": self.perturbation_factor,
+            "gradient_factor": self.gradient_factor,
+            "gradient_offset": self.gradient_offset
+        }
+
+        logger.info("Calibrated SPSA gains: a = %f, c = %f, A = %f" % (
+            self.gradient_factor, self.perturbation_factor, self.gradient_offset))
+
     def advance(self):
+        if self.parameters is None:
+            self.parameters = self.evaluator.problem.initial
+
+            if self.calibrate:
+                self.calibrate_gains()
+
         self.iteration += 1
         logger.info("Starting SPSA iteration %d." % self.iteration)
 
-        if self.parameters is None:
-            self.parameters = self.evaluator.problem.initial
+        seed_group = self.evaluator.seed_group() if self.common_random_numbers else None
+
+        # Calculate objective (unless known from the line search)
+        compute_objective = self.compute_objective and self.line_search_objective is None
+        self.line_search_objective = None
 
-        # Calculate objective
-        if self.compute_objective:
+        if compute_objective:
             annotations = { "type": "objective" }
-            objective_identifier = self.evaluator.submit(self.parameters, annotations = annotations)
+            objective_identifier = self.evaluator.submit(self.parameters, annotations = annotations, seed_group = seed_group)
 
         # Update step lengths
         gradient_length = self.gradient_factor / (self.iteration + self.gradient_offset)**self.gradient_exponent
         perturbation_length = self.perturbation_factor / self.iteration**self.perturbation_exponent
 
-        # Sample direction from Rademacher distribution
-        direction = self.random.randint(0, 2, len(self.parameters)) - 0.5
-
         annotations = {
             "gradient_length": gradient_length,
             "perturbation_length": perturbation_length,
-            "direction": direction,
             "type": "gradient"
         }
 
-        # Schedule samples
-        positive_parameters = np.copy(self.parameters)
-        positive_parameters += direction * perturbation_length
-        annotations = deep_merge.merge(annotations, { "type": "positive_gradient" })
-        positive_identifier = self.evaluator.submit(positive_parameters, annotations = annotations)
+        if not self.calibration is None:
+            annotations["calibration"] = self.calibration
+
+        gradient_information = []
+
+        for sample in range(self.gradient_samples):
+            # Sample direction from Rademacher distribution
+            direction = self.random.randint(0, 2, len(self.parameters)) - 0.5
 
-        negative_parameters = np.copy(self.parameters)
-        negative_parameters -= direction * perturbation_length
-        annotations = deep_merge.merge(annotations, { "type": "negative_gradient" })
-        negative_identifier = self.evaluator.submit(negative_parameters, annotations = annotations)
+            snapshot = self.evaluator.snapshot({
+                "parameters": np.copy(self.parameters),
+                "direction": direction
+            })
+
+            # Schedule samples
+            positive_parameters = np.copy(self.parameters)
+            positive_parameters += direction * perturbation_length
+            positive_annotations = deep_merge.merge(dict(annotations), { "type": "positive_gradient", "sample": sample })
+            positive_identifier = self.evaluator.submit(positive_parameters, annotations = positive_annotations, snapshot = snapshot, seed_group = seed_group)
+
+            negative_parameters = np.copy(self.parameters)
+            negative_parameters -= direction * perturbation_length
+            negative_annotations = deep_merge.merge(dict(annotations), { "type": "negative_gradient", "sample": sample })
+            negative_identifier = self.evaluator.submit(negative_parameters, annotations = negative_annotations, snapshot = snapshot, seed_group = seed_group)
+
+            gradient_information.append((direction, positive_identifier, negative_identifier))
 
         # Wait for gradient run results
         self.evaluator.wait()
 
-        if self.compute_objective:
+        if compute_objective:
             self.evaluator.clean(objective_identifier)
 
-        positive_objective, positive_state = self.evaluator.get(positive_identifier)
-        self.evaluator.clean(positive_identifier)
+        g_k = np.zeros((len(self.parameters),))
+
+        for direction, positive_identifier, negative_identifier in gradient_information:
+            positive_objective, positive_state = self.evaluator.get(positive_identifier)
+            self.evaluator.clean(positive_identifier)
+
+            negative_objective, negative_state = self.evaluator.get(negative_identifier)
+            self.evaluator.clean(negative_identifier)
 
-        negative_objective, negative_state = self.evaluator.get(negative_identifier)
-        self.evaluator.clean(negative_identifier)
+            g_k += (positive_objective - negative_objective) / (2.0 * perturbation_length) * direction**-1
 
-        g_k = (positive_objective - negative_objective) / (2.0 * perturbation_length)
-        g_k *= direction**-1
+        g_k /= self.gradient_samples
 
         # Update state
-        self.parameters -= gradient_length * g_k
+        if self.line_search_factors is None:
+            self.parameters -= gradient_length * g_k
+        else:
+            self.parameters, self.line_search_objective, factor = line_search(
+                self.evaluator, self.parameters, gradient_length * g_k, self.line_search_factors,
+                seed_group = seed_group, annotations = { "gradient_length": gradient_length })
@@ -0,0 +1,161 @@
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+class RBFSurrogate:
+    """
+        Cheap surrogate model that is used to pre-screen candidates before
+        they are submitted to the evaluator. The objective is interpolated by
+        a cubic radial basis function with a linear tail over the archive of
+        evaluated points. Instead of solving the interpolation system again
+        when points are added (or removed because the archive is limited to
+        maximum_size points), its inverse is updated by bordering, which is
+        quadratic in the number of points.
+
+        Algorithms that support pre-screening sample oversampling times as
+        many candidates as they need and only submit the ones with the best
+        predicted objective. By default, the archive keeps the 10 * (N + 1)
+        most recent points for N parameters, so that the model stays local
+        and refitting is cheap.
+    """
+
+    def __init__(self, oversampling = 4, maximum_size = None, tolerance = 1e-12):
+        self.oversampling = oversampling
+        self.maximum_size = maximum_size
+        self.tolerance = tolerance
+
+        self.points = None
+        self.values = None
+
+        # Inverse of the interpolation system (None as long as the points do
+        # not determine the linear tail)
+        self.inverse = None
+        self.coefficients = None
+
+    def _kernel(self, points, x):
+        return np.sqrt(np.sum((points - x)**2, axis = 1))**3
+
+    def _border(self, x):
+        # Row of the interpolation system that corresponds to point x
+        return np.concatenate([[1.0], x, self._kernel(self.points, x)])
+
+    def _factorize(self):
+        number_of_points, dimensions = self.points.shape
+        offset = dimensions + 1
+
+        system = np.zeros((offset + number_of_points, offset + number_of_points))
+        system[0, offset:] = 1.0
+        system[1:offset, offset:] = self.points.T
+        system[offset:, :offset] = system[:offset, offset:].T
+
+        for k in range(number_of_points):
+            system[offset:, offset + k] = self._kernel(self.points, self.points[k])
+
+        # System is regular if the points are distinct and not all in one
+        # hyperplane
+        if np.linalg.matrix_rank(system[offset:, :offset]) == offset:
+            try:
+                self.inverse = np.linalg.inv(system)
+            except np.linalg.LinAlgError:
+                logger.warning("Surrogate cannot be fitted, archive contains duplicate points")
+
+    def _append(self, x, value):
+        if self.inverse is None:
+            self.points = np.vstack([self.points, x])
+            self.values = np.append(self.values, value)
+
+            if len(self.points) > self.points.shape[1]:
+                self._factorize()
+
+            return
+
+        b = self._border(x)
+
+        if np.min(b[len(x) + 1:]) <= self.tolerance**3:
+            # Point coincides with the archive
+            return
+
+        u = np.dot(self.inverse, b)
+        s = -np.dot(b, u) # Diagonal of the system is zero
+
+        if s == 0.0 or not np.isfinite(s):
+            return
+
+        size = len(b) + 1
+        inverse = np.empty((size, size))
+        inverse[:-1, :-1] = self.inverse + np.outer(u, u) / s
+        inverse[:-1, -1] = -u / s
+        inverse[-1, :-1] = -u / s
+        inverse[-1, -1] = 1.0 / s
+
+        self.inverse = inverse
+        self.points = np.vstack([self.points, x])
+        self.values = np.append(self.values, value)
+
+    def _remove(self, index):
+        self.points = np.delete(self.points, index, axis = 0)
+        self.values = np.delete(self.values, index)
+
+        if not self.inverse is None:
+            offset = self.points.shape[1] + 1
+            selection = np.arange(len(self.inverse)) != offset + index
+
+            if np.linalg.matrix_rank(np.hstack([np.ones((len(self.points), 1)), self.points])) == offset:
+                column = self.inverse[selection, offset + index]
+                self.inverse = self.inverse[selection][:, selection] - np.outer(column, column) / self.inverse[offset + index, offset + index]
+            else:
+                # Remaining points do not determine the linear tail
+                self.inverse = None
+
+    def add(self, points, values):
+        """
+            Adds evaluated points (one per row) and their objectives to the
+            archive and updates the interpolation.
+        """
+        points = np.array(points, dtype = float)
+        points = points.reshape((-1, points.shape[-1]))
+
+        if self.points is None:
+            self.points = np.zeros((0, points.shape[1]))
+            self.values = np.zeros((0,))
+
+            if self.maximum_size is None:
+                self.maximum_size = 10 * (points.shape[1] + 1)
+
+        for x, value in zip(points, np.atleast_1d(values)):
+            if not np.isfinite(value):
+                continue
+
+            self._append(x, value)
+
+            if len(self.points) > self.maximum_size:
+                self._remove(0)
+
+        self.coefficients = None
+
+    def is_ready(self):
+        return not self.inverse is None
+
+    def predict(self, points):
+        if self.coefficients is None:
+            offset = self.points.shape[1] + 1
+            self.coefficients = np.dot(self.inverse[:, offset:], self.values)
+
+        points = np.array(points, dtype = float)
+        offset = points.shape[1] + 1
+
+        distances = np.sqrt(np.sum((points[:, np.newaxis, :] - self.points[np.newaxis, :, :])**2, axis = 2))
+
+        return self.coefficients[0] + np.dot(points, self.coefficients[1:offset]) + np.dot(distances**3, self.coefficients[offset:])
+
+    def screen(self, points, count):
+        """
+            Returns the indices of the count points (one per row) with the best
+            predicted objective, in the order in which they have been given.
+        """
+        if not self.is_ready() or len(points) <= count:
+            return np.arange(min(count, len(points)))
+
+        predictions = self.predict(points)
+        return np.sort(np.argsort(predictions)[:count])
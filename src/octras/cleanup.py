@@ -0,0 +1,126 @@
+import os, shutil, uuid, threading
+import concurrent.futures as cf
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    size = 0
+
+    for root, directories, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+
+    return size
+
+class CleanupQueue:
+    """
+        Deletes simulation directories in the background. A directory is first
+        renamed into a trash directory (on the same file system), so its path can
+        be reused immediately, and then removed by a bounded pool of threads.
+
+        The number of paths that are still waiting for deletion is available
+        as pending_paths and their total size as pending_bytes. Every path is
+        measured by a separate thread as soon as it is scheduled (not to block
+        the caller), so pending_bytes covers the whole backlog once the paths
+        have been measured.
+    """
+
+    def __init__(self, trash_path, workers = 2):
+        self.trash_path = trash_path
+        self.executor = cf.ThreadPoolExecutor(max_workers = workers)
+        self.size_executor = cf.ThreadPoolExecutor(max_workers = 1)
+
+        self.lock = threading.Lock()
+        self.pending_bytes = 0
+        self.pending_paths = 0
+        self.futures = set()
+
+        if not os.path.exists(self.trash_path):
+            os.makedirs(self.trash_path)
+
+        # Leftovers of a previous session
+        for name in os.listdir(self.trash_path):
+            self._schedule(os.path.join(self.trash_path, name))
+
+    def _remove_path(self, path):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def _measure(self, path):
+        size = get_size(path)
+
+        with self.lock:
+            self.pending_bytes += size
+
+        return size
+
+    def _delete(self, path, size_future):
+        # Measuring is faster than deleting, so the size is usually known
+        size = size_future.result()
+
+        try:
+            self._remove_path(path)
+        except OSError as e:
+            logger.warning("Could not delete %s: %s" % (path, str(e)))
+        finally:
+            with self.lock:
+                self.pending_bytes -= size
+                self.pending_paths -= 1
+
+    def _schedule(self, path):
+        with self.lock:
+            self.pending_paths += 1
+
+        size_future = self.size_executor.submit(self._measure, path)
+        future = self.executor.submit(self._delete, path, size_future)
+
+        with self.lock:
+            self.futures.add(future)
+
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def remove(self, path):
+        """
+            Moves the given path out of the way and schedules its deletion.
+        """
+        if not os.path.exists(path):
+            return
+
+        trash_path = os.path.join(self.trash_path, str(uuid.uuid4()))
+
+        try:
+            os.rename(path, trash_path)
+        except OSError:
+            # Different file system, we cannot free the path without deleting it
+            logger.warning("Could not move %s to trash, deleting synchronously" % path)
+            self._remove_path(path)
+            return
+
+        self._schedule(trash_path)
+
+    def wait(self):
+        """
+            Blocks until all scheduled deletions are finished.
+        """
+        with self.lock:
+            futures = list(self.futures)
+
+        cf.wait(futures)
+
+    def shutdown(self):
+        self.executor.shutdown(wait = True)
+        self.size_executor.shutdown(wait = True)
@@ -1,16 +1,22 @@
-import uuid, time, logging, deep_merge
+import uuid, time, random, logging, deep_merge
 
 logger = logging.getLogger(__name__)
 
 class Evaluator:
-    def __init__(self, problem, simulator, interval = 0.0, parallel = 1, follow_trace = True):
+    def __init__(self, problem, simulator, interval = 0.0, parallel = 1, follow_trace = True, prune = False, seed = None):
         self.problem = problem
         self.simulator = simulator
         self.interval = interval
         self.parallel = parallel
+        self.prune = prune
 
         self.simulations = {}
 
+        # Restart dependencies: number of unfinished simulations that restart
+        # from a simulation and simulations whose cleanup has been deferred
+        self.references = {}
+        self.deferred = set()
+
         self.pending = []
         self.running = []
         self.finished = []
@@ -20,6 +26,11 @@ class Evaluator:
 
         self.follow_trace = follow_trace
         self.trace = []
+        self.snapshot_trace = []
+
+        # Seed groups: simulations in the same group get the same random seed
+        self.seed_groups = {}
+        self.random = random.Random(seed)
 
         if not hasattr(problem, "number_of_parameters"):
             raise RuntimeError("Problems should have a number_of_parameters field.")
@@ -32,7 +43,33 @@ class Evaluator:
 
         return identifier
 
-    def submit(self, x, simulator_parameters = {}, annotations = {}, transient = False):
+    def snapshot(self, data):
+        """
+            Registers a snapshot of algorithm state (for instance, the full
+            covariance matrix of CMA-ES) that is shared by multiple simulations.
+            The returned identifier can be passed to submit, so the data only
+            ends up once in the trace instead of once per simulation.
+        """
+        identifier = str(uuid.uuid4())
+
+        if self.follow_trace:
+            self.snapshot_trace.append((identifier, data))
+
+        return identifier
+
+    def seed_group(self):
+        """
+            Creates a new seed group with a fresh random seed. Simulations that
+            are submitted with the returned identifier all get the same
+            "random_seed" simulator parameter (common random numbers), so that
+            differences between them are not dominated by simulation noise.
+            Algorithms create a new group per iteration to rotate the seed.
+        """
+        identifier = str(uuid.uuid4())
+        self.seed_groups[identifier] = self.random.randint(1, 2**31 - 1)
+        return identifier
+
+    def submit(self, x, simulator_parameters = {}, annotations = {}, transient = False, snapshot = None, seed_group = None):
         if len(x) != self.problem.number_of_parameters:
             raise RuntimeError("Invalid number of parameters: %d (expected %d)" % (
                 len(x), self.problem.number_of_parameters
@@ -48,11 +85,26 @@ class Evaluator:
 
         parameters = deep_merge.merge(parameters, simulator_parameters)
 
+        if not seed_group is None:
+            if not seed_group in self.seed_groups:
+                raise RuntimeError("Unknown seed group: %s" % seed_group)
+
+            parameters["random_seed"] = self.seed_groups[seed_group]
+
+        restart = parameters["restart"] if "restart" in parameters else None
+
+        if not restart is None and restart in self.simulations:
+            self.references[restart] = self.references.get(restart, 0) + 1
+        else:
+            restart = None
+
         self.simulations[identifier] = {
             "identifier": identifier,
             "parameters": parameters, "x": x,
             "cost": cost, "annotations": annotations,
-            "status": "pending", "transient": transient
+            "status": "pending", "transient": transient,
+            "snapshot": snapshot, "restart": restart,
+            "seed_group": seed_group
         }
 
         self.pending.append(identifier)
@@ -100,6 +152,13 @@ class Evaluator:
                 self.running.remove(identifier)
                 self.finished.append(identifier)
 
+                if self.prune and hasattr(self.simulator, "prune"):
+                    # Only keep what is needed to restart from this simulation
+                    self.simulator.prune(identifier)
+
+                if not simulation["restart"] is None:
+                    self._release(simulation["restart"])
+
                 if self.follow_trace:
                     self.trace.append(simulation)
 
@@ -156,19 +215,51 @@ class Evaluator:
         self._ping()
         return self.simulations[identifier]["status"] == "finished"
 
+    def _release(self, identifier):
+        self.references[identifier] -= 1
+
+        if self.references[identifier] == 0:
+            del self.references[identifier]
+
+            if identifier in self.deferred:
+                self.deferred.remove(identifier)
+                self._clean(identifier)
+
+    def _clean(self, identifier):
+        del self.simulations[identifier]
+        self.simulator.clean(identifier)
+
     def clean(self, identifiers = None):
+        """
+            Cleans up the given simulations. If other simulations that have
+            not finished yet restart from one of them, the cleanup is deferred
+            until they are finished. Simulations that have already been cleaned
+            (or whose cleanup is deferred) are ignored.
+        """
         if identifiers is None:
             identifiers = self.finished[:]
         elif isinstance(identifiers, str):
             identifiers = [identifiers]
 
+        identifiers = [
+            identifier for identifier in identifiers
+            if identifier in self.simulations and not identifier in self.deferred
+        ]
+
         self.wait(identifiers)
 
         for identifier in identifiers:
-            del self.simulations[identifier]
-            self.simulator.clean(identifier)
             self.finished.remove(identifier)
 
+            if identifier in self.references:
+                self.deferred.add(identifier)
+            else:
+                self._clean(identifier)
+
     def fetch_trace(self):
         trace, self.trace = self.trace[:], []
         return trace
+
+    def fetch_snapshots(self):
+        snapshots, self.snapshot_trace = self.snapshot_trace[:], []
+        return snapshots
@@ -0,0 +1,234 @@
+import gzip, re
+import concurrent.futures as cf
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTE_PATTERN = re.compile(r'([\w:]+)="([^"]*)"')
+TYPE_PATTERN = re.compile(r' type="([^"]*)"')
+
+# Leg modes that only make up access, egress or transfer walks of a trip
+WALK_MODES = set(["walk", "non_network_walk", "access_walk", "egress_walk", "transit_walk"])
+
+def iterate_events(path, types = None):
+    """
+        Iterates over the events of a (gzipped) MATSim events file as
+        dictionaries of attributes. MATSim writes one event per line, so the
+        file is read line by line in constant memory instead of building an
+        XML tree. If types are given, other events are skipped before their
+        attributes are parsed.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rt") as f:
+        for line in f:
+            match = TYPE_PATTERN.search(line)
+
+            if not match is None and (types is None or match.group(1) in types):
+                yield dict(ATTRIBUTE_PATTERN.findall(line))
+
+class EventsAnalyzer:
+    """
+        Consumes MATSim events and produces in a single pass
+
+        - a trip table (from the end of an activity to the start of the next
+          activity that is not an interaction activity) with the columns of
+          the trip analysis (mode, crowfly_distance, network_distance,
+          travel_time, preceedingPurpose, followingPurpose, ...) and
+        - hourly link counts of vehicles entering links.
+
+        If link lengths (a dictionary by link id) are provided, network
+        distances of vehicle legs are computed for all persons on board,
+        otherwise only teleported distances (from "travelled" events) are
+        accumulated. Crowfly distances are computed from the coordinates of
+        the activity events.
+    """
+
+    # Events that are needed, all others are skipped while reading
+    TYPES = set([
+        "entered link", "actend", "actstart", "departure", "travelled",
+        "PersonEntersVehicle", "PersonLeavesVehicle", "stuckAndAbort"
+    ])
+
+    def __init__(self, link_lengths = None, hours = 24):
+        self.link_lengths = link_lengths
+        self.hours = hours
+
+        self.persons = {}
+        self.vehicles = {}
+        self.trip_counts = {}
+
+        self.trips = {
+            "person_id": [], "person_trip_id": [],
+            "origin_link_id": [], "destination_link_id": [],
+            "origin_x": [], "origin_y": [],
+            "destination_x": [], "destination_y": [],
+            "departure_time": [], "arrival_time": [],
+            "mode": [], "network_distance": [],
+            "preceedingPurpose": [], "followingPurpose": []
+        }
+
+        self.link_index = {}
+        self.link_counts = []
+
+    def _count_link(self, link_id, time):
+        index = self.link_index.get(link_id)
+
+        if index is None:
+            index = len(self.link_index)
+            self.link_index[link_id] = index
+            self.link_counts.append([0] * self.hours)
+
+        hour = min(int(time // 3600), self.hours - 1)
+        self.link_counts[index][hour] += 1
+
+    def process(self, event):
+        event_type = event["type"]
+
+        if event_type == "entered link":
+            self._count_link(event["link"], float(event["time"]))
+
+            person_ids = self.vehicles.get(event["vehicle"])
+
+            if not person_ids is None and not self.link_lengths is None:
+                length = self.link_lengths.get(event["link"], 0.0)
+
+                for person_id in person_ids:
+                    trip = self.persons.get(person_id)
+
+                    if not trip is None:
+                        trip["distance"] += length
+
+        elif event_type == "actend":
+            if not event["actType"].endswith(" interaction"):
+                person_id = event["person"]
+
+                self.persons[person_id] = {
+                    "departure_time": float(event["time"]),
+                    "origin_link_id": event["link"],
+                    "origin_x": float(event.get("x", "nan")),
+                    "origin_y": float(event.get("y", "nan")),
+                    "preceding_purpose": event["actType"],
+                    "modes": [], "distance": 0.0
+                }
+
+        elif event_type == "departure":
+            trip = self.persons.get(event["person"])
+
+            if not trip is None:
+                trip["modes"].append(event["legMode"])
+
+        elif event_type == "travelled":
+            trip = self.persons.get(event["person"])
+
+            if not trip is None:
+                trip["distance"] += float(event["distance"])
+
+        elif event_type == "PersonEntersVehicle":
+            if event["person"] in self.persons:
+                self.vehicles.setdefault(event["vehicle"], set()).add(event["person"])
+
+        elif event_type == "PersonLeavesVehicle":
+            person_ids = self.vehicles.get(event["vehicle"])
+
+            if not person_ids is None:
+                person_ids.discard(event["person"])
+
+                if len(person_ids) == 0:
+                    del self.vehicles[event["vehicle"]]
+
+        elif event_type == "actstart":
+            if not event["actType"].endswith(" interaction"):
+                trip = self.persons.pop(event["person"], None)
+
+                if not trip is None:
+                    self._finish_trip(event, trip)
+
+        elif event_type == "stuckAndAbort":
+            self.persons.pop(event["person"], None)
+
+    def _finish_trip(self, event, trip):
+        person_id = event["person"]
+        modes = [mode for mode in trip["modes"] if not mode in WALK_MODES]
+
+        self.trips["person_id"].append(person_id)
+        self.trips["person_trip_id"].append(self.trip_counts.get(person_id, 0))
+        self.trip_counts[person_id] = self.trips["person_trip_id"][-1] + 1
+        self.trips["origin_link_id"].append(trip["origin_link_id"])
+        self.trips["destination_link_id"].append(event["link"])
+        self.trips["origin_x"].append(trip["origin_x"])
+        self.trips["origin_y"].append(trip["origin_y"])
+        self.trips["destination_x"].append(float(event.get("x", "nan")))
+        self.trips["destination_y"].append(float(event.get("y", "nan")))
+        self.trips["departure_time"].append(trip["departure_time"])
+        self.trips["arrival_time"].append(float(event["time"]))
+        self.trips["mode"].append(modes[0] if len(modes) > 0 else "walk")
+        self.trips["network_distance"].append(trip["distance"])
+        self.trips["preceedingPurpose"].append(trip["preceding_purpose"])
+        self.trips["followingPurpose"].append(event["actType"])
+
+    def get_trips(self):
+        """
+            Returns the trip table as a dictionary of NumPy arrays, with the
+            column names of the trip analysis (trips.csv).
+        """
+        trips = {
+            "person_id": np.array(self.trips["person_id"], dtype = str),
+            "person_trip_id": np.array(self.trips["person_trip_id"], dtype = np.int32),
+            "origin_link_id": np.array(self.trips["origin_link_id"], dtype = str),
+            "destination_link_id": np.array(self.trips["destination_link_id"], dtype = str),
+            "mode": np.array(self.trips["mode"], dtype = str),
+            "preceedingPurpose": np.array(self.trips["preceedingPurpose"], dtype = str),
+            "followingPurpose": np.array(self.trips["followingPurpose"], dtype = str)
+        }
+
+        for column in ("origin_x", "origin_y", "destination_x", "destination_y", "departure_time", "arrival_time", "network_distance"):
+            trips[column] = np.array(self.trips[column], dtype = np.float64)
+
+        trips["travel_time"] = trips["arrival_time"] - trips["departure_time"]
+        trips["crowfly_distance"] = np.sqrt(
+            (trips["destination_x"] - trips["origin_x"])**2 + (trips["destination_y"] - trips["origin_y"])**2
+        )
+
+        return trips
+
+    def get_link_counts(self):
+        """
+            Returns the link identifiers and an array of hourly counts with one
+            row per link.
+        """
+        link_ids = np.array(list(self.link_index.keys()), dtype = str)
+
+        if len(self.link_counts) == 0:
+            return link_ids, np.zeros((0, self.hours), dtype = np.int64)
+
+        return link_ids, np.array(self.link_counts, dtype = np.int64)
+
+def analyze_events(path, link_lengths = None, hours = 24):
+    """
+        Reads an events file and returns a dictionary with the trip table
+        ("trips"), the link identifiers ("link_ids") and the hourly link
+        counts ("link_counts").
+    """
+    analyzer = EventsAnalyzer(link_lengths, hours)
+
+    for event in iterate_events(path, EventsAnalyzer.TYPES):
+        analyzer.process(event)
+
+    link_ids, link_counts = analyzer.get_link_counts()
+
+    return {
+        "trips": analyzer.get_trips(),
+        "link_ids": link_ids, "link_counts": link_counts
+    }
+
+def analyze_events_files(paths, processes = None, link_lengths = None, hours = 24):
+    """
+        Analyzes multiple events files in a process pool and returns the
+        results in the order of the paths.
+    """
+    with cf.ProcessPoolExecutor(max_workers = processes) as executor:
+        futures = [executor.submit(analyze_events, path, link_lengths, hours) for path in paths]
+        return [future.result() for future in futures]
@@ -41,6 +41,10 @@ class Loop:
 
             algorithm.advance()
 
+            for identifier, snapshot in evaluator.fetch_snapshots():
+                if not tracker is None and hasattr(tracker, "notify_snapshot"):
+                    tracker.notify_snapshot(identifier, snapshot)
+
             trace = evaluator.fetch_trace()
 
             for item in trace:
@@ -1,16 +1,142 @@
 from octras import Simulator
+from octras.cleanup import CleanupQueue
+from octras.store import OutputStore
+from octras.staging import ScenarioStage, read_config_inputs
 
-import os, shutil
+import os, shutil, re, gzip, threading, glob, fnmatch
 import subprocess as sp
-import pandas as pd
+import concurrent.futures as cf
 import numpy as np
-import glob
 
 import logging
 import deep_merge
 
 logger = logging.getLogger(__name__)
 
+ITERATION_PATTERN = re.compile(r"ITERATION (\d+) BEGINS")
+ERROR_PATTERN = re.compile(r"(\bERROR\b|Exception)")
+FATAL_PATTERN = re.compile(r"Exception in thread \"main\"")
+
+class OutputReader(threading.Thread):
+    """
+        Reads the output stream of a simulation process in the background,
+        writes it to a compressed log file and parses iteration markers and
+        error messages while the simulation is running.
+    """
+
+    def __init__(self, stream, log_path, maximum_errors = 20):
+        super().__init__(daemon = True)
+
+        self.stream = stream
+        self.log_path = log_path
+        self.maximum_errors = maximum_errors
+
+        self.iteration = -1
+        self.errors = []
+        self.fatal = False
+
+    def run(self):
+        with gzip.open(self.log_path, "wt") as f:
+            try:
+                for line in iter(self.stream.readline, b""):
+                    line = line.decode("utf-8", "replace")
+                    f.write(line)
+
+                    match = ITERATION_PATTERN.search(line)
+
+                    if match:
+                        self.iteration = max(self.iteration, int(match.group(1)))
+
+                    elif ERROR_PATTERN.search(line):
+                        if len(self.errors) < self.maximum_errors:
+                            self.errors.append(line.rstrip())
+
+                        if FATAL_PATTERN.search(line):
+                            self.fatal = True
+            finally:
+                self.stream.close()
+
+def parse_cpu_list(value):
+    """
+        Parses a Linux CPU list such as "0-3,8-11" into a list of cores.
+    """
+    cores = []
+
+    for item in value.strip().split(","):
+        if "-" in item:
+            start, end = item.split("-")
+            cores += list(range(int(start), int(end) + 1))
+        elif len(item) > 0:
+            cores.append(int(item))
+
+    return cores
+
+def detect_numa_nodes():
+    """
+        Returns a dictionary of NUMA nodes with the cores of each node that are
+        available to this process. Falls back to one node containing all
+        available cores.
+    """
+    available = set(os.sched_getaffinity(0))
+    nodes = {}
+
+    for path in glob.glob("/sys/devices/system/node/node*/cpulist"):
+        node = int(re.search(r"node(\d+)/cpulist$", path).group(1))
+
+        with open(path) as f:
+            cores = [core for core in parse_cpu_list(f.read()) if core in available]
+
+        if len(cores) > 0:
+            nodes[node] = cores
+
+    if len(nodes) == 0:
+        nodes = { 0: sorted(available) }
+
+    return nodes
+
+class CoreAllocator:
+    """
+        Hands out disjoint sets of cores to concurrent simulations. Cores are
+        taken from a single NUMA node whenever one has enough free cores (the
+        fullest node that fits is used first to keep large blocks free),
+        otherwise they are spread over the nodes with the most free cores.
+    """
+
+    def __init__(self, nodes = None):
+        self.nodes = detect_numa_nodes() if nodes is None else nodes
+        self.free = { node: list(cores) for node, cores in self.nodes.items() }
+
+    def allocate(self, count):
+        """
+            Returns a tuple (cores, node) with node being None if the cores
+            span multiple nodes. Returns None if not enough cores are free.
+        """
+        if count > sum([len(cores) for cores in self.free.values()]):
+            return None
+
+        candidates = [node for node, cores in self.free.items() if len(cores) >= count]
+
+        if len(candidates) > 0:
+            node = min(candidates, key = lambda node: len(self.free[node]))
+            cores, self.free[node] = self.free[node][:count], self.free[node][count:]
+            return cores, node
+
+        cores = []
+
+        for node in sorted(self.free, key = lambda node: -len(self.free[node])):
+            remaining = count - len(cores)
+            cores += self.free[node][:remaining]
+            self.free[node] = self.free[node][remaining:]
+
+            if len(cores) == count:
+                break
+
+        return cores, None
+
+    def release(self, cores):
+        for node, node_cores in self.nodes.items():
+            self.free[node] = sorted(self.free[node] + [core for core in cores if core in node_cores])
+
 class MATSimSimulator(Simulator):
     """
         Defines a wrapper around a standard MATSim simulation.
@@ -38,7 +164,52 @@ class MATSimSimulator(Simulator):
         if not "config" in self.parameters:
             self.parameters["config"] = {}
 
+        if not "threads" in self.parameters:
+            self.parameters["threads"] = None
+
+        if not "maximum_qsim_threads" in self.parameters:
+            self.parameters["maximum_qsim_threads"] = 12
+
+        if not "cleanup_workers" in self.parameters:
+            self.parameters["cleanup_workers"] = 2
+
+        self.cleanup = CleanupQueue("%s/.trash" % self.working_directory, self.parameters["cleanup_workers"])
+
+        if not "retain" in self.parameters:
+            # Files that are kept when a simulation is pruned
+            self.parameters["retain"] = ["*output_plans.xml.gz", "*.log.gz"]
+
+        if not "staging_path" in self.parameters:
+            self.parameters["staging_path"] = None
+
+        self.stage = None
+        self.config_inputs = {}
+
+        if not self.parameters["staging_path"] is None:
+            self.stage = ScenarioStage(self.parameters["staging_path"],
+                maximum_size = self.parameters["staging_size"] if "staging_size" in self.parameters else None,
+                decompress = self.parameters["staging_decompress"] if "staging_decompress" in self.parameters else False
+            )
+
+        if not "store" in self.parameters:
+            self.parameters["store"] = False
+
+        self.store = None
+        self.store_executor = None
+
+        if self.parameters["store"]:
+            self.store = OutputStore("%s/.store" % self.working_directory)
+
+            # Outputs are hashed in the background, pruning is queued behind
+            self.store_executor = cf.ThreadPoolExecutor(max_workers = 1)
+
+        self.allocator = None
+
+        if not self.parameters["threads"] is None:
+            self.allocator = CoreAllocator(self.parameters["nodes"] if "nodes" in self.parameters else None)
+
         self.simulations = {}
+        self.running = []
 
     def run(self, identifier, parameters):
         """
@@ -47,18 +218,25 @@ class MATSimSimulator(Simulator):
         if identifier in self.simulations:
             raise RuntimeError("A simulation with identifier %s already exists." % identifier)
 
-        simulation_path = "%s/%s" % (self.working_directory, identifier)
-
-        if os.path.exists(simulation_path):
-            shutil.rmtree(simulation_path)
-
-        os.mkdir(simulation_path)
-
         simulation_parameters = {}
         simulation_parameters = deep_merge.merge(simulation_parameters, self.parameters)
         simulation_parameters = deep_merge.merge(simulation_parameters, parameters)
         parameters = simulation_parameters
 
+        # Check parameters before any resources are taken
+        if not "class_path" in parameters:
+            raise RuntimeError("Parameter 'class_path' must be set for the MATSim simulator.")
+
+        if not "main_class" in parameters:
+            raise RuntimeError("Parameter 'main_class' must be set for the MATSim simulator.")
+
+        config_inputs = {} if self.stage is None else self._get_config_inputs(parameters)
+
+        simulation_path = "%s/%s" % (self.working_directory, identifier)
+
+        self.cleanup.remove(simulation_path)
+        os.mkdir(simulation_path)
+
         # Rewrite configuration
         if "iterations" in parameters:
             if "controler.lastIteration" in parameters["config"]:
@@ -75,89 +253,200 @@ class MATSimSimulator(Simulator):
             parameters["config"]["controler.writePlansInterval"] = parameters["iterations"]
 
         if "random_seed" in parameters:
-            if "global.random_seed" in parameters["config"]:
-                logger.warn("Overwriting 'global.random_seed' for simulation %s" % identifier)
+            if "global.randomSeed" in parameters["config"]:
+                logger.warn("Overwriting 'global.randomSeed' for simulation %s" % identifier)
 
-            parameters["config"]["global.random_seed"] = parameters["random_seed"]
+            parameters["config"]["global.randomSeed"] = parameters["random_seed"]
+
+        restart_hash = None
 
         if "restart" in parameters:
             if "plans.inputPlansFile" in parameters["config"]:
                 logger.warn("Overwriting 'plans.inputPlansFile' for simulation %s" % identifier)
 
-            restart_path = "%s/%s" % (self.working_directory, parameters["restart"])
-            parameters["config"]["plans.inputPlansFile"] = "%s/output/output_plans.xml.gz" % restart_path
+            if not self.store is None:
+                restart_hash = self._get_restart_hash(parameters["restart"])
+
+            if not restart_hash is None:
+                # Blob stays available while this simulation exists
+                self.store.acquire(restart_hash)
+
+            if restart_hash is None:
+                restart_path = "%s/%s" % (self.working_directory, parameters["restart"])
+                parameters["config"]["plans.inputPlansFile"] = "%s/output/output_plans.xml.gz" % restart_path
+            else:
+                parameters["config"]["plans.inputPlansFile"] = self.store.get_path(restart_hash)
 
         if "controler.outputDirectory" in parameters["config"]:
             logger.warn("Overwriting 'controler.outputDirectory' for simulation %s" % identifier)
 
         parameters["config"]["controler.outputDirectory"] = "%s/output" % simulation_path
 
-        # Construct command line arguments
-        if not "class_path" in parameters:
-            raise RuntimeError("Parameter 'class_path' must be set for the MATSim simulator.")
+        # Staged inputs and cores are released again if the simulation cannot
+        # be started
+        staged_paths = []
+        allocation = None
 
-        if not "main_class" in parameters:
-            raise RuntimeError("Parameter 'main_class' must be set for the MATSim simulator.")
+        try:
+            # Stage scenario inputs on local storage
+            for key, path in config_inputs.items():
+                if not key in parameters["config"]:
+                    parameters["config"][key] = self.stage.stage(path)
+                    staged_paths.append(parameters["config"][key])
+
+            # Pin simulation to a set of cores
+            if not self.allocator is None:
+                allocation = self.allocator.allocate(parameters["threads"])
+
+                if allocation is None:
+                    logger.warn("Not enough free cores to pin simulation %s, running it unpinned" % identifier)
+
+            if not allocation is None:
+                threads = len(allocation[0])
+
+                if "global.numberOfThreads" in parameters["config"]:
+                    logger.warn("Overwriting 'global.numberOfThreads' for simulation %s" % identifier)
+
+                if "qsim.numberOfThreads" in parameters["config"]:
+                    logger.warn("Overwriting 'qsim.numberOfThreads' for simulation %s" % identifier)
+
+                parameters["config"]["global.numberOfThreads"] = threads
+                parameters["config"]["qsim.numberOfThreads"] = min(threads, parameters["maximum_qsim_threads"])
+
+            # Construct command line arguments
+            arguments = [
+                parameters["java"], "-Xmx%s" % parameters["memory"],
+                "-cp", parameters["class_path"], parameters["main_class"]
+            ] + parameters["prefix_arguments"] + parameters["arguments"]
 
-        arguments = [
-            parameters["java"], "-Xmx%s" % parameters["memory"],
-            "-cp", parameters["class_path"], parameters["main_class"]
-        ] + parameters["prefix_arguments"] + parameters["arguments"]
+            for key, value in parameters["config"].items():
+                arguments += ["--config:%s" % key, str(value)]
 
-        for key, value in parameters["config"].items():
-            arguments += ["--config:%s" % key, str(value)]
+            arguments += parameters["postfix_arguments"]
 
-        arguments += parameters["postfix_arguments"]
+            preexec_fn = None
 
-        stdout = open("%s/simulation_output.log" % simulation_path, "w+")
-        stderr = open("%s/simulation_error.log" % simulation_path, "w+")
+            if not allocation is None:
+                cores, node = allocation
+                core_list = ",".join(map(str, cores))
 
-        logger.info("Starting simulation %s:" % identifier)
-        logger.info(" ".join(arguments))
+                if not shutil.which("numactl") is None:
+                    numactl = ["numactl", "--physcpubind=%s" % core_list]
+
+                    if not node is None:
+                        numactl += ["--membind=%d" % node]
+
+                    arguments = numactl + arguments
+                elif not shutil.which("taskset") is None:
+                    arguments = ["taskset", "-c", core_list] + arguments
+                else:
+                    preexec_fn = lambda: os.sched_setaffinity(0, cores)
+
+            logger.info("Starting simulation %s:" % identifier)
+            logger.info(" ".join(arguments))
+
+            process = sp.Popen(arguments, stdout = sp.PIPE, stderr = sp.PIPE, preexec_fn = preexec_fn)
+        except:
+            if not allocation is None:
+                self.allocator.release(allocation[0])
+
+            for path in staged_paths:
+                self.stage.release(path)
+
+            if not restart_hash is None:
+                self.store.release(restart_hash)
+
+            raise
+
+        readers = [
+            OutputReader(process.stdout, "%s/simulation_output.log.gz" % simulation_path),
+            OutputReader(process.stderr, "%s/simulation_error.log.gz" % simulation_path)
+        ]
+
+        for reader in readers:
+            reader.start()
 
         self.simulations[identifier] = {
-            "process": sp.Popen(arguments, stdout = stdout, stderr = stderr),
+            "process": process, "readers": readers,
+            "cores": None if allocation is None else allocation[0],
             "arguments": arguments, "status": "running", "progress": -1,
-            "iterations": parameters["iterations"] if "iterations" in parameters else None
+            "iterations": parameters["iterations"] if "iterations" in parameters else None,
+            "hashes": None, "restart_hash": restart_hash,
+            "staged_paths": staged_paths, "store_futures": [], "store_abort": threading.Event()
         }
 
+        self.running.append(identifier)
+
+    def _get_config_inputs(self, parameters):
+        if "config_path" in parameters:
+            config_path = parameters["config_path"]
+        elif "--config-path" in parameters["arguments"]:
+            config_path = parameters["arguments"][parameters["arguments"].index("--config-path") + 1]
+        else:
+            raise RuntimeError("Staging needs the parameter 'config_path' or a --config-path argument.")
+
+        if not config_path in self.config_inputs:
+            self.config_inputs[config_path] = read_config_inputs(config_path)
+
+        return self.config_inputs[config_path]
+
     def _ping(self):
-        for identifier, simulation in self.simulations.items():
-            if simulation["status"] == "running":
-                return_code = simulation["process"].poll()
+        for identifier in self.running[:]:
+            simulation = self.simulations[identifier]
+            readers = simulation["readers"]
 
-                if return_code is None:
-                    # Still running!
-                    iteration = self._get_iteration(identifier)
+            if any(reader.fatal for reader in readers):
+                # Java reported an uncaught exception, no need to wait for the shutdown
+                simulation["process"].kill()
 
-                    if iteration > simulation["progress"]:
-                        simulation["progress"] = iteration
+            return_code = simulation["process"].poll()
 
-                        logger.info("Running simulation {} ... ({}/{} iterations)".format(
-                            identifier, iteration, "?" if simulation["iterations"] is None else simulation["iterations"]
-                        ))
+            if return_code is None:
+                # Still running!
+                iteration = max(reader.iteration for reader in readers)
 
-                elif return_code == 0:
-                    # Finished
-                    logger.info("Finished simulation {}".format(identifier))
-                    simulation["status"] = "done"
-                else:
-                    # Errorerd
-                    raise RuntimeError("Error running simulation {}. See {}/{}/simulation_error.log".format(identifier, self.working_directory, identifier))
+                if iteration > simulation["progress"]:
+                    simulation["progress"] = iteration
 
-    def _get_iteration(self, identifier):
-        stopwatch_paths = glob.glob("%s/%s/output/*stopwatch.txt" % (self.working_directory, identifier))
+                    logger.info("Running simulation {} ... ({}/{} iterations)".format(
+                        identifier, iteration, "?" if simulation["iterations"] is None else simulation["iterations"]
+                    ))
 
-        if len(stopwatch_paths) > 0 and os.path.isfile(stopwatch_paths[0]):
-            try:
-                df = pd.read_csv(stopwatch_paths[0], sep = "\t")
+                continue
 
-                if len(df) > 0:
-                    return df["Iteration"].max()
-            except:
-                pass
+            for reader in readers:
+                reader.join()
 
-        return -1
+            self.running.remove(identifier)
+
+            if not simulation["cores"] is None:
+                self.allocator.release(simulation["cores"])
+                simulation["cores"] = None
+
+            for path in simulation["staged_paths"]:
+                self.stage.release(path)
+
+            simulation["staged_paths"] = []
+
+            if return_code == 0:
+                # Finished
+                logger.info("Finished simulation {}".format(identifier))
+                simulation["status"] = "done"
+
+                if not self.store is None:
+                    simulation["hashes"] = {}
+                    simulation["store_futures"].append(self.store_executor.submit(
+                        self._store_outputs, "%s/%s/output" % (self.working_directory, identifier), simulation
+                    ))
+            else:
+                # Errorerd
+                simulation["status"] = "error"
+                errors = sum([reader.errors for reader in readers], [])
+
+                raise RuntimeError("Error running simulation {}{}. See {}/{}/simulation_error.log.gz".format(
+                    identifier, ": %s" % errors[0] if len(errors) > 0 else "",
+                    self.working_directory, identifier
+                ))
 
     def ready(self, identifier):
         self._ping()
@@ -170,6 +459,102 @@ class MATSimSimulator(Simulator):
         simulation_path = "%s/%s" % (self.working_directory, identifier)
         return "%s/output" % simulation_path
 
+    def _store_outputs(self, output_path, simulation):
+        try:
+            self.store.add(output_path, simulation["hashes"], simulation["store_abort"])
+        except OSError as e:
+            logger.warning("Could not store outputs of %s: %s" % (output_path, str(e)))
+
+    def _wait_store(self, simulation, abort = False):
+        # Waits for the background work on the outputs of a simulation
+        if abort:
+            simulation["store_abort"].set()
+
+            for future in simulation["store_futures"]:
+                future.cancel()
+
+        cf.wait(simulation["store_futures"])
+        simulation["store_futures"] = []
+
+    def _get_restart_hash(self, identifier):
+        if identifier in self.simulations:
+            # Outputs are only hashed on demand if a restart needs them early
+            self._wait_store(self.simulations[identifier])
+
+        if identifier in self.simulations and not self.simulations[identifier]["hashes"] is None:
+            for path, digest in self.simulations[identifier]["hashes"].items():
+                if path.endswith("output_plans.xml.gz"):
+                    return digest
+
+        if len(identifier) == 64 and self.store.has(identifier):
+            # Restart has been given as a content hash directly
+            return identifier
+
+        return None
+
+    def prune(self, identifier):
+        """
+            Removes all outputs of a finished simulation except for the ones that
+            are needed to restart from it (see the 'retain' parameter). If the
+            outputs are stored, this happens in the background once they have
+            been added to the store.
+        """
+        simulation_path = "%s/%s" % (self.working_directory, identifier)
+
+        if self.store is None or not identifier in self.simulations:
+            self._prune(simulation_path, {})
+        else:
+            simulation = self.simulations[identifier]
+            simulation["store_futures"].append(self.store_executor.submit(
+                self._prune, simulation_path, simulation["hashes"]
+            ))
+
+    def _prune(self, simulation_path, hashes):
+        # Stored files are only links, they are unlinked right away to not
+        # keep their blobs alive in the trash
+        stored_paths = set(os.path.join(simulation_path, "output", path) for path in hashes or {})
+
+        for root, directories, files in os.walk(simulation_path, topdown = False):
+            for name in files:
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in self.parameters["retain"]):
+                    path = os.path.join(root, name)
+
+                    if path in stored_paths:
+                        os.remove(path)
+                    else:
+                        self.cleanup.remove(path)
+
+            if root != simulation_path and len(os.listdir(root)) == 0:
+                os.rmdir(root)
+
     def clean(self, identifier):
         simulation_path = "%s/%s" % (self.working_directory, identifier)
-        shutil.rmtree(simulation_path)
+
+        if not identifier in self.simulations:
+            self.cleanup.remove(simulation_path)
+            return
+
+        simulation = self.simulations[identifier]
+
+        # Stop hashing the outputs, which are not needed anymore
+        self._wait_store(simulation, abort = True)
+        hashes = {} if simulation["hashes"] is None else simulation["hashes"]
+
+        # Unlink stored outputs right away, otherwise the links in the trash
+        # keep the blobs alive when they are released below
+        for path in hashes:
+            try:
+                os.remove("%s/output/%s" % (simulation_path, path))
+            except OSError:
+                pass
+
+        self.cleanup.remove(simulation_path)
+        del self.simulations[identifier]
+
+        if not self.store is None:
+            # Blobs are removed once no other simulation uses them
+            for digest in hashes.values():
+                self.store.release(digest)
+
+            if not simulation["restart_hash"] is None:
+                self.store.release(simulation["restart_hash"])
@@ -0,0 +1,72 @@
+from octras.store import hash_file
+
+import os, pickle, hashlib, uuid
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ReferenceCache:
+    """
+        Caches processed reference data (filtered data frames, bounds, reference
+        states, ...). Entries are keyed by the content hash of the reference
+        file and the settings that were used to process it. They are kept in
+        memory and, if a cache directory is given, persisted on disk so that
+        later runs do not need to process the reference again.
+    """
+
+    def __init__(self, path = None):
+        self.path = path
+        self.memory = {}
+        self.hashes = {}
+
+        if not self.path is None and not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def _get_file_hash(self, path):
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+        if not key in self.hashes:
+            self.hashes[key] = hash_file(path)
+
+        return self.hashes[key]
+
+    def get_key(self, path, settings):
+        digest = hashlib.sha256(self._get_file_hash(path).encode("ascii"))
+        digest.update(pickle.dumps(settings))
+        return digest.hexdigest()
+
+    def get(self, path, settings, compute):
+        """
+            Returns the processed reference for the file and settings. If it is
+            not cached yet, compute(path) is called to obtain it.
+        """
+        key = self.get_key(path, settings)
+
+        if key in self.memory:
+            return self.memory[key]
+
+        cache_path = None if self.path is None else os.path.join(self.path, "%s.p" % key)
+
+        if not cache_path is None and os.path.exists(cache_path):
+            logger.info("Loading cached reference for %s" % path)
+
+            with open(cache_path, "rb") as f:
+                self.memory[key] = pickle.load(f)
+
+            return self.memory[key]
+
+        logger.info("Processing reference %s" % path)
+        value = compute(path)
+
+        if not cache_path is None:
+            temporary_path = "%s.%s" % (cache_path, uuid.uuid4().hex)
+
+            with open(temporary_path, "wb+") as f:
+                pickle.dump(value, f)
+
+            os.replace(temporary_path, cache_path)
+
+        self.memory[key] = value
+        return value
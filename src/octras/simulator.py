@@ -10,3 +10,7 @@ class Simulator:
 
     def clean(self, identifier):
         raise NotImplementedError()
+
+    def prune(self, identifier):
+        # Optional: remove everything except what is needed for restarts
+        pass
@@ -0,0 +1,218 @@
+from octras.store import hash_file
+from octras.cleanup import get_size
+
+import os, shutil, gzip, json, uuid, fcntl, threading
+import xml.etree.ElementTree as ET
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Scenario inputs of a MATSim config that are shared between runs
+INPUT_PARAMETERS = [
+    "network.inputNetworkFile",
+    "plans.inputPlansFile",
+    "facilities.inputFacilitiesFile",
+    "households.inputFile",
+    "transit.transitScheduleFile",
+    "transit.vehiclesFile",
+    "vehicles.vehiclesFile"
+]
+
+def read_config_inputs(config_path, parameters = INPUT_PARAMETERS):
+    """
+        Reads the input file paths from a MATSim config file. Relative paths are
+        resolved against the directory of the config file.
+    """
+    inputs = {}
+    directory = os.path.dirname(os.path.realpath(config_path))
+
+    for module in ET.parse(config_path).getroot().iter("module"):
+        for param in module.iter("param"):
+            key = "%s.%s" % (module.get("name"), param.get("name"))
+            value = param.get("value")
+
+            if key in parameters and not value is None and len(value.strip()) > 0:
+                inputs[key] = os.path.join(directory, value.strip())
+
+    return inputs
+
+class ScenarioStage:
+    """
+        Copies scenario inputs once per node into a (local or tmpfs) cache
+        directory, so that concurrent simulations do not all read them from
+        shared storage at startup. Files are keyed by their content hash and
+        can optionally be decompressed while staging. If the cache grows beyond
+        maximum_size bytes, the least recently used entries that are not in use
+        are evicted.
+
+        The cache can be shared by multiple processes. Every use of an entry
+        is recorded as a lease file (named by entry and process id) below the
+        cache directory, so an entry is not evicted while any process uses
+        it. Leases of processes that do not exist anymore are ignored.
+    """
+
+    def __init__(self, path, maximum_size = None, decompress = False):
+        self.path = path
+        self.maximum_size = maximum_size
+        self.decompress = decompress
+
+        self.usage = {}
+        self.leases = {}
+        self.lock = threading.Lock()
+
+        self.lease_path = os.path.join(self.path, ".leases")
+
+        if not os.path.exists(self.lease_path):
+            os.makedirs(self.lease_path)
+
+        self.index_path = os.path.join(self.path, "index.json")
+
+    def _locked(self):
+        # Serializes staging between processes on the same node
+        return _FileLock(os.path.join(self.path, ".lock"))
+
+    def _get_hash(self, path):
+        stat = os.stat(path)
+        key = "%s:%d:%d" % (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+        index = {}
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+
+        if not key in index:
+            index[key] = hash_file(path)
+
+            temporary_path = "%s.%s" % (self.index_path, uuid.uuid4().hex)
+
+            with open(temporary_path, "w+") as f:
+                json.dump(index, f)
+
+            os.replace(temporary_path, self.index_path)
+
+        return index[key]
+
+    def _copy(self, source_path, target_path):
+        temporary_path = "%s.%s" % (target_path, uuid.uuid4().hex)
+
+        if self.decompress and source_path.endswith(".gz"):
+            with gzip.open(source_path, "rb") as source, open(temporary_path, "wb+") as target:
+                shutil.copyfileobj(source, target, 1 << 20)
+        else:
+            shutil.copyfile(source_path, temporary_path)
+
+        os.replace(temporary_path, target_path)
+
+    def stage(self, source_path):
+        """
+            Returns the path of the staged copy of the given file and marks it
+            as being in use until release is called.
+        """
+        with self._locked():
+            digest = self._get_hash(source_path)
+            entry_path = os.path.join(self.path, digest)
+
+            name = os.path.basename(source_path)
+
+            if self.decompress and name.endswith(".gz"):
+                name = name[:-3]
+
+            target_path = os.path.join(entry_path, name)
+
+            if not os.path.exists(target_path):
+                logger.info("Staging %s to %s" % (source_path, target_path))
+
+                os.makedirs(entry_path, exist_ok = True)
+                self._copy(source_path, target_path)
+
+            os.utime(entry_path)
+
+            lease_path = os.path.join(self.lease_path, "%s.%d.%s" % (digest, os.getpid(), uuid.uuid4().hex))
+            open(lease_path, "w+").close()
+
+            with self.lock:
+                self.usage[digest] = self.usage.get(digest, 0) + 1
+                self.leases.setdefault(digest, []).append(lease_path)
+
+            try:
+                self._evict()
+            except:
+                self.release(target_path)
+                raise
+
+        return target_path
+
+    def release(self, staged_path):
+        digest = os.path.basename(os.path.dirname(staged_path))
+
+        with self.lock:
+            self.usage[digest] -= 1
+            lease_path = self.leases[digest].pop()
+
+            if self.usage[digest] == 0:
+                del self.usage[digest]
+                del self.leases[digest]
+
+        try:
+            os.remove(lease_path)
+        except OSError:
+            pass
+
+    def _get_leased(self):
+        # Returns the entries that are in use by any (living) process
+        leased = set()
+
+        for name in os.listdir(self.lease_path):
+            digest, pid, suffix = name.split(".")
+
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                logger.warning("Removing stale staging lease %s" % name)
+                os.remove(os.path.join(self.lease_path, name))
+                continue
+            except PermissionError:
+                pass # Process exists, but belongs to another user
+
+            leased.add(digest)
+
+        return leased
+
+    def _evict(self):
+        if self.maximum_size is None:
+            return
+
+        entries = []
+        leased = self._get_leased()
+
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+
+            if os.path.isdir(entry_path) and not name.startswith("."):
+                entries.append((os.stat(entry_path).st_mtime, name, get_size(entry_path)))
+
+        total_size = sum([entry[2] for entry in entries])
+
+        for last_used, name, size in sorted(entries):
+            if total_size <= self.maximum_size:
+                break
+
+            if not name in leased:
+                logger.info("Evicting %s from staging cache" % name)
+                shutil.rmtree(os.path.join(self.path, name))
+                total_size -= size
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "a+")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
@@ -0,0 +1,165 @@
+import os, stat, hashlib, fnmatch, uuid, threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Outputs that are often identical between runs or needed for restarts. Event
+# files are unique per run and expensive to hash, so they are not included.
+DEFAULT_PATTERNS = [
+    "*output_network.xml.gz", "*output_facilities.xml.gz",
+    "*output_households.xml.gz", "*output_vehicles.xml.gz",
+    "*output_transitSchedule.xml.gz", "*output_transitVehicles.xml.gz",
+    "*output_config.xml", "*output_config_reduced.xml",
+    "*output_plans.xml.gz"
+]
+
+def hash_file(path, block_size = 1 << 20, abort = None):
+    # Returns None if the abort event is set while hashing
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            if not abort is None and abort.is_set():
+                return None
+
+            digest.update(block)
+
+    return digest.hexdigest()
+
+class OutputStore:
+    """
+        Content-addressed store for simulation outputs. Files added to the store
+        are hashed and replaced by hard links to a single read-only blob per
+        content hash, so identical outputs of many simulations only occupy disk
+        space (and page cache) once. Blobs stay available through their hash
+        after the simulation directories have been deleted, until they are
+        collected.
+
+        The store counts the references to every blob: adding a file or calling
+        acquire adds one, and release removes one. A blob is removed as soon as
+        it has no references and is not linked from anywhere else anymore.
+        This way, blobs can be freed without listing the whole store.
+    """
+
+    def __init__(self, path, patterns = DEFAULT_PATTERNS):
+        self.path = path
+        self.patterns = patterns
+
+        self.references = {}
+        self.lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    def get_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def has(self, digest):
+        return os.path.exists(self.get_path(digest))
+
+    def _link(self, source_path, target_path):
+        # Replace target atomically by a hard link to source
+        temporary_path = "%s.%s" % (target_path, uuid.uuid4().hex)
+        os.link(source_path, temporary_path)
+        os.replace(temporary_path, target_path)
+
+    def acquire(self, digest):
+        with self.lock:
+            self.references[digest] = self.references.get(digest, 0) + 1
+
+    def release(self, digest):
+        """
+            Removes a reference to a blob and removes the blob if it is not
+            used anymore. Returns the number of freed bytes.
+        """
+        with self.lock:
+            self.references[digest] -= 1
+
+            if self.references[digest] > 0:
+                return 0
+
+            del self.references[digest]
+            blob_path = self.get_path(digest)
+
+            try:
+                blob_stat = os.stat(blob_path)
+
+                if blob_stat.st_nlink == 1:
+                    os.remove(blob_path)
+                    return blob_stat.st_size
+            except OSError:
+                pass
+
+        return 0
+
+    def add_file(self, path, abort = None):
+        """
+            Adds a file to the store and returns its content hash. The file is
+            replaced by a hard link to the blob and the blob is referenced once.
+            Returns None if the abort event has been set.
+        """
+        digest = hash_file(path, abort = abort)
+
+        if digest is None:
+            return None
+
+        blob_path = self.get_path(digest)
+
+        try:
+            if os.path.exists(blob_path):
+                if not os.path.samefile(blob_path, path):
+                    self._link(blob_path, path)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok = True)
+                os.link(path, blob_path)
+                os.chmod(blob_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        except OSError as e:
+            # For instance, the store is on a different file system
+            logger.warning("Could not deduplicate %s: %s" % (path, str(e)))
+
+        self.acquire(digest)
+        return digest
+
+    def add(self, directory, hashes = None, abort = None):
+        """
+            Adds all files in the directory (recursively) that match the store
+            patterns. Returns a dictionary of relative paths and content hashes,
+            which is filled in place if given. If the abort event is set, no
+            further files are added.
+        """
+        hashes = {} if hashes is None else hashes
+
+        for root, directories, files in os.walk(directory):
+            for name in files:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+                    path = os.path.join(root, name)
+                    digest = self.add_file(path, abort)
+
+                    if digest is None:
+                        return hashes
+
+                    hashes[os.path.relpath(path, directory)] = digest
+
+        return hashes
+
+    def collect(self, keep = set()):
+        """
+            Removes all blobs that are not linked from anywhere else anymore,
+            except for the ones listed in keep, for instance the leftovers of a
+            previous session. Returns the number of freed bytes.
+        """
+        freed = 0
+
+        for prefix in os.listdir(self.path):
+            prefix_path = os.path.join(self.path, prefix)
+
+            for name in os.listdir(prefix_path):
+                blob_path = os.path.join(prefix_path, name)
+                blob_stat = os.stat(blob_path)
+
+                if blob_stat.st_nlink == 1 and not (prefix + name) in keep:
+                    os.remove(blob_path)
+                    freed += blob_stat.st_size
+
+        return freed
@@ -1,15 +1,28 @@
 import logging
 import pickle
+import os
 
 logger = logging.getLogger(__name__)
 
 class PickleTracker:
-    def __init__(self, output_path):
+    def __init__(self, output_path, snapshot_path = None):
         self.output_path = output_path
         self.history = []
 
+        if snapshot_path is None:
+            snapshot_path = "%s_snapshots%s" % os.path.splitext(output_path)
+
+        self.snapshot_path = snapshot_path
+        self.snapshots = {}
+
         self.best_objective = None
 
+    def notify_snapshot(self, identifier, snapshot):
+        self.snapshots[identifier] = snapshot
+
+        with open(self.snapshot_path, "wb+") as f:
+            pickle.dump(self.snapshots, f)
+
     def notify(self, simulation):
         if self.best_objective is None or simulation["objective"] < self.best_objective:
             self.best_objective = simulation["objective"]
@@ -0,0 +1,203 @@
+import os, json, uuid, hashlib
+import numpy as np
+import pandas as pd
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _get_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _convert_column(values, dtype = None):
+    """
+        Converts a column to a compact representation: strings become
+        categoricals, floating point numbers become float32 unless a specific
+        type is requested.
+    """
+    if dtype == "category" or (dtype is None and (values.dtype == object or pd.api.types.is_string_dtype(values.dtype))):
+        return values.astype("category")
+
+    if not dtype is None:
+        return values.astype(dtype)
+
+    if values.dtype == np.float64:
+        return values.astype(np.float32)
+
+    return values
+
+def _get_cache_directory(path, cache_path):
+    if cache_path is None:
+        return "%s.columns" % path
+
+    digest = hashlib.sha256(os.path.realpath(path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_path, "%s.%s.columns" % (os.path.basename(path), digest))
+
+def _is_writable(path):
+    try:
+        os.makedirs(path, exist_ok = True)
+    except OSError:
+        return False
+
+    return os.access(path, os.W_OK)
+
+def _save_column(path, values):
+    # Files may be memory-mapped by other processes, so they are replaced
+    # atomically instead of being overwritten in place
+    temporary_path = "%s.%s.npy" % (path, uuid.uuid4().hex)
+    np.save(temporary_path, values)
+    os.replace(temporary_path, path)
+
+def load_trips(path, columns, dtypes = {}, sep = ";", cache = True, cache_path = None):
+    """
+        Loads the given columns of a trip table (or any other simulation output
+        in CSV format). Only the requested columns are read, with strings as
+        categoricals and floating point numbers as float32 (see dtypes to
+        override). The columns are converted once into .npy files in a
+        "<path>.columns" directory (or in a directory below cache_path), which
+        are memory-mapped on later calls, so multiple objective calculators
+        can share them without parsing the CSV again. If the cache directory
+        cannot be written, the CSV is read without caching.
+    """
+    columns_path = _get_cache_directory(path, cache_path)
+    metadata_path = os.path.join(columns_path, "metadata.json")
+
+    signature = _get_signature(path)
+    metadata = { "signature": signature, "columns": {} }
+
+    if cache and os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            cached_metadata = json.load(f)
+
+        if cached_metadata["signature"] == signature:
+            metadata = cached_metadata
+
+    missing = [column for column in columns if not column in metadata["columns"]]
+
+    if len(missing) > 0 and cache and not _is_writable(columns_path):
+        logger.warning("Cannot write column cache for %s, reading without cache" % path)
+        cache, missing = False, columns
+
+    if len(missing) > 0:
+        df = pd.read_csv(path, sep = sep, usecols = missing, dtype = {
+            column: "category" if dtype == "category" else dtype
+            for column, dtype in dtypes.items() if column in missing
+        })
+
+        data = { column: _convert_column(df[column], dtypes.get(column)) for column in missing }
+
+        if not cache:
+            return pd.DataFrame(data)[columns]
+
+        for column in missing:
+            values = data[column]
+
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                _save_column(os.path.join(columns_path, "%s.npy" % column), values.cat.codes.values)
+                categories = np.asarray(values.cat.categories.values)
+
+                if categories.dtype == object:
+                    categories = categories.astype(str)
+
+                _save_column(os.path.join(columns_path, "%s.categories.npy" % column), categories)
+                metadata["columns"][column] = "category"
+            else:
+                _save_column(os.path.join(columns_path, "%s.npy" % column), values.values)
+                metadata["columns"][column] = "values"
+
+        temporary_path = "%s.%s" % (metadata_path, uuid.uuid4().hex)
+
+        with open(temporary_path, "w+") as f:
+            json.dump(metadata, f)
+
+        os.replace(temporary_path, metadata_path)
+
+    data = {}
+
+    for column in columns:
+        values = np.load(os.path.join(columns_path, "%s.npy" % column), mmap_mode = "r")
+
+        if metadata["columns"][column] == "category":
+            categories = np.load(os.path.join(columns_path, "%s.categories.npy" % column))
+            data[column] = pd.Categorical.from_codes(values, categories)
+        else:
+            data[column] = values
+
+    return pd.DataFrame(data, copy = False)
+
+class TripSample:
+    """
+        A selection of trips that is shared between state calculators. Modes
+        are encoded as integer codes once and columns are extracted lazily (and
+        only once) as float64 arrays. If there is no weight column, all trips
+        have a weight of one.
+    """
+
+    def __init__(self, df, selection = None, weight = "weight"):
+        if selection is None:
+            selection = np.ones((len(df),), dtype = bool)
+
+        self.df = df
+        self.selection = np.asarray(selection, dtype = bool)
+
+        if weight in df:
+            self.weights = np.asarray(df[weight].values[self.selection], dtype = np.float64)
+        else:
+            self.weights = np.ones((np.count_nonzero(self.selection),), dtype = np.float64)
+
+        modes = df["mode"].values
+
+        if isinstance(modes, pd.Categorical):
+            codes, categories = modes.codes, modes.categories
+        else:
+            codes, categories = pd.factorize(modes)
+
+        self.mode_codes = np.asarray(codes[self.selection])
+        self.modes = { mode: code for code, mode in enumerate(categories) }
+        self.columns = {}
+
+    def get_column(self, name):
+        if not name in self.columns:
+            self.columns[name] = np.asarray(self.df[name].values[self.selection], dtype = np.float64)
+
+        return self.columns[name]
+
+    def get_mode_code(self, mode):
+        return self.modes.get(mode, -1)
+
+def weighted_histograms(sample, items):
+    """
+        Computes weighted histograms of trip attributes for a list of items
+        (mode, column, bounds) in one pass. Each histogram has len(bounds) + 1
+        classes as given by np.digitize. If mode is None, all trips are counted
+        and if column is None, all trips fall into a single class (so the
+        result is the total weight of the mode). All classes of all items are
+        combined into one index, so only one np.bincount is needed.
+    """
+    indices, weights, sizes = [], [], []
+    offset = 0
+
+    for mode, column, bounds in items:
+        size = 1 if column is None else len(bounds) + 1
+
+        if mode is None:
+            selection = slice(None)
+        elif sample.get_mode_code(mode) < 0:
+            selection = np.zeros((len(sample.weights),), dtype = bool)
+        else:
+            selection = sample.mode_codes == sample.get_mode_code(mode)
+
+        if column is None:
+            classes = np.zeros((len(sample.weights),), dtype = np.int64)[selection]
+        else:
+            classes = np.digitize(sample.get_column(column)[selection], bounds)
+
+        indices.append(classes + offset)
+        weights.append(sample.weights[selection])
+        sizes.append(size)
+
+        offset += size
+
+    counts = np.bincount(np.concatenate(indices), np.concatenate(weights), minlength = offset)
+    return np.split(counts, np.cumsum(sizes)[:-1])
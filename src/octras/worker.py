@@ -0,0 +1,205 @@
+from octras import Simulator
+from octras.matsim import OutputReader
+from octras.cleanup import CleanupQueue
+
+import os, json, threading, queue
+import subprocess as sp
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MessageReader(threading.Thread):
+    """
+        Reads newline-delimited JSON messages from the standard output of a
+        worker process and puts them into a queue.
+    """
+
+    def __init__(self, stream):
+        super().__init__(daemon = True)
+
+        self.stream = stream
+        self.messages = queue.Queue()
+
+    def run(self):
+        try:
+            for line in iter(self.stream.readline, b""):
+                line = line.decode("utf-8", "replace").strip()
+
+                if len(line) > 0:
+                    try:
+                        self.messages.put(json.loads(line))
+                    except ValueError:
+                        logger.debug("Ignoring worker output: %s" % line)
+        finally:
+            self.stream.close()
+
+def encode_parameters(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError("Cannot send %s to worker" % type(value))
+
+class WorkerSimulator(Simulator):
+    """
+        Runs simulations on a pool of long-lived worker processes, so that the
+        startup cost (JVM, loading network, population, ...) is only paid once
+        per worker instead of once per simulation.
+
+        Each worker is started with the given command and communicates through
+        newline-delimited JSON on stdin and stdout:
+
+        - worker: { "type": "ready" } once it is able to accept runs
+        - octras: { "type": "run", "identifier": ..., "path": ..., "parameters": ... }
+        - worker: { "type": "progress", "identifier": ..., "iteration": ... } (optional)
+        - worker: { "type": "done", "identifier": ..., "result": ... } ("result" is optional)
+        - worker: { "type": "error", "identifier": ..., "message": ... }
+        - octras: { "type": "shutdown" }
+
+        Each run gets its own simulation directory in the working directory. If
+        the worker does not return a result, the path of the output directory
+        within the simulation directory is returned by get.
+    """
+
+    def __init__(self, working_directory, command, workers = 1, cleanup_workers = 2):
+        self.working_directory = os.path.realpath(working_directory)
+        self.command = command
+
+        self.cleanup = CleanupQueue("%s/.trash" % self.working_directory, cleanup_workers)
+
+        self.simulations = {}
+        self.pending = []
+
+        self.workers = [self._start_worker(index) for index in range(workers)]
+
+    def _start_worker(self, index):
+        log_path = "%s/worker_%d.log.gz" % (self.working_directory, index)
+        process = sp.Popen(self.command, stdin = sp.PIPE, stdout = sp.PIPE, stderr = sp.PIPE)
+
+        reader = MessageReader(process.stdout)
+        reader.start()
+
+        error_reader = OutputReader(process.stderr, log_path)
+        error_reader.start()
+
+        logger.info("Started worker %d: %s" % (index, " ".join(self.command)))
+
+        return {
+            "index": index, "process": process,
+            "reader": reader, "error_reader": error_reader,
+            "ready": False, "identifier": None
+        }
+
+    def _send(self, worker, message):
+        worker["process"].stdin.write((json.dumps(message, default = encode_parameters) + "\n").encode("utf-8"))
+        worker["process"].stdin.flush()
+
+    def _handle(self, worker, message):
+        if message["type"] == "ready":
+            worker["ready"] = True
+            return
+
+        simulation = self.simulations[message["identifier"]]
+
+        if message["type"] == "progress":
+            if message["iteration"] > simulation["progress"]:
+                simulation["progress"] = message["iteration"]
+                logger.info("Running simulation {} on worker {} ... (iteration {})".format(
+                    simulation["identifier"], worker["index"], message["iteration"]
+                ))
+
+        elif message["type"] == "done":
+            logger.info("Finished simulation {}".format(simulation["identifier"]))
+            simulation["status"] = "done"
+            simulation["result"] = message["result"] if "result" in message else "%s/output" % simulation["path"]
+            worker["identifier"] = None
+
+        elif message["type"] == "error":
+            simulation["status"] = "error"
+            worker["identifier"] = None
+
+            raise RuntimeError("Error running simulation {} on worker {}: {}".format(
+                simulation["identifier"], worker["index"], message["message"] if "message" in message else "unknown"
+            ))
+
+    def _ping(self):
+        for worker in self.workers:
+            while True:
+                try:
+                    message = worker["reader"].messages.get_nowait()
+                except queue.Empty:
+                    break
+
+                self._handle(worker, message)
+
+            if not worker["process"].poll() is None and worker["reader"].messages.empty():
+                worker["reader"].join()
+
+                if worker["reader"].messages.empty():
+                    raise RuntimeError("Worker {} exited with code {}{}. See {}/worker_{}.log.gz".format(
+                        worker["index"], worker["process"].returncode,
+                        " while running %s" % worker["identifier"] if not worker["identifier"] is None else "",
+                        self.working_directory, worker["index"]
+                    ))
+
+        for worker in self.workers:
+            if len(self.pending) == 0:
+                break
+
+            if worker["ready"] and worker["identifier"] is None:
+                simulation = self.simulations[self.pending.pop(0)]
+                simulation["status"] = "running"
+                worker["identifier"] = simulation["identifier"]
+
+                self._send(worker, {
+                    "type": "run", "identifier": simulation["identifier"],
+                    "path": simulation["path"], "parameters": simulation["parameters"]
+                })
+
+    def run(self, identifier, parameters):
+        if identifier in self.simulations:
+            raise RuntimeError("A simulation with identifier %s already exists." % identifier)
+
+        simulation_path = "%s/%s" % (self.working_directory, identifier)
+
+        self.cleanup.remove(simulation_path)
+        os.mkdir(simulation_path)
+
+        self.simulations[identifier] = {
+            "identifier": identifier, "parameters": parameters, "path": simulation_path,
+            "status": "pending", "progress": -1, "result": None
+        }
+
+        self.pending.append(identifier)
+        self._ping()
+
+    def ready(self, identifier):
+        self._ping()
+        return self.simulations[identifier]["status"] == "done"
+
+    def get(self, identifier):
+        if not self.ready(identifier):
+            raise RuntimeError("Simulation %s is not ready to obtain result." % identifier)
+
+        return self.simulations[identifier]["result"]
+
+    def clean(self, identifier):
+        self.cleanup.remove(self.simulations[identifier]["path"])
+        del self.simulations[identifier]
+
+    def shutdown(self):
+        for worker in self.workers:
+            if worker["process"].poll() is None:
+                self._send(worker, { "type": "shutdown" })
+                worker["process"].stdin.close()
+
+        for worker in self.workers:
+            worker["process"].wait()
+            worker["reader"].join()
+            worker["error_reader"].join()
+
+        self.cleanup.shutdown()
@@ -0,0 +1,66 @@
+from ..cases import QuadraticSimulator, QuadraticProblem
+
+from octras.algorithms import AdaptiveSPSA
+from octras import Loop, Evaluator
+
+import numpy as np
+import pytest
+
+def test_adaptive_spsa():
+    for seed in (1000, 2000, 3000, 4000):
+        # Badly scaled problem, plain SPSA would need a very small gain
+        evaluator = Evaluator(
+            simulator = QuadraticSimulator(),
+            problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0], weights = [100.0, 1.0]),
+            parallel = 5
+        )
+
+        algorithm = AdaptiveSPSA(evaluator,
+            perturbation_factor = 2e-2,
+            seed = seed
+        )
+
+        assert Loop(threshold = 1e-4, maximum_runs = 5000).run(
+            evaluator = evaluator,
+            algorithm = algorithm
+        ) == pytest.approx((2.0, 1.0), 1e-2)
+
+        # The smoothed Hessian approaches the true one (diagonal 200, 2)
+        assert algorithm.hessian[0, 0] == pytest.approx(200.0, 0.1)
+
+def test_adaptive_spsa_batch():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 5
+    )
+
+    algorithm = AdaptiveSPSA(evaluator, perturbation_factor = 2e-2, seed = 0)
+    algorithm.advance()
+
+    # Objective, gradient and Hessian runs are submitted in one batch
+    trace = evaluator.fetch_trace()
+
+    assert sorted([item["annotations"]["type"] for item in trace]) == [
+        "negative_gradient", "negative_hessian", "objective", "positive_gradient", "positive_hessian"
+    ]
+
+def test_adaptive_spsa_dimensions():
+    # Early Hessian estimates have a low rank for more than two parameters
+    for dimensions in (5, 10):
+        u = np.linspace(-1.0, 1.0, dimensions)
+
+        for seed in (1, 2, 3):
+            evaluator = Evaluator(
+                simulator = QuadraticSimulator(),
+                problem = QuadraticProblem(list(u), [0.0] * dimensions),
+                parallel = 5
+            )
+
+            algorithm = AdaptiveSPSA(evaluator, perturbation_factor = 2e-2, seed = seed)
+
+            for iteration in range(200):
+                algorithm.advance()
+                assert np.max(np.abs(algorithm.parameters - u)) < 10.0
+
+            assert algorithm.parameters == pytest.approx(u, abs = 2e-2)
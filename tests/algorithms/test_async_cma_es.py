@@ -0,0 +1,54 @@
+from ..cases import DelayedSimulator
+from ..cases import QuadraticSimulator, QuadraticProblem
+from ..cases import RosenbrockSimulator, RosenbrockProblem
+
+from octras.algorithms import AsynchronousCMAES
+from octras import Loop, Evaluator
+
+import pytest
+import numpy as np
+
+def test_async_cma_es_quadratic():
+    u = list(np.linspace(-1.0, 1.0, 5))
+
+    for seed in (1000, 2000):
+        evaluator = Evaluator(
+            simulator = DelayedSimulator(QuadraticSimulator(), maximum_delay = 20, seed = seed),
+            problem = QuadraticProblem(u, [0.0] * 5),
+            parallel = 8
+        )
+
+        algorithm = AsynchronousCMAES(evaluator,
+            initial_step_size = 0.5,
+            seed = seed
+        )
+
+        assert Loop(threshold = 1e-6, maximum_runs = 10000).run(
+            evaluator = evaluator,
+            algorithm = algorithm
+        ) == pytest.approx(u, abs = 1e-2)
+
+        # Freed slots are refilled right after every update
+        assert len(algorithm.pending) == 8
+        assert len(evaluator.pending) + len(evaluator.running) + len(evaluator.finished) == 8
+
+def test_async_cma_es_rosenbrock():
+    for update_size in (None, 4):
+        evaluator = Evaluator(
+            simulator = DelayedSimulator(RosenbrockSimulator(), maximum_delay = 20, seed = 0),
+            problem = RosenbrockProblem(4),
+            parallel = 8
+        )
+
+        algorithm = AsynchronousCMAES(evaluator,
+            update_size = update_size,
+            initial_step_size = 0.3,
+            seed = 0
+        )
+
+        assert Loop(threshold = 1e-8, maximum_runs = 20000).run(
+            evaluator = evaluator,
+            algorithm = algorithm
+        ) == pytest.approx([1.0] * 4, abs = 1e-2)
+
+        assert evaluator.current_runs < 20000
@@ -1,4 +1,6 @@
 from ..cases import CongestionSimulator, CongestionProblem
+from ..cases import QuadraticSimulator, QuadraticProblem
+from ..cases import RastriginSimulator, RastriginProblem
 
 from octras.algorithms import CMAES
 from octras import Loop, Evaluator
@@ -22,3 +24,85 @@ def test_cma_es():
             evaluator = evaluator,
             algorithm = algorithm
         )) - 230) < 10
+
+def test_cma_es_variants():
+    u = list(np.linspace(-1.0, 1.0, 10))
+
+    for variant in ("full", "separable", "limited"):
+        evaluator = Evaluator(
+            simulator = QuadraticSimulator(),
+            problem = QuadraticProblem(u, [0.0] * 10, weights = list(np.logspace(0, 3, 10)))
+        )
+
+        algorithm = CMAES(evaluator,
+            initial_step_size = 0.5,
+            variant = variant,
+            seed = 0
+        )
+
+        assert Loop(threshold = 1e-6, maximum_runs = 20000).run(
+            evaluator = evaluator,
+            algorithm = algorithm
+        ) == pytest.approx(u, abs = 1e-2)
+
+        assert evaluator.current_runs < 20000
+
+def test_cma_es_degenerate_covariance():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([0.0] * 3, [1.0] * 3)
+    )
+
+    algorithm = CMAES(evaluator, seed = 0)
+    algorithm.mean = np.ones((3,))
+
+    # All selected candidates lie on a line, so the covariance degenerates
+    algorithm.C = np.zeros((3, 3))
+    algorithm.c1, algorithm.cmu = 0.0, 1.0
+    algorithm.counteval = 1000
+
+    selected = np.ones((algorithm.mu, 3)) * np.arange(algorithm.mu)[:, np.newaxis] * 0.1
+    selected[:, 1:] = 0.0
+    algorithm.update(selected, None)
+
+    assert np.all(algorithm.D > 0.0)
+    assert np.all(np.isfinite(algorithm._invsqrt(np.ones((3,)))))
+
+def test_cma_es_restarts():
+    for restarts in ("ipop", "bipop"):
+        evaluator = Evaluator(
+            simulator = RastriginSimulator(),
+            problem = RastriginProblem(5),
+            parallel = 6
+        )
+
+        algorithm = CMAES(evaluator,
+            initial_step_size = 2.0,
+            restarts = restarts,
+            seed = 0
+        )
+
+        assert Loop(threshold = 1e-6, maximum_runs = 40000).run(
+            evaluator = evaluator,
+            algorithm = algorithm
+        ) == pytest.approx([0.0] * 5, abs = 1e-3)
+
+        # Restarts grow the population in multiples of the parallel slots
+        assert algorithm.restart > 0
+        assert algorithm.L % 6 == 0
+        assert algorithm.best_objective < 1e-6
+
+def test_cma_es_termination():
+    evaluator = Evaluator(
+        simulator = RastriginSimulator(),
+        problem = RastriginProblem(5)
+    )
+
+    algorithm = CMAES(evaluator, initial_step_size = 2.0, seed = 0)
+
+    while algorithm.termination is None:
+        algorithm.advance()
+
+    # Without restarts, CMA-ES stalls in a local minimum
+    assert algorithm.termination in ("TolFun", "TolX")
+    assert algorithm.best_objective > 0.5
@@ -1,4 +1,5 @@
 from ..cases import QuadraticSimulator, QuadraticProblem
+from ..cases import NoisyQuadraticSimulator
 from ..cases import RosenbrockSimulator, RosenbrockProblem
 
 from octras.algorithms import FDSA
@@ -21,3 +22,74 @@ def test_fdsa():
         evaluator = evaluator,
         algorithm = algorithm
     ) == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_fdsa_common_random_numbers():
+    evaluator = Evaluator(
+        simulator = NoisyQuadraticSimulator(noise = 0.1),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        seed = 0
+    )
+
+    algorithm = FDSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.2,
+        common_random_numbers = True
+    )
+
+    # The noise cancels out in the paired differences
+    for iteration in range(200):
+        algorithm.advance()
+
+    assert algorithm.parameters == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_fdsa_line_search():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 4
+    )
+
+    algorithm = FDSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.01,
+        line_search_factors = [1.0, 4.0, 16.0, 64.0]
+    )
+
+    algorithm.advance()
+
+    # The step of the plain update would be far too short
+    assert algorithm.parameters == pytest.approx((2.0, 1.0), 0.5)
+
+    assert Loop(threshold = 1e-4).run(
+        evaluator = evaluator,
+        algorithm = algorithm
+    ) == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_fdsa_blocks():
+    u = [2.0, 1.0, -1.0, 0.5, 3.0, -2.0, 1.5, 0.0]
+
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem(u, [0.0] * 8),
+        parallel = 5
+    )
+
+    algorithm = FDSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.4,
+        block_size = "auto",
+        one_sided = True,
+        seed = 0
+    )
+
+    algorithm.advance()
+
+    # One centre run and four one-sided gradient runs fill the slots
+    trace = evaluator.fetch_trace()
+    assert len(trace) == 5
+    assert len(set(item["annotations"]["dimension"] for item in trace if "dimension" in item["annotations"])) == 4
+
+    for iteration in range(200):
+        algorithm.advance()
+
+    assert algorithm.parameters == pytest.approx(u, abs = 5e-2)
@@ -1,4 +1,5 @@
 from ..cases import QuadraticSimulator, QuadraticProblem
+from ..cases import NoisyQuadraticSimulator
 from ..cases import RosenbrockSimulator, RosenbrockProblem
 
 from octras.algorithms import SPSA
@@ -23,3 +24,128 @@ def test_spsa():
             evaluator = evaluator,
             algorithm = algorithm
         ) == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_spsa_gradient_samples():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 9
+    )
+
+    algorithm = SPSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.2,
+        gradient_samples = 4,
+        seed = 1000
+    )
+
+    algorithm.advance()
+
+    # One objective run and four perturbation pairs per iteration
+    trace = evaluator.fetch_trace()
+    assert len(trace) == 9
+    assert set(item["annotations"]["sample"] for item in trace if item["annotations"]["type"] != "objective") == set(range(4))
+
+    assert Loop(threshold = 1e-4).run(
+        evaluator = evaluator,
+        algorithm = algorithm
+    ) == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_spsa_common_random_numbers():
+    evaluator = Evaluator(
+        simulator = NoisyQuadraticSimulator(noise = 0.1),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        seed = 0
+    )
+
+    algorithm = SPSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.2,
+        common_random_numbers = True,
+        seed = 1000
+    )
+
+    # The noise cancels out in the paired differences
+    for iteration in range(200):
+        algorithm.advance()
+
+    assert algorithm.parameters == pytest.approx((2.0, 1.0), 1e-2)
+
+def test_spsa_calibration():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 8
+    )
+
+    # Without calibration, this gradient factor makes SPSA diverge
+    algorithm = SPSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 100.0,
+        calibrate = True,
+        seed = 1000
+    )
+
+    assert Loop(threshold = 1e-4).run(
+        evaluator = evaluator,
+        algorithm = algorithm
+    ) == pytest.approx((2.0, 1.0), 1e-2)
+
+    assert algorithm.calibration["noise"] == 0.0
+    assert algorithm.perturbation_factor == 2e-2
+    assert algorithm.gradient_offset == 10.0
+    assert algorithm.gradient_factor < 100.0
+
+def test_spsa_calibration_noise():
+    evaluator = Evaluator(
+        simulator = NoisyQuadraticSimulator(noise = 0.1),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 8
+    )
+
+    algorithm = SPSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.2,
+        calibrate = True,
+        calibration_samples = 16,
+        seed = 1000
+    )
+
+    algorithm.advance()
+
+    # The perturbation follows the standard deviation of the noise
+    assert algorithm.perturbation_factor == pytest.approx(0.1, abs = 0.05)
+
+    trace = evaluator.fetch_trace()
+    assert len([item for item in trace if item["annotations"]["type"] == "calibration_objective"]) == 16
+    assert all(
+        item["annotations"]["calibration"] == algorithm.calibration
+        for item in trace if item["annotations"]["type"] in ("positive_gradient", "negative_gradient")
+    )
+
+def test_spsa_line_search():
+    evaluator = Evaluator(
+        simulator = QuadraticSimulator(),
+        problem = QuadraticProblem([2.0, 1.0], [0.0, 0.0]),
+        parallel = 4
+    )
+
+    algorithm = SPSA(evaluator,
+        perturbation_factor = 2e-2,
+        gradient_factor = 0.01,
+        line_search_factors = [1.0, 4.0, 16.0, 64.0],
+        seed = 1000
+    )
+
+    algorithm.advance()
+    algorithm.advance()
+
+    # The accepted candidate replaces the objective run of the next iteration
+    types = [item["annotations"]["type"] for item in evaluator.fetch_trace()]
+    assert types.count("objective") == 1
+    assert types.count("line_search") == 8
+
+    assert Loop(threshold = 1e-4).run(
+        evaluator = evaluator,
+        algorithm = algorithm
+    ) == pytest.approx((2.0, 1.0), 1e-2)
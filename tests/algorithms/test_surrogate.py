@@ -0,0 +1,88 @@
+from ..cases import QuadraticSimulator, QuadraticProblem
+
+from octras.algorithms import RBFSurrogate, CMAES, RandomWalk
+from octras import Loop, Evaluator
+
+import pytest
+import numpy as np
+
+def test_surrogate_incremental():
+    random = np.random.RandomState(0)
+    points = random.normal(size = (100, 3))
+    values = np.sum(points**2, axis = 1)
+
+    surrogate = RBFSurrogate(maximum_size = 40)
+    assert not surrogate.is_ready()
+
+    for x, value in zip(points, values):
+        surrogate.add(x, value)
+
+    assert surrogate.is_ready()
+    assert len(surrogate.points) == 40
+
+    # Interpolates the archive and matches a model that is fitted at once
+    assert surrogate.predict(points[-40:]) == pytest.approx(values[-40:], abs = 1e-6)
+
+    reference = RBFSurrogate(maximum_size = 40)
+    reference.add(points[-40:], values[-40:])
+
+    test_points = random.normal(size = (20, 3))
+    assert surrogate.predict(test_points) == pytest.approx(reference.predict(test_points), abs = 1e-6)
+
+    # Screening keeps the best candidates in their original order
+    selection = surrogate.screen(np.array([[3.0, 0.0, 0.0], [0.1, 0.0, 0.0], [2.0, 2.0, 2.0], [0.0, -0.2, 0.0]]), 2)
+    assert list(selection) == [1, 3]
+
+def test_cma_es_surrogate():
+    u = list(np.linspace(-1.0, 1.0, 5))
+    runs = { False: 0, True: 0 }
+
+    for use_surrogate in (False, True):
+        for seed in (1000, 2000, 3000):
+            evaluator = Evaluator(
+                simulator = QuadraticSimulator(),
+                problem = QuadraticProblem(u, [0.0] * 5)
+            )
+
+            algorithm = CMAES(evaluator,
+                initial_step_size = 0.5,
+                surrogate = RBFSurrogate() if use_surrogate else None,
+                seed = seed
+            )
+
+            assert Loop(threshold = 1e-8).run(
+                evaluator = evaluator,
+                algorithm = algorithm
+            ) == pytest.approx(u, abs = 1e-3)
+
+            runs[use_surrogate] += evaluator.current_runs
+
+    # Pre-screening saves simulation runs
+    assert runs[True] < 0.8 * runs[False]
+
+def test_random_walk_surrogate():
+    runs = {}
+
+    for oversampling in (None, 8):
+        runs[oversampling] = 0
+
+        for seed in (1000, 2000, 3000, 4000):
+            evaluator = Evaluator(
+                simulator = QuadraticSimulator(),
+                problem = QuadraticProblem([2.0, 1.0]),
+                parallel = 4
+            )
+
+            algorithm = RandomWalk(evaluator,
+                surrogate = None if oversampling is None else RBFSurrogate(oversampling = oversampling),
+                seed = seed
+            )
+
+            assert Loop(threshold = 1e-1).run(
+                evaluator = evaluator,
+                algorithm = algorithm
+            ) == pytest.approx((2.0, 1.0), abs = 0.5)
+
+            runs[oversampling] += evaluator.current_runs
+
+    assert runs[8] < runs[None]
@@ -17,13 +17,44 @@ class TestSimulator(Simulator):
     def clean(self, identifier):
         del self.results[identifier]
 
+class DelayedSimulator(Simulator):
+    """
+        Wraps another simulator and lets every run take a random number of
+        polls (between zero and maximum_delay) before it is ready, so that
+        runs finish in a different order than they have been started.
+    """
+    def __init__(self, simulator, maximum_delay = 10, seed = None):
+        self.simulator = simulator
+        self.maximum_delay = maximum_delay
+        self.random = np.random.RandomState(seed)
+        self.delays = {}
+
+    def run(self, identifier, parameters):
+        self.simulator.run(identifier, parameters)
+        self.delays[identifier] = self.random.randint(0, self.maximum_delay + 1)
+
+    def ready(self, identifier):
+        if self.delays[identifier] > 0:
+            self.delays[identifier] -= 1
+            return False
+
+        return self.simulator.ready(identifier)
+
+    def get(self, identifier):
+        return self.simulator.get(identifier)
+
+    def clean(self, identifier):
+        del self.delays[identifier]
+        self.simulator.clean(identifier)
+
 class RosenbrockSimulator(TestSimulator):
     def run(self, identifier, parameters):
         self.results[identifier] = rosenbrock_function(parameters["x"])
 
 class RosenbrockProblem(Problem):
-    def __init__(self, dimensions):
+    def __init__(self, dimensions, initial = None):
         self.number_of_parameters = dimensions
+        self.initial = [0.0] * dimensions if initial is None else initial
 
     def prepare(self, x):
         return dict(x = x)
@@ -34,18 +65,56 @@ class RosenbrockProblem(Problem):
 class QuadraticSimulator(TestSimulator):
     def run(self, identifier, parameters):
         us, xs = parameters["u"], parameters["x"]
-        self.results[identifier] = sum([(x - u)**2 for u, x in zip(us, xs)])
+        ws = parameters["w"] if "w" in parameters else [1.0] * len(us)
+        self.results[identifier] = sum([w * (x - u)**2 for u, x, w in zip(us, xs, ws)])
+
+class NoisyQuadraticSimulator(TestSimulator):
+    """
+        Quadratic function with additive noise that is drawn from the
+        random_seed parameter if it is given.
+    """
+    def __init__(self, noise = 1.0):
+        super().__init__()
+        self.noise = noise
+
+    def run(self, identifier, parameters):
+        us, xs = parameters["u"], parameters["x"]
+        random = np.random.RandomState(parameters["random_seed"] if "random_seed" in parameters else None)
+
+        self.results[identifier] = sum([(x - u)**2 for u, x in zip(us, xs)]) + random.normal() * self.noise
 
 class QuadraticProblem(Problem):
-    def __init__(self, u = [0.0], initial = [0.0]):
+    def __init__(self, u = [0.0], initial = [0.0], weights = None):
         self.number_of_parameters = len(u)
         self.u = u
+        self.weights = weights
 
         self.initial = initial
         self.bounds = [[-10.0, 10.0]] * len(u)
 
     def prepare(self, x):
-        return dict(x = x, u = self.u)
+        if self.weights is None:
+            return dict(x = x, u = self.u)
+
+        return dict(x = x, u = self.u, w = self.weights)
+
+    def evaluate(self, x, result):
+        return result
+
+class RastriginSimulator(TestSimulator):
+    def run(self, identifier, parameters):
+        x = np.asarray(parameters["x"])
+        self.results[identifier] = 10.0 * len(x) + np.sum(x**2 - 10.0 * np.cos(2.0 * np.pi * x))
+
+class RastriginProblem(Problem):
+    def __init__(self, dimensions):
+        self.number_of_parameters = dimensions
+
+        self.initial = [3.0] * dimensions
+        self.bounds = [[-5.12, 5.12]] * dimensions
+
+    def prepare(self, x):
+        return dict(x = x)
 
     def evaluate(self, x, result):
         return result
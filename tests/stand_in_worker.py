@@ -0,0 +1,32 @@
+"""
+    Python stand-in for a long-lived simulation worker. It counts the runs it
+    has performed to make sure that runs are served by the same process.
+"""
+import sys, json, os
+
+if __name__ == "__main__":
+    print(json.dumps({ "type": "ready" }), flush = True)
+    runs = 0
+
+    for line in sys.stdin:
+        message = json.loads(line)
+
+        if message["type"] == "shutdown":
+            break
+
+        identifier, parameters = message["identifier"], message["parameters"]
+
+        if "fail" in parameters:
+            print(json.dumps({ "type": "error", "identifier": identifier, "message": "failed" }), flush = True)
+            continue
+
+        os.mkdir("%s/output" % message["path"])
+        print(json.dumps({ "type": "progress", "identifier": identifier, "iteration": 0 }), flush = True)
+
+        runs += 1
+        objective = sum([(x - u)**2 for u, x in zip(parameters["u"], parameters["x"])])
+
+        print(json.dumps({
+            "type": "done", "identifier": identifier,
+            "result": { "objective": objective, "pid": os.getpid(), "runs": runs }
+        }), flush = True)
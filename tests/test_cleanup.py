@@ -0,0 +1,96 @@
+import os, threading, time
+
+import octras.cleanup
+from octras.cleanup import CleanupQueue
+
+def test_cleanup_queue(tmpdir):
+    queue = CleanupQueue(str(tmpdir.join(".trash")), workers = 2)
+
+    for name in ("A", "B"):
+        path = tmpdir.mkdir(name)
+        path.join("events.xml").write("x" * 1000)
+
+    queue.remove(str(tmpdir.join("A")))
+    assert not tmpdir.join("A").exists()
+
+    # The path can be reused right away
+    tmpdir.mkdir("A")
+
+    queue.remove(str(tmpdir.join("B")))
+    queue.remove(str(tmpdir.join("C")))
+
+    queue.wait()
+
+    assert queue.pending_bytes == 0
+    assert queue.pending_paths == 0
+    assert os.listdir(str(tmpdir.join(".trash"))) == []
+    assert tmpdir.join("A").exists()
+
+    queue.shutdown()
+
+def test_cleanup_queue_size(tmpdir, monkeypatch):
+    threads = []
+
+    def get_size(path):
+        threads.append(threading.current_thread())
+        return 1000
+
+    monkeypatch.setattr(octras.cleanup, "get_size", get_size)
+
+    queue = CleanupQueue(str(tmpdir.join(".trash")))
+    tmpdir.mkdir("A").join("events.xml").write("x" * 1000)
+
+    queue.remove(str(tmpdir.join("A")))
+    queue.wait()
+
+    # The size is measured in the background, not by the caller
+    assert len(threads) == 1
+    assert not threads[0] is threading.current_thread()
+    assert queue.pending_bytes == 0
+
+    queue.shutdown()
+
+def test_cleanup_queue_backlog(tmpdir, monkeypatch):
+    queue = CleanupQueue(str(tmpdir.join(".trash")), workers = 1)
+
+    # Block the deletion worker
+    release = threading.Event()
+    remove_path = queue._remove_path
+
+    def blocked_remove_path(path):
+        release.wait()
+        remove_path(path)
+
+    monkeypatch.setattr(queue, "_remove_path", blocked_remove_path)
+
+    for name in ("A", "B", "C", "D"):
+        tmpdir.mkdir(name).join("events.xml").write("x" * 1000000)
+        queue.remove(str(tmpdir.join(name)))
+
+    for k in range(100):
+        if queue.pending_bytes == 4000000:
+            break
+
+        time.sleep(0.05)
+
+    # All queued paths are measured, not only the one being deleted
+    assert queue.pending_paths == 4
+    assert queue.pending_bytes == 4000000
+
+    release.set()
+    queue.wait()
+
+    assert queue.pending_paths == 0
+    assert queue.pending_bytes == 0
+
+    queue.shutdown()
+
+def test_cleanup_queue_leftovers(tmpdir):
+    trash = tmpdir.mkdir(".trash")
+    trash.mkdir("leftover").join("plans.xml").write("x" * 100)
+
+    queue = CleanupQueue(str(trash))
+    queue.wait()
+
+    assert os.listdir(str(trash)) == []
+    queue.shutdown()
@@ -2,6 +2,8 @@ import pytest
 
 from .cases import RosenbrockSimulator
 from .cases import RosenbrockProblem
+from .cases import SISSimulator, SISProblem
+from .cases import NoisyQuadraticSimulator, QuadraticProblem
 
 from octras import Evaluator
 
@@ -23,3 +25,66 @@ def test_rosenbrock_evaluation():
 
     identifier2 = evaluator.submit([-1, 1, 2, 1])
     assert evaluator.get(identifier2)[0] != 4.0
+
+def test_snapshots():
+    evaluator = Evaluator(problem = RosenbrockProblem(2), simulator = RosenbrockSimulator())
+
+    snapshot = evaluator.snapshot({ "data": [1, 2, 3] })
+    identifiers = [evaluator.submit([1, k], snapshot = snapshot) for k in range(3)]
+    evaluator.wait(identifiers)
+
+    trace = evaluator.fetch_trace()
+    assert len(trace) == 3
+    assert all(item["snapshot"] == snapshot for item in trace)
+
+    snapshots = evaluator.fetch_snapshots()
+    assert snapshots == [(snapshot, { "data": [1, 2, 3] })]
+    assert evaluator.fetch_snapshots() == []
+
+def test_restart_dependencies():
+    simulator = SISSimulator()
+    evaluator = Evaluator(problem = SISProblem(0.5), simulator = simulator)
+
+    initial = evaluator.submit([0.8], { "steps": 100 })
+    evaluator.wait(initial)
+
+    restart = evaluator.submit([0.8], { "steps": 100, "restart": initial })
+
+    # Cleaning is deferred because the restart has not been run yet
+    evaluator.clean(initial)
+    assert initial in simulator.results
+
+    # Cleaning again is a no-op
+    evaluator.clean(initial)
+    assert initial in simulator.results
+
+    evaluator.wait(restart)
+    assert not initial in simulator.results
+    assert not initial in evaluator.simulations
+
+    evaluator.clean(initial)
+
+    evaluator.clean(restart)
+    evaluator.clean(restart)
+    assert len(simulator.results) == 0
+    assert len(evaluator.references) == 0
+
+def test_seed_groups():
+    evaluator = Evaluator(problem = QuadraticProblem([1.0]), simulator = NoisyQuadraticSimulator(), seed = 0)
+
+    first_group = evaluator.seed_group()
+    second_group = evaluator.seed_group()
+
+    first = [evaluator.submit([0.0], seed_group = first_group) for k in range(2)]
+    second = evaluator.submit([0.0], seed_group = second_group)
+    evaluator.wait()
+
+    # Same seed within a group, different seeds between groups
+    assert evaluator.get(first[0]) == evaluator.get(first[1])
+    assert evaluator.get(first[0]) != evaluator.get(second)
+
+    seeds = [evaluator.simulations[identifier]["parameters"]["random_seed"] for identifier in first + [second]]
+    assert seeds[0] == seeds[1] and seeds[0] != seeds[2]
+
+    with pytest.raises(RuntimeError):
+        evaluator.submit([0.0], seed_group = "unknown")
@@ -0,0 +1,99 @@
+import gzip
+import numpy as np
+
+from octras.events import analyze_events, analyze_events_files
+
+EVENTS = """<?xml version="1.0" encoding="utf-8"?>
+<events version="1.0">
+	<event time="21600.0" type="actend" person="1" link="1" x="0.0" y="0.0" actType="home"  />
+	<event time="21600.0" type="departure" person="1" link="1" legMode="walk"  />
+	<event time="21660.0" type="arrival" person="1" link="1" legMode="walk"  />
+	<event time="21660.0" type="actstart" person="1" link="1" actType="car interaction"  />
+	<event time="21660.0" type="actend" person="1" link="1" actType="car interaction"  />
+	<event time="21660.0" type="departure" person="1" link="1" legMode="car"  />
+	<event time="21660.0" type="PersonEntersVehicle" person="1" vehicle="1"  />
+	<event time="21661.0" type="left link" link="1" vehicle="1"  />
+	<event time="21661.0" type="entered link" link="2" vehicle="1"  />
+	<event time="21700.0" type="left link" link="2" vehicle="1"  />
+	<event time="21700.0" type="entered link" link="3" vehicle="1"  />
+	<event time="21750.0" type="PersonLeavesVehicle" person="1" vehicle="1"  />
+	<event time="21750.0" type="arrival" person="1" link="3" legMode="car"  />
+	<event time="21750.0" type="actstart" person="1" link="3" x="300.0" y="400.0" actType="work"  />
+	<event time="25200.0" type="actend" person="2" link="3" x="300.0" y="400.0" actType="home"  />
+	<event time="25200.0" type="departure" person="2" link="3" legMode="bike"  />
+	<event time="25500.0" type="travelled" person="2" distance="1500.0" mode="bike"  />
+	<event time="25500.0" type="arrival" person="2" link="1" legMode="bike"  />
+	<event time="25500.0" type="actstart" person="2" link="1" x="0.0" y="0.0" actType="shop"  />
+	<event time="61200.0" type="actend" person="1" link="3" x="300.0" y="400.0" actType="work"  />
+	<event time="61200.0" type="departure" person="1" link="3" legMode="walk"  />
+	<event time="61200.0" type="travelled" person="1" distance="500.0" mode="walk"  />
+	<event time="61500.0" type="arrival" person="1" link="1" legMode="walk"  />
+	<event time="61500.0" type="actstart" person="1" link="1" x="0.0" y="0.0" actType="home"  />
+</events>
+"""
+
+def write_events(tmpdir):
+    path = str(tmpdir.join("output_events.xml.gz"))
+
+    with gzip.open(path, "wt") as f:
+        f.write(EVENTS)
+
+    return path
+
+def test_analyze_events(tmpdir):
+    result = analyze_events(write_events(tmpdir), link_lengths = { "2": 100.0, "3": 50.0 })
+    trips = result["trips"]
+
+    assert list(trips["person_id"]) == ["1", "2", "1"]
+    assert list(trips["person_trip_id"]) == [0, 0, 1]
+    assert list(trips["mode"]) == ["car", "bike", "walk"]
+    assert list(trips["travel_time"]) == [150.0, 300.0, 300.0]
+    assert list(trips["network_distance"]) == [150.0, 1500.0, 500.0]
+    assert list(trips["crowfly_distance"]) == [500.0, 500.0, 500.0]
+    assert list(trips["preceedingPurpose"]) == ["home", "home", "work"]
+    assert list(trips["followingPurpose"]) == ["work", "shop", "home"]
+
+    assert list(result["link_ids"]) == ["2", "3"]
+    assert result["link_counts"].shape == (2, 24)
+    assert result["link_counts"][:, 6].tolist() == [1, 1]
+    assert np.sum(result["link_counts"]) == 2
+
+SHARED_EVENTS = """<?xml version="1.0" encoding="utf-8"?>
+<events version="1.0">
+	<event time="100.0" type="actend" person="1" link="1" x="0.0" y="0.0" actType="home"  />
+	<event time="100.0" type="departure" person="1" link="1" legMode="pt"  />
+	<event time="110.0" type="actend" person="2" link="1" x="0.0" y="0.0" actType="home"  />
+	<event time="110.0" type="departure" person="2" link="1" legMode="pt"  />
+	<event time="120.0" type="PersonEntersVehicle" person="bus_driver" vehicle="bus"  />
+	<event time="130.0" type="PersonEntersVehicle" person="1" vehicle="bus"  />
+	<event time="130.0" type="PersonEntersVehicle" person="2" vehicle="bus"  />
+	<event time="140.0" type="entered link" link="2" vehicle="bus"  />
+	<event time="150.0" type="PersonLeavesVehicle" person="2" vehicle="bus"  />
+	<event time="150.0" type="arrival" person="2" link="2" legMode="pt"  />
+	<event time="150.0" type="actstart" person="2" link="2" x="100.0" y="0.0" actType="work"  />
+	<event time="160.0" type="entered link" link="3" vehicle="bus"  />
+	<event time="170.0" type="PersonLeavesVehicle" person="1" vehicle="bus"  />
+	<event time="170.0" type="arrival" person="1" link="3" legMode="pt"  />
+	<event time="170.0" type="actstart" person="1" link="3" x="150.0" y="0.0" actType="work"  />
+</events>
+"""
+
+def test_analyze_events_shared_vehicle(tmpdir):
+    path = str(tmpdir.join("output_events.xml.gz"))
+
+    with gzip.open(path, "wt") as f:
+        f.write(SHARED_EVENTS)
+
+    trips = analyze_events(path, link_lengths = { "2": 100.0, "3": 50.0 })["trips"]
+
+    # Both passengers get the distance while they are on board
+    assert list(trips["person_id"]) == ["2", "1"]
+    assert list(trips["network_distance"]) == [100.0, 150.0]
+    assert list(trips["crowfly_distance"]) == [100.0, 150.0]
+
+def test_analyze_events_files(tmpdir):
+    path = write_events(tmpdir)
+    results = analyze_events_files([path, path], processes = 2)
+
+    assert len(results) == 2
+    assert list(results[1]["trips"]["mode"]) == ["car", "bike", "walk"]
@@ -0,0 +1,246 @@
+import gzip, os, stat, time, threading
+import pytest
+
+from octras.matsim import MATSimSimulator, CoreAllocator, parse_cpu_list
+
+def create_java(tmpdir, script):
+    path = str(tmpdir.join("java"))
+
+    with open(path, "w+") as f:
+        f.write("#!/bin/sh\n" + script)
+
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+def wait(simulator, identifier):
+    for k in range(100):
+        if simulator.ready(identifier):
+            return
+
+        time.sleep(0.05)
+
+def test_matsim_output_streaming(tmpdir):
+    java = create_java(tmpdir, "\n".join([
+        "echo '### ITERATION 0 BEGINS'",
+        "echo '### ITERATION 1 BEGINS'",
+        "echo 'some warning' 1>&2",
+    ]))
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "")
+
+    simulator.run("A", {})
+    wait(simulator, "A")
+
+    assert simulator.ready("A")
+    assert simulator.simulations["A"]["readers"][0].iteration == 1
+
+    with gzip.open(str(working_directory.join("A/simulation_output.log.gz")), "rt") as f:
+        assert "ITERATION 1 BEGINS" in f.read()
+
+    with gzip.open(str(working_directory.join("A/simulation_error.log.gz")), "rt") as f:
+        assert f.read() == "some warning\n"
+
+def test_matsim_output_error(tmpdir):
+    java = create_java(tmpdir, "\n".join([
+        "echo 'Exception in thread \"main\" java.lang.RuntimeException: broken' 1>&2",
+        "exec sleep 10"
+    ]))
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "")
+    simulator.run("A", {})
+
+    with pytest.raises(RuntimeError, match = "broken"):
+        wait(simulator, "A")
+
+def test_core_allocator():
+    allocator = CoreAllocator({ 0: [0, 1, 2, 3, 4, 5], 1: [6, 7, 8, 9, 10, 11] })
+
+    assert allocator.allocate(4) == ([0, 1, 2, 3], 0)
+    assert allocator.allocate(4) == ([6, 7, 8, 9], 1)
+    assert allocator.allocate(2) == ([4, 5], 0)
+    assert allocator.allocate(3) is None
+
+    allocator.release([0, 1, 2, 3])
+    assert allocator.allocate(5) == ([0, 1, 2, 3, 10], None)
+
+    allocator.release([4, 5, 6, 7, 8, 9])
+    assert allocator.allocate(3) == ([6, 7, 8], 1)
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+
+def test_matsim_pinning(tmpdir):
+    java = create_java(tmpdir, "echo \"$@\"")
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory),
+        java = java, class_path = "", main_class = "",
+        threads = 1, nodes = { 0: [min(os.sched_getaffinity(0))] })
+
+    simulator.run("A", {})
+    assert simulator.allocator.free[0] == []
+
+    wait(simulator, "A")
+    assert simulator.allocator.free[0] == [min(os.sched_getaffinity(0))]
+
+    with gzip.open(str(working_directory.join("A/simulation_output.log.gz")), "rt") as f:
+        output = f.read()
+
+    assert "--config:global.numberOfThreads 1" in output
+    assert "--config:qsim.numberOfThreads 1" in output
+
+def test_matsim_pinning_error(tmpdir):
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory),
+        threads = 1, nodes = { 0: [min(os.sched_getaffinity(0))] })
+
+    with pytest.raises(RuntimeError, match = "class_path"):
+        simulator.run("A", {})
+
+    assert simulator.allocator.free[0] == [min(os.sched_getaffinity(0))]
+
+    # Failure while the command line is constructed
+    with pytest.raises(TypeError):
+        simulator.run("B", dict(class_path = "", main_class = "", prefix_arguments = "-x"))
+
+    assert simulator.allocator.free[0] == [min(os.sched_getaffinity(0))]
+
+def test_matsim_store_restart(tmpdir):
+    java = create_java(tmpdir, "\n".join([
+        "while [ $# -gt 0 ]; do",
+        "  if [ \"$1\" = \"--config:controler.outputDirectory\" ]; then mkdir -p $2; echo plans > $2/output_plans.xml.gz; fi",
+        "  if [ \"$1\" = \"--config:plans.inputPlansFile\" ]; then echo \"restart $2\"; fi",
+        "  shift",
+        "done"
+    ]))
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "", store = True)
+
+    simulator.run("A", {})
+    wait(simulator, "A")
+
+    # Outputs are hashed in the background, the restart waits for them
+    simulator.run("B", dict(restart = "A"))
+    digest = simulator.simulations["A"]["hashes"]["output_plans.xml.gz"]
+    assert simulator.simulations["B"]["restart_hash"] == digest
+
+    simulator.clean("A")
+    wait(simulator, "B")
+
+    with gzip.open(str(working_directory.join("B/simulation_output.log.gz")), "rt") as f:
+        assert f.read() == "restart %s\n" % simulator.store.get_path(digest)
+
+    # Blobs are collected as soon as no simulation uses them anymore
+    simulator.clean("B")
+    assert not simulator.store.has(digest)
+
+def test_matsim_store_background(tmpdir):
+    java = create_java(tmpdir, "\n".join([
+        "while [ $# -gt 0 ]; do",
+        "  if [ \"$1\" = \"--config:controler.outputDirectory\" ]; then",
+        "    mkdir -p $2; echo plans > $2/output_plans.xml.gz; echo network > $2/output_network.xml.gz",
+        "  fi",
+        "  shift",
+        "done"
+    ]))
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "", store = True)
+
+    # Block hashing until the simulation is cleaned
+    started = threading.Event()
+    add_file = simulator.store.add_file
+
+    def blocked_add_file(path, abort = None):
+        started.set()
+        abort.wait()
+        return add_file(path, abort)
+
+    simulator.store.add_file = blocked_add_file
+    simulator.store.collect = None # Cleaning must not list the store
+
+    simulator.run("A", {})
+    wait(simulator, "A")
+
+    # Simulation is ready while its outputs are still being hashed
+    assert simulator.ready("A")
+    assert started.wait(5.0)
+
+    simulator.prune("A")
+    simulator.clean("A")
+
+    assert not working_directory.join("A").exists()
+    assert os.listdir(str(working_directory.join(".store"))) == []
+
+def test_matsim_prune(tmpdir):
+    java = create_java(tmpdir, "\n".join([
+        "while [ $# -gt 0 ]; do",
+        "  if [ \"$1\" = \"--config:controler.outputDirectory\" ]; then",
+        "    mkdir -p $2/ITERS/it.0; echo plans > $2/output_plans.xml.gz; echo events > $2/output_events.xml.gz",
+        "    echo events > $2/ITERS/it.0/0.events.xml.gz",
+        "  fi",
+        "  shift",
+        "done"
+    ]))
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "")
+
+    simulator.run("A", {})
+    wait(simulator, "A")
+    simulator.prune("A")
+
+    assert working_directory.join("A/output/output_plans.xml.gz").exists()
+    assert working_directory.join("A/simulation_output.log.gz").exists()
+    assert not working_directory.join("A/output/output_events.xml.gz").exists()
+    assert not working_directory.join("A/output/ITERS").exists()
+
+def test_matsim_staging(tmpdir):
+    from .test_staging import create_scenario
+    scenario = create_scenario(tmpdir)
+
+    java = create_java(tmpdir, "echo \"$@\"")
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java, class_path = "", main_class = "",
+        staging_path = str(tmpdir.join("cache")), arguments = ["--config-path", str(scenario.join("config.xml"))])
+
+    simulator.run("A", dict(restart = "X"))
+    assert simulator.stage.usage != {}
+
+    wait(simulator, "A")
+    assert simulator.stage.usage == {}
+
+    with gzip.open(str(working_directory.join("A/simulation_output.log.gz")), "rt") as f:
+        output = f.read()
+
+    assert "--config:network.inputNetworkFile %s" % str(tmpdir.join("cache")) in output
+    assert "--config:plans.inputPlansFile %s/X/output/output_plans.xml.gz" % str(working_directory) in output
+
+def test_matsim_staging_error(tmpdir):
+    from .test_staging import create_scenario
+    scenario = create_scenario(tmpdir)
+
+    java = create_java(tmpdir, "echo \"$@\"")
+    cache_path = tmpdir.join("cache")
+
+    working_directory = tmpdir.mkdir("work")
+    simulator = MATSimSimulator(str(working_directory), java = java,
+        staging_path = str(cache_path), arguments = ["--config-path", str(scenario.join("config.xml"))])
+
+    with pytest.raises(RuntimeError, match = "class_path"):
+        simulator.run("A", {})
+
+    assert simulator.stage.usage == {}
+
+    # Second input cannot be staged, the first one is released again
+    os.remove(str(scenario.join("population.xml.gz")))
+
+    with pytest.raises(OSError):
+        simulator.run("B", dict(class_path = "", main_class = ""))
+
+    assert simulator.stage.usage == {}
+    assert cache_path.join(".leases").listdir() == []
@@ -0,0 +1,37 @@
+from octras.reference import ReferenceCache
+
+def test_reference_cache(tmpdir):
+    path = str(tmpdir.join("reference.csv"))
+
+    with open(path, "w+") as f:
+        f.write("a;b\n1;2\n")
+
+    calls = []
+
+    def compute(path):
+        calls.append(path)
+
+        with open(path) as f:
+            return len(f.read())
+
+    cache = ReferenceCache(str(tmpdir.join("cache")))
+
+    assert cache.get(path, { "setting": 1 }, compute) == 8
+    assert cache.get(path, { "setting": 1 }, compute) == 8
+    assert len(calls) == 1
+
+    # Different settings
+    assert cache.get(path, { "setting": 2 }, compute) == 8
+    assert len(calls) == 2
+
+    # Persisted across instances
+    cache = ReferenceCache(str(tmpdir.join("cache")))
+    assert cache.get(path, { "setting": 1 }, compute) == 8
+    assert len(calls) == 2
+
+    # Changed content
+    with open(path, "w+") as f:
+        f.write("a;b\n1;2\n3;4\n")
+
+    assert cache.get(path, { "setting": 1 }, compute) == 12
+    assert len(calls) == 3
@@ -0,0 +1,96 @@
+import gzip, os, subprocess
+
+from octras.staging import ScenarioStage, read_config_inputs
+
+CONFIG = """<?xml version="1.0" ?>
+<config>
+    <module name="network">
+        <param name="inputNetworkFile" value="network.xml.gz" />
+    </module>
+    <module name="plans">
+        <param name="inputPlansFile" value="population.xml.gz" />
+    </module>
+    <module name="controler">
+        <param name="lastIteration" value="10" />
+    </module>
+</config>
+"""
+
+def create_scenario(tmpdir):
+    scenario = tmpdir.mkdir("scenario")
+    scenario.join("config.xml").write(CONFIG)
+
+    for name in ("network", "population"):
+        with gzip.open(str(scenario.join("%s.xml.gz" % name)), "wt") as f:
+            f.write(name * 100)
+
+    return scenario
+
+def test_read_config_inputs(tmpdir):
+    scenario = create_scenario(tmpdir)
+    inputs = read_config_inputs(str(scenario.join("config.xml")))
+
+    assert inputs == {
+        "network.inputNetworkFile": os.path.realpath(str(scenario.join("network.xml.gz"))),
+        "plans.inputPlansFile": os.path.realpath(str(scenario.join("population.xml.gz")))
+    }
+
+def test_scenario_stage(tmpdir):
+    scenario = create_scenario(tmpdir)
+    stage = ScenarioStage(str(tmpdir.join("cache")), decompress = True)
+
+    network_path = stage.stage(str(scenario.join("network.xml.gz")))
+    assert network_path.endswith("network.xml")
+
+    with open(network_path) as f:
+        assert f.read() == "network" * 100
+
+    # Staged only once, even if requested again
+    assert stage.stage(str(scenario.join("network.xml.gz"))) == network_path
+    assert stage.usage[os.path.basename(os.path.dirname(network_path))] == 2
+
+def test_scenario_stage_eviction(tmpdir):
+    scenario = create_scenario(tmpdir)
+    stage = ScenarioStage(str(tmpdir.join("cache")), decompress = True, maximum_size = 1000)
+
+    network_path = stage.stage(str(scenario.join("network.xml.gz")))
+    stage.release(network_path)
+
+    population_path = stage.stage(str(scenario.join("population.xml.gz")))
+
+    # The least recently used entry that is not in use has been evicted
+    assert not os.path.exists(network_path)
+    assert os.path.exists(population_path)
+
+    # Entries in use are never evicted
+    network_path = stage.stage(str(scenario.join("network.xml.gz")))
+    assert os.path.exists(network_path)
+    assert os.path.exists(population_path)
+
+def test_scenario_stage_shared(tmpdir):
+    scenario = create_scenario(tmpdir)
+
+    # Two processes on the same node share one cache directory
+    first = ScenarioStage(str(tmpdir.join("cache")), decompress = True, maximum_size = 1000)
+    second = ScenarioStage(str(tmpdir.join("cache")), decompress = True, maximum_size = 1000)
+
+    network_path = first.stage(str(scenario.join("network.xml.gz")))
+    population_path = second.stage(str(scenario.join("population.xml.gz")))
+
+    # The entry that is in use by the first stage is not evicted by the second
+    assert os.path.exists(network_path)
+    assert os.path.exists(population_path)
+
+    first.release(network_path)
+    second.release(population_path)
+
+    # A lease of a process that has terminated does not block eviction
+    process = subprocess.Popen(["true"])
+    process.wait()
+
+    digest = os.path.basename(os.path.dirname(network_path))
+    tmpdir.join("cache/.leases/%s.%d.stale" % (digest, process.pid)).write("")
+
+    second.stage(str(scenario.join("population.xml.gz")))
+    assert not os.path.exists(network_path)
+    assert os.listdir(str(tmpdir.join("cache/.leases"))) != []
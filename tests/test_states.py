@@ -0,0 +1,43 @@
+import os, sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "use_case"))
+from states import TravelTimeDistribution, TotalModeShare, ModeShareByDistance, MultipleStates
+
+def create_trips():
+    return pd.DataFrame({
+        "mode": ["car", "pt", "car", "walk", "car", "pt"],
+        "crowfly_distance": [100.0, 200.0, 300.0, 50.0, 0.0, 400.0],
+        "network_distance": [150.0, 1500.0, 2500.0, 60.0, 10.0, 500.0],
+        "travel_time": [100.0, 700.0, 400.0, 1000.0, 50.0, 200.0],
+        "preceedingPurpose": ["home", "work", "home", "shop", "home", "outside"],
+        "followingPurpose": ["work", "home", "shop", "home", "work", "home"],
+        "weight": [1.0, 2.0, 1.0, 4.0, 8.0, 16.0]
+    })
+
+def test_state_calculators():
+    df = create_trips()
+
+    # Trips without distance and with outside activities are filtered
+    assert TotalModeShare(["car", "pt", "walk", "bike"])(df) == pytest.approx([2.0 / 8.0, 2.0 / 8.0, 4.0 / 8.0, 0.0])
+
+    # Classes as given by np.digitize
+    assert TravelTimeDistribution([0.0, 300.0, 600.0], "car")(df) == pytest.approx([0.0, 0.5, 0.5, 0.0])
+
+    assert ModeShareByDistance([
+        { "mode": "car", "bounds": [1000.0] }, { "mode": "pt", "bounds": [1000.0] }
+    ])(df) == pytest.approx([0.25, 0.25, 0.0, 0.5])
+
+def test_multiple_states():
+    df = create_trips()
+
+    calculators = [
+        TravelTimeDistribution([0.0, 300.0, 600.0], "car"),
+        TotalModeShare(["car", "pt"]),
+        ModeShareByDistance([{ "mode": "walk", "bounds": [100.0] }])
+    ]
+
+    # Same states as the separate calculators, in one pass
+    assert np.array_equal(MultipleStates(calculators)(df), np.concatenate([calculator(df) for calculator in calculators]))
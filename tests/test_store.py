@@ -0,0 +1,62 @@
+import os
+
+from octras.store import OutputStore, hash_file
+
+def test_output_store(tmpdir):
+    store = OutputStore(str(tmpdir.join(".store")))
+
+    for name in ("A", "B"):
+        output = tmpdir.mkdir(name).mkdir("output")
+        output.join("output_network.xml.gz").write("network")
+        output.join("output_plans.xml.gz").write("plans %s" % name)
+        output.join("output_events.xml.gz").write("events")
+
+    hashes_a = store.add(str(tmpdir.join("A/output")))
+    hashes_b = store.add(str(tmpdir.join("B/output")))
+
+    assert set(hashes_a.keys()) == set(["output_network.xml.gz", "output_plans.xml.gz"])
+    assert hashes_a["output_network.xml.gz"] == hashes_b["output_network.xml.gz"]
+    assert hashes_a["output_plans.xml.gz"] != hashes_b["output_plans.xml.gz"]
+
+    network_a = str(tmpdir.join("A/output/output_network.xml.gz"))
+    network_b = str(tmpdir.join("B/output/output_network.xml.gz"))
+
+    assert os.path.samefile(network_a, network_b)
+    assert os.stat(network_a).st_nlink == 3
+    assert os.stat(str(tmpdir.join("A/output/output_events.xml.gz"))).st_nlink == 1
+
+    plans_hash = hashes_a["output_plans.xml.gz"]
+    assert hash_file(store.get_path(plans_hash)) == plans_hash
+
+    # Blobs survive their simulations until they are collected
+    tmpdir.join("A").remove()
+    assert store.has(plans_hash)
+
+    store.collect(keep = set([plans_hash]))
+    assert store.has(plans_hash)
+
+    store.collect()
+    assert not store.has(plans_hash)
+    assert store.has(hashes_a["output_network.xml.gz"])
+
+def test_output_store_references(tmpdir):
+    store = OutputStore(str(tmpdir.join(".store")))
+
+    for name in ("A", "B"):
+        tmpdir.mkdir(name).join("output_network.xml.gz").write("network")
+
+    digest = store.add(str(tmpdir.join("A")))["output_network.xml.gz"]
+    assert store.add(str(tmpdir.join("B")))["output_network.xml.gz"] == digest
+
+    tmpdir.join("A").remove()
+    assert store.release(digest) == 0
+    assert store.has(digest)
+
+    # Blob is still linked from B
+    store.acquire(digest)
+    store.release(digest)
+    assert store.has(digest)
+
+    tmpdir.join("B").remove()
+    assert store.release(digest) == len("network")
+    assert not store.has(digest)
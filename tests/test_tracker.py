@@ -0,0 +1,33 @@
+import pickle
+
+from .cases import CongestionSimulator, CongestionProblem
+
+from octras import Evaluator, Loop
+from octras.tracker import PickleTracker
+from octras.algorithms import CMAES
+
+def test_pickle_tracker_snapshots(tmpdir):
+    evaluator = Evaluator(
+        simulator = CongestionSimulator(),
+        problem = CongestionProblem(0.3, iterations = 20)
+    )
+
+    algorithm = CMAES(evaluator, initial_step_size = 50, seed = 0)
+
+    output_path = str(tmpdir.join("optimization.p"))
+    tracker = PickleTracker(output_path)
+
+    Loop(maximum_runs = 20).run(evaluator = evaluator, algorithm = algorithm, tracker = tracker)
+
+    with open(output_path, "rb") as f:
+        history = pickle.load(f)
+
+    with open(str(tmpdir.join("optimization_snapshots.p")), "rb") as f:
+        snapshots = pickle.load(f)
+
+    assert len(snapshots) == algorithm.iteration
+    assert len(history) == algorithm.iteration * algorithm.L
+
+    for item in history:
+        assert not "covariance" in item["annotations"]
+        assert "covariance" in snapshots[item["snapshot"]]
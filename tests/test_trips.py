@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+
+from octras.trips import load_trips, TripSample, weighted_histograms
+
+def write_trips(path):
+    pd.DataFrame({
+        "person_id": [1, 1, 2, 3],
+        "mode": ["car", "pt", "car", None],
+        "travel_time": [600.0, 1200.5, 300.0, 60.0],
+        "purpose": ["work", "home", "shop", "home"],
+        "unused": [0.0, 0.0, 0.0, 0.0]
+    }).to_csv(path, sep = ";", index = False)
+
+def test_load_trips(tmpdir):
+    path = str(tmpdir.join("trips.csv"))
+    write_trips(path)
+
+    df = load_trips(path, ["mode", "travel_time"])
+
+    assert list(df.columns) == ["mode", "travel_time"]
+    assert isinstance(df["mode"].dtype, pd.CategoricalDtype)
+    assert df["travel_time"].dtype == np.float32
+    assert list(df["mode"].values[:3]) == ["car", "pt", "car"]
+    assert pd.isna(df["mode"].values[3])
+    assert df["travel_time"].values[1] == np.float32(1200.5)
+
+    # Columns are added to the existing cache
+    df = load_trips(path, ["person_id", "mode"], dtypes = { "person_id": np.int32 })
+    assert df["person_id"].dtype == np.int32
+    assert sorted(os.listdir(str(tmpdir.join("trips.csv.columns")))) == [
+        "metadata.json", "mode.categories.npy", "mode.npy", "person_id.npy", "travel_time.npy"
+    ]
+
+    # The cache is used instead of the CSV
+    os.remove(str(tmpdir.join("trips.csv.columns/travel_time.npy")))
+    np.save(str(tmpdir.join("trips.csv.columns/travel_time.npy")), np.zeros((4,), dtype = np.float32))
+    assert np.all(load_trips(path, ["travel_time"])["travel_time"] == 0.0)
+
+def test_load_trips_invalidation(tmpdir):
+    path = str(tmpdir.join("trips.csv"))
+    write_trips(path)
+
+    df = load_trips(path, ["purpose"])
+    assert len(df) == 4
+
+    pd.DataFrame({ "purpose": ["work"] }).to_csv(path, sep = ";", index = False)
+    os.utime(path, ns = (0, 0))
+
+    assert list(load_trips(path, ["purpose"])["purpose"]) == ["work"]
+
+    # Column files are replaced, so earlier (memory-mapped) loads stay intact
+    assert list(df["purpose"]) == ["work", "home", "shop", "home"]
+    assert sorted(os.listdir(str(tmpdir.join("trips.csv.columns")))) == [
+        "metadata.json", "purpose.categories.npy", "purpose.npy"
+    ]
+
+def test_load_trips_cache_path(tmpdir):
+    path = str(tmpdir.mkdir("reference").join("trips.csv"))
+    write_trips(path)
+
+    cache_path = str(tmpdir.join("cache"))
+    df = load_trips(path, ["mode"], cache_path = cache_path)
+
+    assert list(df["mode"].values[:3]) == ["car", "pt", "car"]
+    assert not os.path.exists("%s.columns" % path)
+    assert len(os.listdir(cache_path)) == 1
+
+    # Cache directory cannot be created, so the CSV is read directly
+    blocked_path = str(tmpdir.join("blocked"))
+
+    with open(blocked_path, "w+") as f:
+        f.write("")
+
+    df = load_trips(path, ["mode", "travel_time"], cache_path = blocked_path)
+    assert list(df.columns) == ["mode", "travel_time"]
+    assert df["travel_time"].values[1] == np.float32(1200.5)
+
+def test_weighted_histograms():
+    df = pd.DataFrame({
+        "mode": ["car", "pt", "car", "walk", "car"],
+        "distance": [100.0, 2000.0, 5000.0, 50.0, 700.0],
+        "weight": [1.0, 2.0, 3.0, 4.0, 5.0]
+    })
+
+    sample = TripSample(df, np.array([True, True, True, True, False]))
+
+    car, totals_car, totals_bike, everything = weighted_histograms(sample, [
+        ("car", "distance", [500.0, 1000.0]),
+        ("car", None, None), ("bike", None, None),
+        (None, "distance", [1000.0])
+    ])
+
+    assert list(car) == [1.0, 0.0, 3.0]
+    assert list(totals_car) == [4.0]
+    assert list(totals_bike) == [0.0]
+    assert list(everything) == [5.0, 5.0]
@@ -0,0 +1,45 @@
+import os, sys
+import pytest
+
+from .cases import QuadraticProblem
+
+from octras import Evaluator
+from octras.worker import WorkerSimulator
+
+WORKER_PATH = os.path.join(os.path.dirname(__file__), "stand_in_worker.py")
+
+class WorkerQuadraticProblem(QuadraticProblem):
+    def evaluate(self, x, result):
+        return result["objective"], None, result
+
+def test_worker_simulator(tmpdir):
+    simulator = WorkerSimulator(str(tmpdir), [sys.executable, WORKER_PATH], workers = 2)
+
+    evaluator = Evaluator(
+        simulator = simulator, parallel = 2,
+        problem = WorkerQuadraticProblem([2.0, 1.0])
+    )
+
+    identifiers = [evaluator.submit([float(k), 1.0]) for k in range(6)]
+    evaluator.wait(identifiers)
+
+    assert [evaluator.get(identifier)[0] for identifier in identifiers] == [4.0, 1.0, 0.0, 1.0, 4.0, 9.0]
+
+    information = [evaluator.simulations[identifier]["information"] for identifier in identifiers]
+    assert len(set([item["pid"] for item in information])) <= 2
+    assert sum([item["runs"] == 1 for item in information]) <= 2
+
+    evaluator.clean()
+    assert not tmpdir.join(identifiers[0]).exists()
+
+    simulator.shutdown()
+
+def test_worker_simulator_error(tmpdir):
+    simulator = WorkerSimulator(str(tmpdir), [sys.executable, WORKER_PATH])
+    simulator.run("A", dict(fail = True))
+
+    with pytest.raises(RuntimeError, match = "failed"):
+        while not simulator.ready("A"):
+            pass
+
+    simulator.shutdown()
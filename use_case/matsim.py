@@ -1,5 +1,7 @@
 import octras.simulation
 import octras.optimization
+from octras.trips import load_trips
+from states import TRIP_COLUMNS
 
 import os, shutil
 import subprocess as sp
@@ -179,7 +181,7 @@ class MATSimSimulator(octras.simulation.Simulator):
         internal_identifier = self.identifier_mapping[identifier]
         simulation_path = "%s/%s" % (self.working_directory, internal_identifier)
 
-        return pd.read_csv("%s/trips.csv" % simulation_path, sep = ";")
+        return load_trips("%s/trips.csv" % simulation_path, TRIP_COLUMNS)
 
     def _get_iteration(self, internal_identifier):
         scores_path = "%s/%s/output/scorestats.txt" % (self.working_directory, internal_identifier)
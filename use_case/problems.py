@@ -1,75 +1,11 @@
 import octras.optimization
+from octras.trips import load_trips
+from octras.reference import ReferenceCache
+from states import TRIP_COLUMNS, TravelTimeDistribution, TotalModeShare, ModeShareByDistance, MultipleStates
+
 import numpy as np
 import pandas as pd
 
-class TravelTimeDistribution:
-    def __init__(self, bounds, mode):
-        self.bounds = bounds
-        self.mode = mode
-
-    def __call__(self, df):
-        df = df.copy()
-
-        if not "weight" in df:
-            df["weight"] = 1.0
-
-        df = df[df["crowfly_distance"] > 0]
-        df = df[df["preceedingPurpose"] != "outside"]
-        df = df[df["followingPurpose"] != "outside"]
-
-        df = df[df["mode"] == self.mode]
-
-        df["class"] = np.digitize(df["travel_time"], self.bounds)
-        counts = np.array([np.sum(df[df["class"] == k]["weight"]) for k in range(len(self.bounds) + 1)])
-
-        return counts / np.sum(counts)
-
-class TotalModeShare:
-    def __init__(self, modes):
-        self.modes = modes
-
-    def __call__(self, df):
-        df = df.copy()
-
-        if not "weight" in df:
-            df["weight"] = 1.0
-
-        df = df[df["crowfly_distance"] > 0]
-        df = df[df["preceedingPurpose"] != "outside"]
-        df = df[df["followingPurpose"] != "outside"]
-
-        shares = np.array([
-            df[df["mode"] == mode]["weight"].sum()
-            for mode in self.modes
-        ])
-
-        return shares / np.sum(shares)
-
-class ModeShareByDistance:
-    def __init__(self, mode_bounds):
-        self.mode_bounds = mode_bounds
-
-    def __call__(self, df):
-        df = df.copy()
-
-        if not "weight" in df:
-            df["weight"] = 1.0
-
-        df = df[df["crowfly_distance"] > 0]
-        df = df[df["preceedingPurpose"] != "outside"]
-        df = df[df["followingPurpose"] != "outside"]
-
-        values = []
-
-        for item in self.mode_bounds:
-            f = df["mode"] == item["mode"]
-
-            classes = np.digitize(df["network_distance"], item["bounds"])
-            values += [np.sum(df[f & (classes == k)]["weight"]) for k in range(len(item["bounds"]) + 1)]
-
-        values = np.array(values)
-        return values / np.sum(values)
-
 def l2_distance(simulation_state, reference_state):
     return np.sqrt(np.sum((simulation_state - reference_state)**2))
 
@@ -77,7 +13,7 @@ def hellinger_distance(simulation_state, reference_state):
     return np.sqrt(np.sum((np.sqrt(simulation_state) - np.sqrt(reference_state))**2)) / np.sqrt(2)
 
 class TripBasedProblem(octras.optimization.OptimizationProblem):
-    def __init__(self, problem_name, state_calculator, state_names, objective_calculator, parameters, reference_path):
+    def __init__(self, problem_name, state_calculator, state_names, objective_calculator, parameters, reference_path, cache_path = None):
         number_of_parameters = len(parameters)
         number_of_states = len(state_names)
 
@@ -94,10 +30,13 @@ class TripBasedProblem(octras.optimization.OptimizationProblem):
 
         self.parameters = parameters
 
-        self.reference_state = self.compute_reference_state(reference_path)
+        self.reference_cache = ReferenceCache(cache_path)
+        self.reference_state = self.reference_cache.get(reference_path,
+            (type(state_calculator).__name__, vars(state_calculator)), self.compute_reference_state)
 
     def compute_reference_state(self, reference_path):
-        df_reference = pd.read_csv(reference_path, sep = ";")
+        columns = pd.read_csv(reference_path, sep = ";", nrows = 0).columns
+        df_reference = load_trips(reference_path, [column for column in TRIP_COLUMNS + ["weight"] if column in columns])
         return self.state_calculator(df_reference)
 
     def get_simulator_parameters(self, values):
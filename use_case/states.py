@@ -0,0 +1,84 @@
+from octras.trips import TripSample, weighted_histograms
+
+import numpy as np
+
+# Columns of trips.csv that are used by the state calculators
+TRIP_COLUMNS = ["mode", "crowfly_distance", "network_distance", "travel_time", "preceedingPurpose", "followingPurpose"]
+
+def prepare_trips(df):
+    """
+        Applies the trip filters that are common to all state calculators.
+    """
+    selection = df["crowfly_distance"].values > 0
+    selection &= df["preceedingPurpose"].values != "outside"
+    selection &= df["followingPurpose"].values != "outside"
+    return TripSample(df, selection)
+
+def normalize(values):
+    return values / np.sum(values)
+
+class TravelTimeDistribution:
+    def __init__(self, bounds, mode):
+        self.bounds = bounds
+        self.mode = mode
+
+    def get_items(self):
+        return [(self.mode, "travel_time", self.bounds)]
+
+    def finalize(self, counts):
+        return normalize(counts[0])
+
+    def __call__(self, df):
+        return compute_states(df, [self])[0]
+
+class TotalModeShare:
+    def __init__(self, modes):
+        self.modes = modes
+
+    def get_items(self):
+        return [(mode, None, None) for mode in self.modes]
+
+    def finalize(self, counts):
+        return normalize(np.concatenate(counts))
+
+    def __call__(self, df):
+        return compute_states(df, [self])[0]
+
+class ModeShareByDistance:
+    def __init__(self, mode_bounds):
+        self.mode_bounds = mode_bounds
+
+    def get_items(self):
+        return [(item["mode"], "network_distance", item["bounds"]) for item in self.mode_bounds]
+
+    def finalize(self, counts):
+        return normalize(np.concatenate(counts))
+
+    def __call__(self, df):
+        return compute_states(df, [self])[0]
+
+def compute_states(df, calculators):
+    """
+        Computes the states of multiple calculators with one filtering pass
+        and one weighted histogram over the trips.
+    """
+    items = [calculator.get_items() for calculator in calculators]
+    counts = weighted_histograms(prepare_trips(df), sum(items, []))
+
+    states = []
+
+    for calculator, calculator_items in zip(calculators, items):
+        states.append(calculator.finalize(counts[:len(calculator_items)]))
+        counts = counts[len(calculator_items):]
+
+    return states
+
+class MultipleStates:
+    """
+        Concatenates the states of multiple calculators, computed in one pass.
+    """
+    def __init__(self, calculators):
+        self.calculators = calculators
+
+    def __call__(self, df):
+        return np.concatenate(compute_states(df, self.calculators))